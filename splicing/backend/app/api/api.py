@@ -6,9 +6,15 @@ import zipfile
 
 from fastapi import APIRouter, Depends, Response, status
 from fastapi.responses import StreamingResponse
-from langchain_core.messages import ToolMessage
 
-from app.api.dependencies import RedisClient, get_redis_client
+from app.api.dependencies import (
+    CheckpointCompactor,
+    LocalCache,
+    RedisClient,
+    get_checkpoint_compactor,
+    get_local_cache,
+    get_redis_client,
+)
 from app.api.endpoints import block, converse, section, settings
 from app.generated.schema import (
     BlockData,
@@ -22,18 +28,21 @@ from app.generated.schema import (
     TransformationTool,
 )
 from app.utils.agent.checkpointer import AsyncRedisSaver
-from app.utils.agent.graph import create_graph
+from app.utils.agent.context import context_manager
 from app.utils.converse import get_initial_messages
+from app.utils.duckdb_pool import duckdb_pool
 from app.utils.execute import get_dbt_packages
-from app.utils.helper import convert_message_to_dict, generate_id, standardize_name
+from app.utils.generate import generate_cache
+from app.utils.helper import generate_id, standardize_name
 from app.utils.project_helper import (
+    deserialize_data_dict,
     get_app_dir,
-    get_chat_history,
-    get_data_dict_in_block,
+    get_chat_messages,
     get_dbt_project_name,
-    get_llm_for_project,
+    get_graph_for_project,
     get_project_dir,
 )
+from app.utils.prompt_cache import prompt_cache_stats
 
 router = APIRouter()
 router.include_router(block.router, prefix="/block", tags=["block"])
@@ -60,8 +69,7 @@ async def add(
     }
     await redis_client.set_project_data(project_id, "metadata", metadata)
     await redis_client.add_project_id(project_id)
-    llm = await get_llm_for_project(redis_client, project_id)
-    graph = create_graph(redis_client, llm)
+    graph = await get_graph_for_project(redis_client, project_id)
     config = {"configurable": {"thread_id": project_id}}
     await graph.aupdate_state(
         config, {"messages": get_initial_messages()}, as_node="chatbot"
@@ -109,83 +117,50 @@ async def fetch_projects_metadata(
     redis_client: RedisClient = Depends(get_redis_client),
 ) -> list[ProjectMetadata]:
     all_project_ids = await redis_client.get_all_project_ids()
-    return [
-        await redis_client.get_project_data(pid, "metadata") for pid in all_project_ids
-    ]
+    return await redis_client.get_projects_metadata(list(all_project_ids))
 
 
 @router.get("/project/{project_id}")
 async def fetch_project(
     project_id: str, redis_client: RedisClient = Depends(get_redis_client)
 ) -> ProjectData:
-    project_metadata = await redis_client.get_project_data(project_id, "metadata")
-    section_ids = await redis_client.get_all_section_ids(project_id)
+    snapshot = await redis_client.get_project_snapshot(project_id)
     sections = []
-    for section_id in section_ids:
-        section_metadata = await redis_client.get_section_data(
-            project_id, section_id, "metadata"
-        )
-        section_type = SectionType(section_metadata["sectionType"])
-        current_block_id = await redis_client.get_section_data(
-            project_id, section_id, "current_block_id"
-        )
-        block_ids = await redis_client.get_all_block_ids(project_id, section_id)
+    for section_snapshot in snapshot["sections"]:
         blocks = []
-        for block_id in block_ids:
-            block_metadata = await redis_client.get_block_data(
-                project_id, section_id, block_id, "metadata"
-            )
-            block_setup = await redis_client.get_block_data(
-                project_id, section_id, block_id, "setup"
-            )
-            generate_result = await redis_client.get_block_data(
-                project_id, section_id, block_id, "generate_result"
-            )
-            data_dict = await get_data_dict_in_block(
-                redis_client, project_id, section_id, block_id
-            )
+        for block_snapshot in section_snapshot["blocks"]:
+            num_rows = block_snapshot["metadata"]["numRows"]
             data = {
-                k: v.head(block_metadata["numRows"]).to_json(
-                    orient="records", date_format="iso"
-                )
-                for k, v in data_dict.items()
+                k: v.head(num_rows).to_json(orient="records", date_format="iso")
+                for k, v in deserialize_data_dict(block_snapshot["data"]).items()
             }
-            execute_result = await redis_client.get_block_data(
-                project_id, section_id, block_id, "execute_result"
-            )
             blocks.append(
                 BlockData(
-                    id=block_id,
-                    numRows=block_metadata["numRows"],
-                    generateResult=generate_result,
+                    id=block_snapshot["id"],
+                    numRows=num_rows,
+                    generateResult=block_snapshot["generate_result"],
                     data=data,
-                    executeResult=execute_result,
-                    setup=block_setup,
+                    executeResult=block_snapshot["execute_result"],
+                    setup=block_snapshot["setup"],
                 )
             )
+        section_metadata = section_snapshot["metadata"]
         sections.append(
             SectionData(
-                id=section_id,
+                id=section_snapshot["id"],
                 title=section_metadata["title"],
-                sectionType=section_type,
+                sectionType=SectionType(section_metadata["sectionType"]),
                 blocks=blocks,
-                currentBlockId=current_block_id,
+                currentBlockId=section_snapshot["current_block_id"],
             )
         )
 
-    messages = [
-        convert_message_to_dict(message)
-        for message in await get_chat_history(redis_client, project_id)
-        if not isinstance(message, ToolMessage) and message.name != "hidden"
-    ]
-    last_worked_section_id = await redis_client.get_project_data(
-        project_id, "last_worked_section_id"
-    )
+    messages = await get_chat_messages(redis_client, project_id)
     return ProjectData(
-        metadata=ProjectMetadata(**project_metadata),
+        metadata=ProjectMetadata(**snapshot["metadata"]),
         sections=sections,
         messages=messages,
-        lastWorkedSectionId=last_worked_section_id,
+        lastWorkedSectionId=snapshot["last_worked_section_id"],
     )
 
 
@@ -321,3 +296,18 @@ async def download_code(
         media_type="application/zip",
         headers={"Content-Disposition": f"attachment; filename={project_name}.zip"},
     )
+
+
+@router.get("/metrics")
+async def fetch_metrics(
+    local_cache: LocalCache = Depends(get_local_cache),
+    checkpoint_compactor: CheckpointCompactor = Depends(get_checkpoint_compactor),
+) -> dict[str, dict]:
+    return {
+        "localCache": local_cache.get_stats(),
+        "checkpoints": await checkpoint_compactor.get_stats(),
+        "context": context_manager.get_stats(),
+        "promptCache": prompt_cache_stats.get_stats(),
+        "generateCache": generate_cache.get_stats(),
+        "duckdb": duckdb_pool.get_stats(),
+    }
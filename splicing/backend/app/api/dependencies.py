@@ -1,14 +1,40 @@
+from fastapi import Request
 from redis import asyncio as aioredis
 
 from app.core.config import settings
+from app.utils.agent.compactor import CheckpointCompactor
+from app.utils.local_cache import LocalCache
 from app.utils.redis_client import RedisClient
 
 
-async def get_redis_client() -> RedisClient:
-    redis = aioredis.from_url(
+def create_redis_pool() -> aioredis.ConnectionPool:
+    # a blocking pool waits for a free connection instead of failing
+    # when all connections are in use
+    return aioredis.BlockingConnectionPool.from_url(
         settings.REDIS_URL,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
     )
-    try:
-        yield RedisClient(redis)
-    finally:
-        await redis.close()
+
+
+def create_local_cache() -> LocalCache:
+    return LocalCache(settings.LOCAL_CACHE_MAX_SIZE, settings.LOCAL_CACHE_TTL)
+
+
+def create_checkpoint_compactor(redis: aioredis.Redis) -> CheckpointCompactor:
+    return CheckpointCompactor(
+        redis, settings.CHECKPOINT_RETENTION, settings.CHECKPOINT_COMPACTION_INTERVAL
+    )
+
+
+async def get_redis_client(request: Request) -> RedisClient:
+    return RedisClient(request.app.state.redis, cache=request.app.state.local_cache)
+
+
+async def get_local_cache(request: Request) -> LocalCache:
+    return request.app.state.local_cache
+
+
+async def get_checkpoint_compactor(request: Request) -> CheckpointCompactor:
+    return request.app.state.checkpoint_compactor
@@ -5,7 +5,6 @@ import os.path
 import pandas as pd
 from fastapi import APIRouter, Depends, Response, status
 from fastapi.responses import StreamingResponse
-from langchain_core.messages import ToolMessage
 
 from app.api.dependencies import RedisClient, get_redis_client
 from app.api.endpoints.section import set_current_block
@@ -19,6 +18,7 @@ from app.generated.schema import (
     TransformationTool,
     UpdateCodePayload,
 )
+from app.utils.artifact_store import delete_artifacts
 from app.utils.execute import (
     create_dbt_profile,
     execute_dbt,
@@ -26,22 +26,19 @@ from app.utils.execute import (
     init_dbt_project,
     install_packages,
 )
+from app.utils.executor import code_executor, run_in_executor
 from app.utils.generate import (
     generate_with_llm,
     get_generate_result_type,
     update_generate_result,
 )
-from app.utils.helper import (
-    CHUNK_DELIMITER,
-    convert_message_to_dict,
-    format_exception_message,
-    generate_id,
-)
+from app.utils.helper import CHUNK_DELIMITER, format_exception_message, generate_id
 from app.utils.project_helper import (
     add_chat_messages,
     build_dag,
     context_update,
-    get_chat_history,
+    delete_data_dict_in_block,
+    get_chat_messages,
     get_data_dict_in_block,
     get_dbt_project_name,
     get_llm_for_project,
@@ -85,6 +82,20 @@ async def delete(
 ) -> Response:
     await redis_client.delete_all_block_data(project_id, section_id, block_id)
     await redis_client.delete_block_id(project_id, section_id, block_id)
+    project_dir = await get_project_dir(redis_client, project_id)
+    delete_artifacts(project_dir, section_id, block_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.post("/move/{project_id}/{section_id}/{block_id}/{direction}")
+async def move(
+    project_id: str,
+    section_id: str,
+    block_id: str,
+    direction: str,
+    redis_client: RedisClient = Depends(get_redis_client),
+) -> Response:
+    await redis_client.move_block(project_id, section_id, block_id, direction.lower())
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
@@ -102,6 +113,8 @@ async def reset(
     await redis_client.set_block_data(
         project_id, section_id, block_id, "metadata", block_metadata
     )
+    project_dir = await get_project_dir(redis_client, project_id)
+    delete_artifacts(project_dir, section_id, block_id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
@@ -159,6 +172,7 @@ async def generate_code(
     block_id: str,
     redis_client: RedisClient = Depends(get_redis_client),
     called_from_agent: bool = False,
+    use_cache: bool = True,
 ) -> GenerateResult:
     integration_settings = await redis_client.get_settings_data(
         SettingsSectionType.INTEGRATION.value
@@ -184,13 +198,14 @@ async def generate_code(
                     project_id,
                     source_section_id,
                     source_block_id,
+                    head_only=True,
                 )
             else:
                 data_dict = {}
         else:
             source = block_setup["source"]
             source_details = block_setup["sourceDetails"]
-            data_dict = read_df_from_integration(
+            data_dict = await read_df_from_integration(
                 llm=llm,
                 source=source,
                 source_details=source_details,
@@ -206,11 +221,7 @@ async def generate_code(
     integration_settings = await redis_client.get_settings_data(
         SettingsSectionType.INTEGRATION.value
     )
-    messages = [
-        convert_message_to_dict(message)
-        for message in await get_chat_history(redis_client, project_id)
-        if not isinstance(message, ToolMessage)
-    ]
+    messages = await get_chat_messages(redis_client, project_id, include_hidden=True)
     context = "\n".join(
         f"{message['role']}: {message['content']}" for message in messages
     )
@@ -219,6 +230,7 @@ async def generate_code(
         section_type=section_type,
         integration_settings=integration_settings,
         called_from_agent=called_from_agent,
+        use_cache=use_cache,
         context=context,
         **kwargs,
     )
@@ -230,7 +242,9 @@ async def generate_code(
         working_dir = await get_project_dir(redis_client, project_id)
         dbt_project_name = get_dbt_project_name(section_type, section_metadata["title"])
         # we need to initialize a dbt project first because after generation, code can be downloaded
-        init_dbt_project(
+        await run_in_executor(
+            code_executor,
+            init_dbt_project,
             dbt_project_name,
             working_dir,
         )
@@ -282,17 +296,30 @@ async def execute_code(
 
     # execute
     working_dir = await get_project_dir(redis_client, project_id)
+    # the DuckDB database the block writes, reads of it wait for the block
+    duckdb_database_path = None
+    if IntegrationType(block_setup["source"]) == IntegrationType.DUCKDB or (
+        section_type == SectionType.MOVEMENT
+        and IntegrationType(block_setup["destination"]) == IntegrationType.DUCKDB
+    ):
+        duckdb_settings = await redis_client.get_settings_data(
+            SettingsSectionType.INTEGRATION.value, IntegrationType.DUCKDB.value
+        )
+        duckdb_database_path = (duckdb_settings or {}).get("databaseFilePath")
     if (
         section_type == SectionType.TRANSFORMATION
         and TransformationTool(block_setup["tool"]) == TransformationTool.DBT
     ):
-        result, exception = execute_dbt(
+        result, exception = await run_in_executor(
+            code_executor,
+            execute_dbt,
             model_name=generate_result.modelName,
             model=generate_result.model,
             properties=generate_result.properties,
             project_name=get_dbt_project_name(section_type, section_metadata["title"]),
             integration_type=IntegrationType(block_setup["source"]),
             working_dir=working_dir,
+            duckdb_database_path=duckdb_database_path,
         )
     else:
         source_section_id = block_setup["sourceSectionId"]
@@ -326,14 +353,17 @@ async def execute_code(
             files_to_copy.append(bq_settings["serviceAccountKeyFileName"])
 
         if generate_result.packages:
-            install_packages(generate_result.packages)
+            await install_packages(generate_result.packages)
 
-        result, exception = execute_python(
+        result, exception = await run_in_executor(
+            code_executor,
+            execute_python,
             code=generate_result.code,
             function_name=generate_result.functionName,
             function_args=function_args,
             working_dir=working_dir,
             files_to_copy=files_to_copy,
+            duckdb_database_path=duckdb_database_path,
         )
 
     # parse result and read data
@@ -366,7 +396,7 @@ async def execute_code(
                 integration_settings = await redis_client.get_settings_data(
                     SettingsSectionType.INTEGRATION.value
                 )
-                data_dict = read_df_from_integration(
+                data_dict = await read_df_from_integration(
                     llm=llm,
                     source=source,
                     source_details=source_details,
@@ -383,7 +413,7 @@ async def execute_code(
             else exception
         )
     if not data_dict:
-        await redis_client.delete_block_data(project_id, section_id, block_id, "data")
+        await delete_data_dict_in_block(redis_client, project_id, section_id, block_id)
         return_value = str(result)
     else:
         await set_data_dict_in_block(
@@ -436,7 +466,7 @@ async def save_code(
     await set_current_block(project_id, section_id, block_id, redis_client)
 
     llm = await get_llm_for_project(redis_client, project_id)
-    new_generate_result = update_generate_result(
+    new_generate_result = await update_generate_result(
         llm=llm,
         section_type=SectionType(section_metadata["sectionType"]),
         generate_result=generate_result,
@@ -477,6 +507,7 @@ async def recommend_techniques(
                 project_id,
                 source_section_id,
                 source_block_id,
+                head_only=True,
             )
         else:
             source = block_setup["source"]
@@ -485,7 +516,7 @@ async def recommend_techniques(
             integration_settings = await redis_client.get_settings_data(
                 SettingsSectionType.INTEGRATION.value
             )
-            data_dict = read_df_from_integration(
+            data_dict = await read_df_from_integration(
                 llm=llm,
                 source=source,
                 source_details=source_details,
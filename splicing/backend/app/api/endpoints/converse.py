@@ -4,13 +4,13 @@ import logging
 from fastapi import APIRouter, Depends
 from fastapi.responses import StreamingResponse
 from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.constants import TAG_NOSTREAM
 
 from app.api.dependencies import RedisClient, get_redis_client
 from app.api.endpoints.section import set_current_block
 from app.generated.schema import ConversationPayload, SectionType
 from app.utils.agent.checkpointer import AsyncRedisSaver
-from app.utils.agent.graph import create_graph
-from app.utils.agent.tools import CODE_GENERATOR_NAME
+from app.utils.agent.tools import CODE_GENERATOR_NAME, REDIS_CLIENT_CONFIG_KEY
 from app.utils.converse import (
     get_execution_error_user_message,
     get_generate_code_system_message,
@@ -21,7 +21,7 @@ from app.utils.helper import (
     convert_message_to_dict,
     merge_if_anthropic_content_blocks,
 )
-from app.utils.project_helper import add_chat_messages, get_llm_for_project
+from app.utils.project_helper import add_chat_messages, get_graph_for_project
 
 router = APIRouter()
 
@@ -99,13 +99,13 @@ async def conversation(
                     )
 
     message = HumanMessage(content=payload.message["content"])
-    llm = await get_llm_for_project(redis_client, project_id)
-    graph = create_graph(redis_client, llm, section_type)
+    graph = await get_graph_for_project(redis_client, project_id, section_type)
     config = {
         "configurable": {
             "thread_id": project_id,
             "section_id": section_id,
             "block_id": block_id,
+            REDIS_CLIENT_CONFIG_KEY: redis_client,
         }
     }
 
@@ -155,6 +155,7 @@ async def conversation(
                     if (
                         event["event"] == "on_chat_model_stream"
                         and event["metadata"]["langgraph_node"] == "chatbot"
+                        and TAG_NOSTREAM not in event["tags"]
                         and event["data"]["chunk"].content
                     ):
                         chunk = {
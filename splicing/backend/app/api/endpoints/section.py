@@ -5,7 +5,9 @@ from fastapi import APIRouter, Depends, Response, status
 
 from app.api.dependencies import RedisClient, get_redis_client
 from app.generated.schema import SectionMetadata
+from app.utils.artifact_store import delete_artifacts
 from app.utils.execute import init_dbt_project, rename_dbt_profile
+from app.utils.executor import code_executor, run_in_executor
 from app.utils.helper import generate_id, standardize_name
 from app.utils.project_helper import context_update, get_project_dir
 
@@ -41,6 +43,7 @@ async def delete(
     )
     if os.path.exists(dbt_project_dir):
         shutil.rmtree(dbt_project_dir)
+    delete_artifacts(project_dir, section_id)
 
     await redis_client.delete_all_section_data(project_id, section_id)
     await redis_client.delete_section_id(project_id, section_id)
@@ -73,7 +76,9 @@ async def rename(
             f"{metadata['sectionType'].lower()}_{standardize_name(new_title)}"
         )
         rename_dbt_profile(curr_dbt_project_name, profiles_dir, new_dbt_project_name)
-        init_dbt_project(new_dbt_project_name, project_dir)
+        await run_in_executor(
+            code_executor, init_dbt_project, new_dbt_project_name, project_dir
+        )
 
     metadata["title"] = new_title
     await redis_client.set_section_data(project_id, section_id, "metadata", metadata)
@@ -10,7 +10,8 @@ from app.generated.schema import (
     SettingsData,
     SettingsSectionType,
 )
-from app.utils.helper import standardize_name
+from app.utils.agent.graph import clear_graph_cache
+from app.utils.helper import evict_llms, standardize_name
 from app.utils.project_helper import get_app_dir
 
 router = APIRouter()
@@ -57,6 +58,10 @@ async def add(
     await redis_client.set_settings_data(
         payload.sectionType.value, integration_name, settings
     )
+    if payload.sectionType == SettingsSectionType.LLM:
+        # drop the clients of the previous settings instead of waiting for eviction
+        evict_llms(LLMType(integration_name))
+        clear_graph_cache(LLMType(integration_name))
 
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
@@ -85,6 +90,9 @@ async def delete(
                     os.remove(credentials_path)
 
     await redis_client.delete_settings_data(section_type.value, key)
+    if section_type == SettingsSectionType.LLM:
+        evict_llms(LLMType(key))
+        clear_graph_cache(LLMType(key))
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
@@ -7,6 +7,70 @@ from pydantic_settings import BaseSettings
 class Settings(BaseSettings):
     APP_NAME: str = "Splicing"
     REDIS_URL: str = Field(default="redis://localhost:6379", env="REDIS_URL")
+    # connection pool shared by all requests of a worker
+    REDIS_MAX_CONNECTIONS: int = Field(default=50, env="REDIS_MAX_CONNECTIONS")
+    REDIS_POOL_TIMEOUT: int = Field(default=20, env="REDIS_POOL_TIMEOUT")
+    REDIS_HEALTH_CHECK_INTERVAL: int = Field(
+        default=30, env="REDIS_HEALTH_CHECK_INTERVAL"
+    )
+    # "key" stores every section/block field as its own key, "hash" stores every
+    # section/block as a hash, see migrate_storage.py to convert existing data
+    REDIS_STORAGE_LAYOUT: str = Field(default="key", env="REDIS_STORAGE_LAYOUT")
+    # with "hash" layout, fall back to fields that are not migrated yet
+    REDIS_LEGACY_FALLBACK: bool = Field(default=True, env="REDIS_LEGACY_FALLBACK")
+    # Parquet compression of block data: "zstd", "lz4", "snappy", "gzip" or "none"
+    REDIS_DATA_COMPRESSION: str = Field(default="zstd", env="REDIS_DATA_COMPRESSION")
+    # codec of JSON values stored in Redis: "orjson" or "json"
+    JSON_CODEC: str = Field(default="orjson", env="JSON_CODEC")
+    # block results larger than this (in memory) are stored as files under the project
+    # dir, Redis only keeps the first ARTIFACT_PREVIEW_ROWS rows of them
+    ARTIFACT_THRESHOLD_BYTES: int = Field(
+        default=64 * 1024 * 1024, env="ARTIFACT_THRESHOLD_BYTES"
+    )
+    ARTIFACT_PREVIEW_ROWS: int = Field(default=1000, env="ARTIFACT_PREVIEW_ROWS")
+    # in-process cache of project metadata and settings, invalidated by Redis pub/sub
+    # and expired after LOCAL_CACHE_TTL seconds in case an invalidation is missed
+    LOCAL_CACHE_MAX_SIZE: int = Field(default=1024, env="LOCAL_CACHE_MAX_SIZE")
+    LOCAL_CACHE_TTL: float = Field(default=60, env="LOCAL_CACHE_TTL")
+    # conversation checkpoints kept per project by the compactor running every
+    # CHECKPOINT_COMPACTION_INTERVAL seconds, a retention of 0 disables the compactor
+    CHECKPOINT_RETENTION: int = Field(default=20, env="CHECKPOINT_RETENTION")
+    CHECKPOINT_COMPACTION_INTERVAL: float = Field(
+        default=300, env="CHECKPOINT_COMPACTION_INTERVAL"
+    )
+    # serializer of conversation checkpoints: "msgpack_zstd" or "jsonplus" (uncompressed),
+    # with CHECKPOINT_LEGACY_READ also read checkpoints saved uncompressed
+    CHECKPOINT_SERIALIZER: str = Field(
+        default="msgpack_zstd", env="CHECKPOINT_SERIALIZER"
+    )
+    CHECKPOINT_LEGACY_READ: bool = Field(default=True, env="CHECKPOINT_LEGACY_READ")
+    # compiled conversation graphs kept per LLM settings and section type
+    GRAPH_CACHE_MAX_SIZE: int = Field(default=32, env="GRAPH_CACHE_MAX_SIZE")
+    # tokens of the messages sent by the chatbot node, older turns are summarized to
+    # keep the latest ones within CONTEXT_RECENT_TOKENS, a budget of 0 sends all messages
+    CONTEXT_TOKEN_BUDGET: int = Field(default=16000, env="CONTEXT_TOKEN_BUDGET")
+    CONTEXT_RECENT_TOKENS: int = Field(default=8000, env="CONTEXT_RECENT_TOKENS")
+    # opt-in cache of generated code by model, section type and prompt, expired after
+    # GENERATE_CACHE_TTL seconds, requests can bypass it with `use_cache=false`
+    GENERATE_CACHE_ENABLED: bool = Field(default=False, env="GENERATE_CACHE_ENABLED")
+    GENERATE_CACHE_MAX_SIZE: int = Field(default=256, env="GENERATE_CACHE_MAX_SIZE")
+    GENERATE_CACHE_TTL: float = Field(default=3600, env="GENERATE_CACHE_TTL")
+    # tables resolved by the LLM to read data of an integration, by prompt and settings
+    READ_DATA_CACHE_MAX_SIZE: int = Field(default=256, env="READ_DATA_CACHE_MAX_SIZE")
+    READ_DATA_CACHE_TTL: float = Field(default=86400, env="READ_DATA_CACHE_TTL")
+    # threads reading integrations and files for async endpoints
+    IO_EXECUTOR_MAX_WORKERS: int = Field(default=8, env="IO_EXECUTOR_MAX_WORKERS")
+    # pooled read-only DuckDB connections: idle cursors kept per database, seconds
+    # until an unused connection is closed, and seconds to wait for writers
+    DUCKDB_MAX_CURSORS: int = Field(default=8, env="DUCKDB_MAX_CURSORS")
+    DUCKDB_MAX_IDLE: float = Field(default=60, env="DUCKDB_MAX_IDLE")
+    DUCKDB_LOCK_TIMEOUT: float = Field(default=10, env="DUCKDB_LOCK_TIMEOUT")
+    # chat models reused by all requests, and the connection pool they share
+    LLM_CACHE_MAX_SIZE: int = Field(default=16, env="LLM_CACHE_MAX_SIZE")
+    LLM_MAX_CONNECTIONS: int = Field(default=100, env="LLM_MAX_CONNECTIONS")
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = Field(
+        default=20, env="LLM_MAX_KEEPALIVE_CONNECTIONS"
+    )
     SOURCE_DIR: str = Field(
         default=os.path.dirname(
             os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
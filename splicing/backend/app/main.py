@@ -1,17 +1,62 @@
+import asyncio
 import logging
+from contextlib import asynccontextmanager, suppress
 
 from fastapi import FastAPI, Request, status
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from redis import asyncio as aioredis
 
 from app.api.api import router
-from app.utils.helper import setup_logging
+from app.api.dependencies import (
+    create_checkpoint_compactor,
+    create_local_cache,
+    create_redis_pool,
+)
+from app.core.config import settings
+from app.utils.duckdb_pool import duckdb_pool
+from app.utils.executor import shutdown_code_process, start_code_process
+from app.utils.helper import close_llm_clients, setup_logging
+from app.utils.local_cache import listen_for_invalidations
+from app.utils.redis_client import RedisClient
+from app.utils.storage_migration import apply_migrations
 
 logger = logging.getLogger(__name__)
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    redis_pool = create_redis_pool()
+    app.state.redis = aioredis.Redis(connection_pool=redis_pool)
+    await apply_migrations(RedisClient(app.state.redis))
+    app.state.local_cache = create_local_cache()
+    invalidation_listener = asyncio.create_task(
+        listen_for_invalidations(app.state.redis, app.state.local_cache)
+    )
+    background_tasks = [invalidation_listener]
+    app.state.checkpoint_compactor = create_checkpoint_compactor(app.state.redis)
+    if settings.CHECKPOINT_RETENTION > 0:
+        background_tasks.append(
+            asyncio.create_task(app.state.checkpoint_compactor.run())
+        )
+    start_code_process("app.utils.execute")
+    if settings.DUCKDB_MAX_IDLE > 0:
+        background_tasks.append(asyncio.create_task(duckdb_pool.run()))
+    try:
+        yield
+    finally:
+        for task in background_tasks:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+        await close_llm_clients()
+        duckdb_pool.invalidate()
+        shutdown_code_process()
+        await redis_pool.disconnect()
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -3,8 +3,11 @@ Implementation of a langgraph checkpoint saver using Redis.
 Modified from https://langchain-ai.github.io/langgraph/how-tos/persistence_redis/#checkpointer-implementation
 """
 
+import hashlib
+import json
 from typing import Any, AsyncGenerator, List, Optional, Tuple
 
+from langchain_core.messages import BaseMessage, ToolMessage
 from langchain_core.runnables import RunnableConfig
 from langgraph.checkpoint.base import (
     BaseCheckpointSaver,
@@ -16,10 +19,50 @@ from langgraph.checkpoint.base import (
     get_checkpoint_id,
 )
 from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
 from redis.asyncio import Redis as AsyncRedis
+from redis.asyncio.client import Pipeline
+from redis.exceptions import WatchError
+
+from app.core.config import settings
+from app.utils.agent.serde import get_serializer
+from app.utils.helper import convert_message_to_dict
 
 REDIS_KEY_SEPARATOR = ":"
 
+# channel of the graph state whose messages are stored once in the messages hash of the
+# thread, checkpoints only keep their ids, see `AsyncRedisSaver.aput`
+MESSAGES_CHANNEL = "messages"
+
+# metadata fields indexed for `AsyncRedisSaver.alist` filters, "writes" by the nodes
+# which wrote in a step
+INDEXED_METADATA_KEYS = ["source", "step", "writes"]
+
+# sets the chat history of a thread unless it's already the one of a newer checkpoint,
+# checkpoint ids increase
+SET_CHAT_HISTORY_SCRIPT = """
+local checkpoint_id = redis.call('HGET', KEYS[1], 'checkpoint_id')
+if checkpoint_id and checkpoint_id >= ARGV[1] then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'checkpoint_id', ARGV[1], 'messages', ARGV[2])
+return 1
+"""
+
+# points the latest checkpoint of a thread to a checkpoint unless it already points to
+# a newer one, concurrent saves can finish in any order
+SET_LATEST_CHECKPOINT_SCRIPT = """
+local checkpoint_id = redis.call('GET', KEYS[1])
+if checkpoint_id and checkpoint_id >= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1])
+return 1
+"""
+
+# uncompressed msgpack to tell whether a message was changed, see `_digest_message`
+_digest_serde = JsonPlusSerializer()
+
 
 def _make_redis_checkpoint_key(
     thread_id: str, checkpoint_ns: str, checkpoint_id: str
@@ -30,22 +73,55 @@ def _make_redis_checkpoint_key(
 
 
 def _make_redis_checkpoint_writes_key(
-    thread_id: str,
-    checkpoint_ns: str,
-    checkpoint_id: str,
-    task_id: str,
-    idx: Optional[int],
+    thread_id: str, checkpoint_ns: str, checkpoint_id: str
 ) -> str:
-    if idx is None:
-        return REDIS_KEY_SEPARATOR.join(
-            ["writes", thread_id, checkpoint_ns, checkpoint_id, task_id]
-        )
+    # a hash with all writes of a checkpoint, see `_dump_writes`
+    return REDIS_KEY_SEPARATOR.join(["writes", thread_id, checkpoint_ns, checkpoint_id])
+
 
+def _make_redis_checkpoint_index_key(thread_id: str, checkpoint_ns: str) -> str:
+    # sorted set of the checkpoint ids of a thread, all with score 0 so they're ordered
+    # lexicographically, which is the order they are created in
+    return REDIS_KEY_SEPARATOR.join(["checkpoint_index", thread_id, checkpoint_ns])
+
+
+def _make_redis_checkpoint_latest_key(thread_id: str, checkpoint_ns: str) -> str:
+    return REDIS_KEY_SEPARATOR.join(["checkpoint_latest", thread_id, checkpoint_ns])
+
+
+def _make_redis_checkpoint_namespaces_key(thread_id: str) -> str:
+    return REDIS_KEY_SEPARATOR.join(["checkpoint_namespaces", thread_id])
+
+
+def _make_redis_checkpoint_metadata_index_key(
+    thread_id: str, checkpoint_ns: str, metadata_key: str
+) -> str:
+    # sorted set of "{value}:{checkpoint_id}", ordered lexically, see `_make_metadata_members`
     return REDIS_KEY_SEPARATOR.join(
-        ["writes", thread_id, checkpoint_ns, checkpoint_id, task_id, str(idx)]
+        ["checkpoint_metadata", thread_id, checkpoint_ns, metadata_key]
     )
 
 
+def _make_redis_checkpoint_writes_index_key(thread_id: str) -> str:
+    # set of the writes keys of a thread, to find orphaned writes without a scan
+    return REDIS_KEY_SEPARATOR.join(["checkpoint_writes", thread_id])
+
+
+def _make_redis_checkpoint_threads_key() -> str:
+    # set of the ids of all threads with checkpoints
+    return "checkpoint_threads"
+
+
+def _make_redis_checkpoint_messages_key(thread_id: str) -> str:
+    # hash with the messages of all checkpoints of a thread, see `_dump_messages`
+    return REDIS_KEY_SEPARATOR.join(["checkpoint_messages", thread_id])
+
+
+def _make_redis_chat_history_key(thread_id: str) -> str:
+    # hash with the chat messages of the latest checkpoint and its id, see `_dump_chat_history`
+    return REDIS_KEY_SEPARATOR.join(["chat_history", thread_id])
+
+
 def _parse_redis_checkpoint_key(redis_key: str) -> dict:
     namespace, thread_id, checkpoint_ns, checkpoint_id = redis_key.split(
         REDIS_KEY_SEPARATOR
@@ -60,7 +136,8 @@ def _parse_redis_checkpoint_key(redis_key: str) -> dict:
     }
 
 
-def _parse_redis_checkpoint_writes_key(redis_key: str) -> dict:
+def _parse_redis_legacy_writes_key(redis_key: str) -> dict:
+    """Parse the key of a write stored before all writes of a checkpoint were one hash."""
     namespace, thread_id, checkpoint_ns, checkpoint_id, task_id, idx = redis_key.split(
         REDIS_KEY_SEPARATOR
     )
@@ -76,59 +153,138 @@ def _parse_redis_checkpoint_writes_key(redis_key: str) -> dict:
     }
 
 
-def _filter_keys(
-    keys: List[str], before: Optional[RunnableConfig], limit: Optional[int]
-) -> list:
-    """Filter and sort Redis keys based on optional criteria."""
-    if before:
-        keys = [
-            k
-            for k in keys
-            if _parse_redis_checkpoint_key(k.decode())["checkpoint_id"]
-            < before["configurable"]["checkpoint_id"]
+def _make_metadata_value_prefix(value: Any) -> str:
+    # JSON tells 1 and "1" apart, and the prefix of a value never starts another one
+    return json.dumps(value) + REDIS_KEY_SEPARATOR
+
+
+def _make_metadata_members(metadata: dict, checkpoint_id: str) -> dict[str, list[str]]:
+    """Members of the metadata indexes of a checkpoint, by metadata key."""
+    members = {}
+    for key in INDEXED_METADATA_KEYS:
+        value = metadata.get(key)
+        if key == "writes":
+            values = list(value) if isinstance(value, dict) else []
+        else:
+            values = [value] if isinstance(value, (str, int, float, bool)) else []
+        members[key] = [
+            _make_metadata_value_prefix(value) + checkpoint_id for value in values
         ]
+    return members
 
-    keys = sorted(
-        keys,
-        key=lambda k: _parse_redis_checkpoint_key(k.decode())["checkpoint_id"],
-        reverse=True,
-    )
-    if limit:
-        keys = keys[:limit]
-    return keys
 
+def _make_write_field(task_id: str, idx: int, name: str) -> str:
+    return REDIS_KEY_SEPARATOR.join([task_id, str(idx), name])
 
-def _dump_writes(serde: SerializerProtocol, writes: tuple[str, Any]) -> list[dict]:
-    """Serialize pending writes."""
-    serialized_writes = []
-    for channel, value in writes:
+
+def _dump_writes(
+    serde: SerializerProtocol, task_id: str, writes: tuple[str, Any]
+) -> dict[str, Any]:
+    """Serialize pending writes of a task to fields of the checkpoint writes hash."""
+    serialized_writes = {}
+    for idx, (channel, value) in enumerate(writes):
         type_, serialized_value = serde.dumps_typed(value)
-        serialized_writes.append(
-            {"channel": channel, "type": type_, "value": serialized_value}
-        )
+        serialized_writes[_make_write_field(task_id, idx, "channel")] = channel
+        serialized_writes[_make_write_field(task_id, idx, "type")] = type_
+        serialized_writes[_make_write_field(task_id, idx, "value")] = serialized_value
     return serialized_writes
 
 
 def _load_writes(
-    serde: SerializerProtocol, task_id_to_data: dict[tuple[str, str], dict]
+    serde: SerializerProtocol, writes_data: dict[bytes, bytes]
 ) -> list[PendingWrite]:
-    """Deserialize pending writes."""
+    """Deserialize pending writes from the checkpoint writes hash."""
+    task_id_to_data = {}
+    for field, value in writes_data.items():
+        task_id, idx, name = field.decode().split(REDIS_KEY_SEPARATOR)
+        task_id_to_data.setdefault((task_id, int(idx)), {})[name] = value
     writes = [
         (
             task_id,
-            data[b"channel"].decode(),
-            serde.loads_typed((data[b"type"].decode(), data[b"value"])),
+            data["channel"].decode(),
+            serde.loads_typed((data["type"].decode(), data["value"])),
         )
-        for (task_id, _), data in task_id_to_data.items()
+        for (task_id, _), data in sorted(task_id_to_data.items())
     ]
     return writes
 
 
+def _make_message_version(message_id: str, digest: str) -> str:
+    return REDIS_KEY_SEPARATOR.join([message_id, digest])
+
+
+def _make_message_fields(message_version: str) -> list[str]:
+    return [
+        REDIS_KEY_SEPARATOR.join([message_version, "type"]),
+        REDIS_KEY_SEPARATOR.join([message_version, "value"]),
+    ]
+
+
+def _digest_message(message: BaseMessage) -> str:
+    """
+    Messages can be replaced with a message of the same id (see `add_messages`),
+    so every version of a message is stored by its digest, and older checkpoints
+    still read the version they were saved with.
+    """
+    _, data = _digest_serde.dumps_typed(message)
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def _dump_messages(
+    serde: SerializerProtocol, messages: list[BaseMessage], digests: list[str]
+) -> dict[str, Any]:
+    """Serialize messages to fields of the messages hash."""
+    serialized_messages = {}
+    for message, digest in zip(messages, digests):
+        type_field, value_field = _make_message_fields(
+            _make_message_version(message.id, digest)
+        )
+        (
+            serialized_messages[type_field],
+            serialized_messages[value_field],
+        ) = serde.dumps_typed(message)
+    return serialized_messages
+
+
+def _load_messages(
+    serde: SerializerProtocol, values: list[Optional[bytes]]
+) -> list[BaseMessage]:
+    """Deserialize messages from the type and value fields read with `_make_message_fields`."""
+    return [
+        serde.loads_typed((type_.decode(), value))
+        for type_, value in zip(values[::2], values[1::2])
+        if type_ is not None
+    ]
+
+
+def _dump_chat_history(messages: list[BaseMessage]) -> str:
+    """Messages shown in the chat, converted once so reading them doesn't load the graph state."""
+    chat_history = []
+    for message in messages:
+        if isinstance(message, ToolMessage):
+            continue
+        message_dict = convert_message_to_dict(message)
+        if message.name == "hidden":
+            message_dict["hidden"] = True
+        chat_history.append(message_dict)
+    return json.dumps(chat_history)
+
+
+def _load_metadata(
+    serde: SerializerProtocol, metadata: bytes, metadata_type: Optional[bytes]
+) -> CheckpointMetadata:
+    if metadata_type is None:
+        # saved before metadata was dumped like checkpoints
+        return serde.loads(metadata.decode())
+    return serde.loads_typed((metadata_type.decode(), metadata))
+
+
 def _parse_redis_checkpoint_data(
     serde: SerializerProtocol,
     key: str,
     data: dict,
     pending_writes: Optional[List[PendingWrite]] = None,
+    messages: Optional[list[BaseMessage]] = None,
 ) -> Optional[CheckpointTuple]:
     """Parse checkpoint data retrieved from Redis."""
     if not data:
@@ -147,7 +303,9 @@ def _parse_redis_checkpoint_data(
     }
 
     checkpoint = serde.loads_typed((data[b"type"].decode(), data[b"checkpoint"]))
-    metadata = serde.loads(data[b"metadata"].decode())
+    if messages is not None:
+        checkpoint["channel_values"][MESSAGES_CHANNEL] = messages
+    metadata = _load_metadata(serde, data[b"metadata"], data.get(b"metadata_type"))
     parent_checkpoint_id = data.get(b"parent_checkpoint_id", b"").decode()
     parent_config = (
         {
@@ -174,9 +332,18 @@ class AsyncRedisSaver(BaseCheckpointSaver):
 
     conn: AsyncRedis
 
-    def __init__(self, conn: AsyncRedis) -> None:
-        super().__init__()
+    def __init__(
+        self, conn: AsyncRedis, serde: Optional[SerializerProtocol] = None
+    ) -> None:
+        super().__init__(
+            serde=serde
+            or get_serializer(
+                settings.CHECKPOINT_SERIALIZER, legacy=settings.CHECKPOINT_LEGACY_READ
+            )
+        )
         self.conn = conn
+        self._set_chat_history = conn.register_script(SET_CHAT_HISTORY_SCRIPT)
+        self._set_latest_checkpoint = conn.register_script(SET_LATEST_CHECKPOINT_SCRIPT)
 
     async def aput(
         self,
@@ -205,19 +372,96 @@ class AsyncRedisSaver(BaseCheckpointSaver):
         parent_checkpoint_id = config["configurable"].get("checkpoint_id")
         key = _make_redis_checkpoint_key(thread_id, checkpoint_ns, checkpoint_id)
 
+        # messages are stored once, only the ones not in the parent checkpoint are new
+        messages = checkpoint["channel_values"].get(MESSAGES_CHANNEL)
+        message_ids = message_digests = None
+        new_messages = new_message_digests = []
+        if isinstance(messages, list) and all(
+            isinstance(message, BaseMessage) and message.id for message in messages
+        ):
+            message_ids = [message.id for message in messages]
+            message_digests = [_digest_message(message) for message in messages]
+            parent_message_ids, parent_message_digests = (
+                await self.conn.hmget(
+                    _make_redis_checkpoint_key(
+                        thread_id, checkpoint_ns, parent_checkpoint_id
+                    ),
+                    ["message_ids", "message_digests"],
+                )
+                if parent_checkpoint_id
+                else (None, None)
+            )
+            stored_messages = (
+                set(
+                    zip(
+                        self.serde.loads(parent_message_ids),
+                        self.serde.loads(parent_message_digests),
+                    )
+                )
+                if parent_message_ids and parent_message_digests
+                else set()
+            )
+            new_messages, new_message_digests = [], []
+            for message, digest in zip(messages, message_digests):
+                if (message.id, digest) not in stored_messages:
+                    new_messages.append(message)
+                    new_message_digests.append(digest)
+            checkpoint = {
+                **checkpoint,
+                "channel_values": {
+                    channel: value
+                    for channel, value in checkpoint["channel_values"].items()
+                    if channel != MESSAGES_CHANNEL
+                },
+            }
+
         type_, serialized_checkpoint = self.serde.dumps_typed(checkpoint)
-        serialized_metadata = self.serde.dumps(metadata)
+        metadata_type, serialized_metadata = self.serde.dumps_typed(metadata)
         data = {
             "checkpoint": serialized_checkpoint,
             "type": type_,
             "checkpoint_id": checkpoint_id,
             "metadata": serialized_metadata,
+            "metadata_type": metadata_type,
             "parent_checkpoint_id": parent_checkpoint_id
             if parent_checkpoint_id
             else "",
         }
+        if message_ids is not None:
+            data["message_ids"] = self.serde.dumps(message_ids)
+            data["message_digests"] = self.serde.dumps(message_digests)
 
-        await self.conn.hset(key, mapping=data)
+        async with self.conn.pipeline(transaction=True) as pipe:
+            if new_messages:
+                pipe.hset(
+                    _make_redis_checkpoint_messages_key(thread_id),
+                    mapping=_dump_messages(
+                        self.serde, new_messages, new_message_digests
+                    ),
+                )
+            pipe.hset(key, mapping=data)
+            pipe.zadd(
+                _make_redis_checkpoint_index_key(thread_id, checkpoint_ns),
+                {checkpoint_id: 0},
+            )
+            # checkpoint ids increase, the latest one isn't always the last saved
+            await self._set_latest_checkpoint(
+                keys=[_make_redis_checkpoint_latest_key(thread_id, checkpoint_ns)],
+                args=[checkpoint_id],
+                client=pipe,
+            )
+            pipe.sadd(_make_redis_checkpoint_namespaces_key(thread_id), checkpoint_ns)
+            pipe.sadd(_make_redis_checkpoint_threads_key(), thread_id)
+            self._queue_index_metadata(
+                pipe, thread_id, checkpoint_ns, checkpoint_id, metadata
+            )
+            if message_ids is not None and not checkpoint_ns:
+                await self._set_chat_history(
+                    keys=[_make_redis_chat_history_key(thread_id)],
+                    args=[checkpoint_id, _dump_chat_history(messages)],
+                    client=pipe,
+                )
+            await pipe.execute()
         return {
             "configurable": {
                 "thread_id": thread_id,
@@ -245,11 +489,12 @@ class AsyncRedisSaver(BaseCheckpointSaver):
         checkpoint_ns = config["configurable"]["checkpoint_ns"]
         checkpoint_id = config["configurable"]["checkpoint_id"]
 
-        for idx, data in enumerate(_dump_writes(self.serde, writes)):
-            key = _make_redis_checkpoint_writes_key(
-                thread_id, checkpoint_ns, checkpoint_id, task_id, idx
-            )
-            await self.conn.hset(key, mapping=data)
+        key = _make_redis_checkpoint_writes_key(thread_id, checkpoint_ns, checkpoint_id)
+        if writes:
+            async with self.conn.pipeline(transaction=True) as pipe:
+                pipe.hset(key, mapping=_dump_writes(self.serde, task_id, writes))
+                pipe.sadd(_make_redis_checkpoint_writes_index_key(thread_id), key)
+                await pipe.execute()
         return config
 
     async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
@@ -275,38 +520,35 @@ class AsyncRedisSaver(BaseCheckpointSaver):
         )
         if not checkpoint_key:
             return None
-        checkpoint_data = await self.conn.hgetall(checkpoint_key)
-
-        # load pending writes
         checkpoint_id = (
             checkpoint_id
             or _parse_redis_checkpoint_key(checkpoint_key)["checkpoint_id"]
         )
-        writes_key = _make_redis_checkpoint_writes_key(
-            thread_id, checkpoint_ns, checkpoint_id, "*", None
-        )
-        matching_keys = await self.conn.keys(pattern=writes_key)
-        parsed_keys = [
-            _parse_redis_checkpoint_writes_key(key.decode()) for key in matching_keys
-        ]
-        pending_writes = _load_writes(
-            self.serde,
-            {
-                (parsed_key["task_id"], parsed_key["idx"]): await self.conn.hgetall(key)
-                for key, parsed_key in sorted(
-                    zip(matching_keys, parsed_keys), key=lambda x: x[1]["idx"]
+        # the checkpoint and its pending writes in one round trip
+        async with self.conn.pipeline(transaction=False) as pipe:
+            pipe.hgetall(checkpoint_key)
+            pipe.hgetall(
+                _make_redis_checkpoint_writes_key(
+                    thread_id, checkpoint_ns, checkpoint_id
                 )
-            },
+            )
+            checkpoint_data, writes_data = await pipe.execute()
+        pending_writes = _load_writes(self.serde, writes_data)
+        (messages,) = await self._aget_messages_of_checkpoints(
+            thread_id, [checkpoint_data]
         )
         return _parse_redis_checkpoint_data(
-            self.serde, checkpoint_key, checkpoint_data, pending_writes=pending_writes
+            self.serde,
+            checkpoint_key,
+            checkpoint_data,
+            pending_writes=pending_writes,
+            messages=messages,
         )
 
     async def alist(
         self,
         config: Optional[RunnableConfig],
         *,
-        # TODO: implement filtering
         filter: Optional[dict[str, Any]] = None,
         before: Optional[RunnableConfig] = None,
         limit: Optional[int] = None,
@@ -315,6 +557,8 @@ class AsyncRedisSaver(BaseCheckpointSaver):
 
         This method retrieves a list of checkpoint tuples from Redis based
         on the provided config. The checkpoints are ordered by checkpoint ID in descending order (newest first).
+        Checkpoints are looked up in the metadata indexes of the filter keys in INDEXED_METADATA_KEYS,
+        only the ones matching them are loaded.
 
         Args:
             config (Optional[RunnableConfig]): Base configuration for filtering checkpoints.
@@ -327,12 +571,201 @@ class AsyncRedisSaver(BaseCheckpointSaver):
         """
         thread_id = config["configurable"]["thread_id"]
         checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
-        pattern = _make_redis_checkpoint_key(thread_id, checkpoint_ns, "*")
-        keys = _filter_keys(await self.conn.keys(pattern), before, limit)
-        for key in keys:
-            data = await self.conn.hgetall(key)
-            if data and b"checkpoint" in data and b"metadata" in data:
-                yield _parse_redis_checkpoint_data(self.serde, key.decode(), data)
+        before_id = before["configurable"]["checkpoint_id"] if before else None
+        filter = filter or {}
+
+        # (index key, member prefix) of the filter values, checkpoint ids are after the prefix
+        indexes = []
+        for metadata_key, value in filter.items():
+            members = _make_metadata_members({metadata_key: value}, "")
+            for prefix in members.get(metadata_key, []):
+                indexes.append(
+                    (
+                        _make_redis_checkpoint_metadata_index_key(
+                            thread_id, checkpoint_ns, metadata_key
+                        ),
+                        prefix,
+                    )
+                )
+        if not indexes:
+            indexes.append(
+                (_make_redis_checkpoint_index_key(thread_id, checkpoint_ns), "")
+            )
+        (index_key, prefix), other_indexes = indexes[0], indexes[1:]
+        # with a single filter on an indexed value, every checkpoint of the index matches
+        exact = len(filter) == len(indexes) == 1 and "writes" not in filter
+        batch_size = limit if limit and (exact or not filter) else 100
+
+        num_yielded = 0
+        if prefix:
+            # the prefix ends with the separator, ";" is the character after it
+            upper = f"({prefix}{before_id}" if before_id else f"({prefix[:-1]};"
+            lower = f"[{prefix}"
+        else:
+            upper = f"({before_id}" if before_id else "+"
+            lower = "-"
+        while True:
+            members = await self.conn.zrevrangebylex(
+                index_key, upper, lower, start=0, num=batch_size
+            )
+            if not members:
+                return
+            upper = f"({members[-1].decode()}"
+            checkpoint_ids = [
+                member.decode().removeprefix(prefix) for member in members
+            ]
+            if other_indexes:
+                async with self.conn.pipeline(transaction=False) as pipe:
+                    for other_index_key, other_prefix in other_indexes:
+                        pipe.zmscore(
+                            other_index_key,
+                            [
+                                other_prefix + checkpoint_id
+                                for checkpoint_id in checkpoint_ids
+                            ],
+                        )
+                    all_scores = await pipe.execute()
+                checkpoint_ids = [
+                    checkpoint_id
+                    for checkpoint_id, scores in zip(checkpoint_ids, zip(*all_scores))
+                    if all(score is not None for score in scores)
+                ]
+
+            keys = [
+                _make_redis_checkpoint_key(thread_id, checkpoint_ns, checkpoint_id)
+                for checkpoint_id in checkpoint_ids
+            ]
+            async with self.conn.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.hgetall(key)
+                all_data = await pipe.execute()
+            all_messages = await self._aget_messages_of_checkpoints(thread_id, all_data)
+            for key, data, messages in zip(keys, all_data, all_messages):
+                if not (data and b"checkpoint" in data and b"metadata" in data):
+                    continue
+                checkpoint_tuple = _parse_redis_checkpoint_data(
+                    self.serde, key, data, messages=messages
+                )
+                # the index matches values of the filter, but not exactly a dict of writes
+                if any(
+                    checkpoint_tuple.metadata.get(metadata_key) != value
+                    for metadata_key, value in filter.items()
+                ):
+                    continue
+                yield checkpoint_tuple
+                num_yielded += 1
+                if limit and num_yielded >= limit:
+                    return
+            if len(members) < batch_size:
+                return
+
+    async def _aget_messages_of_checkpoints(
+        self, thread_id: str, all_data: list[dict]
+    ) -> list[Optional[list[BaseMessage]]]:
+        """Messages of checkpoints, None for checkpoints saved with their messages."""
+        all_message_versions = [
+            self._load_message_versions(
+                data[b"message_ids"], data.get(b"message_digests")
+            )
+            if b"message_ids" in data
+            else None
+            for data in all_data
+        ]
+        return await self._aget_messages(thread_id, all_message_versions)
+
+    def _load_message_versions(
+        self, message_ids: bytes, message_digests: Optional[bytes]
+    ) -> list[str]:
+        if not message_digests:
+            return []
+        return [
+            _make_message_version(message_id, digest)
+            for message_id, digest in zip(
+                self.serde.loads(message_ids), self.serde.loads(message_digests)
+            )
+        ]
+
+    async def _aget_messages(
+        self, thread_id: str, all_message_versions: list[Optional[list[str]]]
+    ) -> list[Optional[list[BaseMessage]]]:
+        messages_key = _make_redis_checkpoint_messages_key(thread_id)
+        async with self.conn.pipeline(transaction=False) as pipe:
+            for message_versions in all_message_versions:
+                if message_versions:
+                    pipe.hmget(
+                        messages_key,
+                        [
+                            field
+                            for message_version in message_versions
+                            for field in _make_message_fields(message_version)
+                        ],
+                    )
+            results = iter(await pipe.execute())
+        return [
+            None
+            if message_versions is None
+            else _load_messages(self.serde, next(results))
+            if message_versions
+            else []
+            for message_versions in all_message_versions
+        ]
+
+    async def aget_messages(
+        self, config: RunnableConfig, offset: int = 0, limit: Optional[int] = None
+    ) -> list[BaseMessage]:
+        """
+        Messages of the latest checkpoint of a thread, or of the checkpoint in the config,
+        from `offset` and at most `limit` of them. Only those messages are loaded.
+        """
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_key = await self._aget_checkpoint_key(
+            thread_id, checkpoint_ns, get_checkpoint_id(config)
+        )
+        if not checkpoint_key:
+            return []
+        end = offset + limit if limit is not None else None
+        message_ids, message_digests = await self.conn.hmget(
+            checkpoint_key, ["message_ids", "message_digests"]
+        )
+        if message_ids is None:
+            # saved with its messages
+            checkpoint_tuple = await self.aget_tuple(config)
+            messages = checkpoint_tuple.checkpoint["channel_values"].get(
+                MESSAGES_CHANNEL, []
+            )
+            return messages[offset:end]
+        (messages,) = await self._aget_messages(
+            thread_id,
+            [self._load_message_versions(message_ids, message_digests)[offset:end]],
+        )
+        return messages
+
+    async def aget_chat_history(self, thread_id: str) -> list[dict]:
+        """
+        Chat messages of the latest checkpoint of a thread as dicts of `convert_message_to_dict`,
+        with "hidden": True for hidden messages.
+        """
+        chat_history = await self.conn.hget(
+            _make_redis_chat_history_key(thread_id), "messages"
+        )
+        if chat_history is not None:
+            return json.loads(chat_history)
+
+        # saved before chat histories were kept, or no checkpoint yet
+        checkpoint_tuple = await self.aget_tuple(
+            {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+        )
+        if checkpoint_tuple is None:
+            return []
+        chat_history = _dump_chat_history(
+            checkpoint_tuple.checkpoint["channel_values"].get(MESSAGES_CHANNEL, [])
+        )
+        await self._set_chat_history(
+            keys=[_make_redis_chat_history_key(thread_id)],
+            args=[checkpoint_tuple.checkpoint["id"], chat_history],
+        )
+        return json.loads(chat_history)
 
     async def _aget_checkpoint_key(
         self, thread_id: str, checkpoint_ns: str, checkpoint_id: Optional[str]
@@ -341,24 +774,426 @@ class AsyncRedisSaver(BaseCheckpointSaver):
         if checkpoint_id:
             return _make_redis_checkpoint_key(thread_id, checkpoint_ns, checkpoint_id)
 
-        all_keys = await self.conn.keys(
-            _make_redis_checkpoint_key(thread_id, checkpoint_ns, "*")
+        latest_checkpoint_id = await self.conn.get(
+            _make_redis_checkpoint_latest_key(thread_id, checkpoint_ns)
         )
-        if not all_keys:
+        if not latest_checkpoint_id:
             return None
-
-        latest_key = max(
-            all_keys,
-            key=lambda k: _parse_redis_checkpoint_key(k.decode())["checkpoint_id"],
+        return _make_redis_checkpoint_key(
+            thread_id, checkpoint_ns, latest_checkpoint_id.decode()
         )
-        return latest_key.decode()
 
     async def adelete_checkpoint(self, thread_id: str) -> None:
-        key_patterns = [
-            REDIS_KEY_SEPARATOR.join(["checkpoint", thread_id, "*"]),
-            REDIS_KEY_SEPARATOR.join(["writes", thread_id, "*"]),
+        """Delete all checkpoints and writes of a thread."""
+        namespaces_key = _make_redis_checkpoint_namespaces_key(thread_id)
+        checkpoint_namespaces = [
+            ns.decode() for ns in await self.conn.smembers(namespaces_key)
+        ]
+        async with self.conn.pipeline(transaction=False) as pipe:
+            for checkpoint_ns in checkpoint_namespaces:
+                pipe.zrange(
+                    _make_redis_checkpoint_index_key(thread_id, checkpoint_ns), 0, -1
+                )
+            all_checkpoint_ids = await pipe.execute()
+
+        writes_index_key = _make_redis_checkpoint_writes_index_key(thread_id)
+        keys = [
+            namespaces_key,
+            writes_index_key,
+            _make_redis_checkpoint_messages_key(thread_id),
+            _make_redis_chat_history_key(thread_id),
+            *[key.decode() for key in await self.conn.smembers(writes_index_key)],
+        ]
+        for checkpoint_ns, checkpoint_ids in zip(
+            checkpoint_namespaces, all_checkpoint_ids
+        ):
+            keys.append(_make_redis_checkpoint_index_key(thread_id, checkpoint_ns))
+            keys.append(_make_redis_checkpoint_latest_key(thread_id, checkpoint_ns))
+            keys += [
+                _make_redis_checkpoint_metadata_index_key(
+                    thread_id, checkpoint_ns, metadata_key
+                )
+                for metadata_key in INDEXED_METADATA_KEYS
+            ]
+            for checkpoint_id in checkpoint_ids:
+                checkpoint_id = checkpoint_id.decode()
+                keys.append(
+                    _make_redis_checkpoint_key(thread_id, checkpoint_ns, checkpoint_id)
+                )
+                keys.append(
+                    _make_redis_checkpoint_writes_key(
+                        thread_id, checkpoint_ns, checkpoint_id
+                    )
+                )
+        async with self.conn.pipeline(transaction=True) as pipe:
+            pipe.unlink(*keys)
+            pipe.srem(_make_redis_checkpoint_threads_key(), thread_id)
+            await pipe.execute()
+
+    async def aprune(self, thread_id: str, keep: int) -> int:
+        """
+        Delete all but the latest `keep` checkpoints of each namespace of a thread,
+        writes whose checkpoint doesn't exist anymore and messages of no checkpoint.
+        Returns the number of deleted keys and messages.
+        """
+        if keep < 1:
+            raise ValueError("At least the latest checkpoint must be kept")
+        checkpoint_namespaces = [
+            ns.decode()
+            for ns in await self.conn.smembers(
+                _make_redis_checkpoint_namespaces_key(thread_id)
+            )
+        ]
+        async with self.conn.pipeline(transaction=False) as pipe:
+            for checkpoint_ns in checkpoint_namespaces:
+                pipe.zrange(
+                    _make_redis_checkpoint_index_key(thread_id, checkpoint_ns),
+                    0,
+                    -keep - 1,
+                )
+            all_checkpoint_ids = await pipe.execute()
+        # metadata of the checkpoints to delete, to remove them from the metadata indexes
+        async with self.conn.pipeline(transaction=False) as pipe:
+            for checkpoint_ns, checkpoint_ids in zip(
+                checkpoint_namespaces, all_checkpoint_ids
+            ):
+                for checkpoint_id in checkpoint_ids:
+                    pipe.hmget(
+                        _make_redis_checkpoint_key(
+                            thread_id, checkpoint_ns, checkpoint_id.decode()
+                        ),
+                        ["metadata", "metadata_type"],
+                    )
+            all_metadata = iter(await pipe.execute())
+
+        keys = []
+        async with self.conn.pipeline(transaction=True) as pipe:
+            for checkpoint_ns, checkpoint_ids in zip(
+                checkpoint_namespaces, all_checkpoint_ids
+            ):
+                if not checkpoint_ids:
+                    continue
+                pipe.zrem(
+                    _make_redis_checkpoint_index_key(thread_id, checkpoint_ns),
+                    *checkpoint_ids,
+                )
+                for checkpoint_id in checkpoint_ids:
+                    checkpoint_id = checkpoint_id.decode()
+                    metadata, metadata_type = next(all_metadata)
+                    if metadata is not None:
+                        self._queue_unindex_metadata(
+                            pipe,
+                            thread_id,
+                            checkpoint_ns,
+                            checkpoint_id,
+                            _load_metadata(self.serde, metadata, metadata_type),
+                        )
+                    keys.append(
+                        _make_redis_checkpoint_key(
+                            thread_id, checkpoint_ns, checkpoint_id
+                        )
+                    )
+                    keys.append(
+                        _make_redis_checkpoint_writes_key(
+                            thread_id, checkpoint_ns, checkpoint_id
+                        )
+                    )
+            if keys:
+                pipe.unlink(*keys)
+            results = await pipe.execute()
+        num_deleted = results[-1] if keys else 0
+
+        # writes are saved after their checkpoint, so without one they are orphaned,
+        # this includes the writes of the checkpoints deleted above
+        writes_index_key = _make_redis_checkpoint_writes_index_key(thread_id)
+        writes_keys = [
+            key.decode() for key in await self.conn.smembers(writes_index_key)
+        ]
+        async with self.conn.pipeline(transaction=False) as pipe:
+            for key in writes_keys:
+                parsed_key = key.split(REDIS_KEY_SEPARATOR)
+                pipe.exists(_make_redis_checkpoint_key(*parsed_key[1:]))
+            exists = await pipe.execute()
+        orphaned_keys = [key for key, e in zip(writes_keys, exists) if not e]
+        if orphaned_keys:
+            async with self.conn.pipeline(transaction=True) as pipe:
+                pipe.unlink(*orphaned_keys)
+                pipe.srem(writes_index_key, *orphaned_keys)
+                num_deleted += (await pipe.execute())[0]
+
+        num_deleted += await self._aprune_messages(thread_id, checkpoint_namespaces)
+        return num_deleted
+
+    async def _aprune_messages(
+        self, thread_id: str, checkpoint_namespaces: list[str]
+    ) -> int:
+        messages_key = _make_redis_checkpoint_messages_key(thread_id)
+        async with self.conn.pipeline(transaction=True) as pipe:
+            try:
+                # skip if a checkpoint saves new messages meanwhile, they are not
+                # referenced by the checkpoints read here yet
+                await pipe.watch(messages_key)
+                checkpoint_keys = [
+                    _make_redis_checkpoint_key(
+                        thread_id, checkpoint_ns, checkpoint_id.decode()
+                    )
+                    for checkpoint_ns in checkpoint_namespaces
+                    for checkpoint_id in await pipe.zrange(
+                        _make_redis_checkpoint_index_key(thread_id, checkpoint_ns),
+                        0,
+                        -1,
+                    )
+                ]
+                referenced_message_versions = set()
+                for checkpoint_key in checkpoint_keys:
+                    message_ids, message_digests = await pipe.hmget(
+                        checkpoint_key, ["message_ids", "message_digests"]
+                    )
+                    if message_ids:
+                        referenced_message_versions.update(
+                            self._load_message_versions(message_ids, message_digests)
+                        )
+                message_versions = {
+                    field.decode().rsplit(REDIS_KEY_SEPARATOR, 1)[0]
+                    for field in await pipe.hkeys(messages_key)
+                }
+                unreferenced_message_versions = (
+                    message_versions - referenced_message_versions
+                )
+                if not unreferenced_message_versions:
+                    return 0
+                pipe.multi()
+                pipe.hdel(
+                    messages_key,
+                    *[
+                        field
+                        for message_version in unreferenced_message_versions
+                        for field in _make_message_fields(message_version)
+                    ],
+                )
+                await pipe.execute()
+                return len(unreferenced_message_versions)
+            except WatchError:
+                return 0
+
+    async def aget_memory_usage(self, thread_id: str) -> dict:
+        """Number of checkpoints of a thread and bytes used by them, their writes and messages."""
+        checkpoint_namespaces = [
+            ns.decode()
+            for ns in await self.conn.smembers(
+                _make_redis_checkpoint_namespaces_key(thread_id)
+            )
         ]
-        for pattern in key_patterns:
-            all_keys = await self.conn.keys(pattern)
-            for key in all_keys:
-                await self.conn.delete(key.decode())
+        async with self.conn.pipeline(transaction=False) as pipe:
+            for checkpoint_ns in checkpoint_namespaces:
+                pipe.zrange(
+                    _make_redis_checkpoint_index_key(thread_id, checkpoint_ns), 0, -1
+                )
+            all_checkpoint_ids = await pipe.execute()
+
+        keys = [
+            _make_redis_checkpoint_messages_key(thread_id),
+            _make_redis_chat_history_key(thread_id),
+        ]
+        for checkpoint_ns, checkpoint_ids in zip(
+            checkpoint_namespaces, all_checkpoint_ids
+        ):
+            keys.append(_make_redis_checkpoint_index_key(thread_id, checkpoint_ns))
+            keys += [
+                _make_redis_checkpoint_metadata_index_key(
+                    thread_id, checkpoint_ns, metadata_key
+                )
+                for metadata_key in INDEXED_METADATA_KEYS
+            ]
+            for checkpoint_id in checkpoint_ids:
+                checkpoint_id = checkpoint_id.decode()
+                keys.append(
+                    _make_redis_checkpoint_key(thread_id, checkpoint_ns, checkpoint_id)
+                )
+                keys.append(
+                    _make_redis_checkpoint_writes_key(
+                        thread_id, checkpoint_ns, checkpoint_id
+                    )
+                )
+        async with self.conn.pipeline(transaction=False) as pipe:
+            for key in keys:
+                # samples=0 measures all fields of the hashes
+                pipe.memory_usage(key, samples=0)
+            memory_usages = await pipe.execute()
+        return {
+            "numCheckpoints": sum(len(ids) for ids in all_checkpoint_ids),
+            "memoryBytes": sum(usage or 0 for usage in memory_usages),
+        }
+
+    async def alist_threads(self) -> list[str]:
+        """Ids of all threads with checkpoints."""
+        return [
+            thread_id.decode()
+            for thread_id in await self.conn.smembers(
+                _make_redis_checkpoint_threads_key()
+            )
+        ]
+
+    def _queue_index_metadata(
+        self,
+        pipe: Pipeline,
+        thread_id: str,
+        checkpoint_ns: str,
+        checkpoint_id: str,
+        metadata: CheckpointMetadata,
+    ) -> None:
+        for metadata_key, members in _make_metadata_members(
+            metadata, checkpoint_id
+        ).items():
+            if members:
+                pipe.zadd(
+                    _make_redis_checkpoint_metadata_index_key(
+                        thread_id, checkpoint_ns, metadata_key
+                    ),
+                    dict.fromkeys(members, 0),
+                )
+
+    def _queue_unindex_metadata(
+        self,
+        pipe: Pipeline,
+        thread_id: str,
+        checkpoint_ns: str,
+        checkpoint_id: str,
+        metadata: CheckpointMetadata,
+    ) -> None:
+        for metadata_key, members in _make_metadata_members(
+            metadata, checkpoint_id
+        ).items():
+            if members:
+                pipe.zrem(
+                    _make_redis_checkpoint_metadata_index_key(
+                        thread_id, checkpoint_ns, metadata_key
+                    ),
+                    *members,
+                )
+
+    async def aindex_metadata(self) -> None:
+        """Index metadata of checkpoints saved before it was indexed."""
+        async with self.conn.pipeline(transaction=False) as pipe:
+            async for key in self.conn.scan_iter("checkpoint:*"):
+                metadata, metadata_type = await self.conn.hmget(
+                    key, ["metadata", "metadata_type"]
+                )
+                if metadata is None:
+                    continue
+                parsed_key = _parse_redis_checkpoint_key(key.decode())
+                self._queue_index_metadata(
+                    pipe,
+                    parsed_key["thread_id"],
+                    parsed_key["checkpoint_ns"],
+                    parsed_key["checkpoint_id"],
+                    _load_metadata(self.serde, metadata, metadata_type),
+                )
+            await pipe.execute()
+
+    async def aindex_checkpoints(self) -> None:
+        """Index checkpoints saved before they were indexed per thread."""
+        latest_checkpoint_ids = {}
+        async with self.conn.pipeline(transaction=False) as pipe:
+            async for key in self.conn.scan_iter("checkpoint:*"):
+                parsed_key = _parse_redis_checkpoint_key(key.decode())
+                thread_id = parsed_key["thread_id"]
+                checkpoint_ns = parsed_key["checkpoint_ns"]
+                checkpoint_id = parsed_key["checkpoint_id"]
+                pipe.zadd(
+                    _make_redis_checkpoint_index_key(thread_id, checkpoint_ns),
+                    {checkpoint_id: 0},
+                )
+                pipe.sadd(
+                    _make_redis_checkpoint_namespaces_key(thread_id), checkpoint_ns
+                )
+                latest_checkpoint_ids[(thread_id, checkpoint_ns)] = max(
+                    checkpoint_id,
+                    latest_checkpoint_ids.get((thread_id, checkpoint_ns), ""),
+                )
+            for (
+                thread_id,
+                checkpoint_ns,
+            ), checkpoint_id in latest_checkpoint_ids.items():
+                # a pointer which exists can be set by a newer checkpoint
+                await self._set_latest_checkpoint(
+                    keys=[_make_redis_checkpoint_latest_key(thread_id, checkpoint_ns)],
+                    args=[checkpoint_id],
+                    client=pipe,
+                )
+            await pipe.execute()
+
+    async def aindex_threads_and_writes(self) -> None:
+        """Index threads and writes saved before they were indexed."""
+        prefix = _make_redis_checkpoint_namespaces_key("")
+        async with self.conn.pipeline(transaction=False) as pipe:
+            async for key in self.conn.scan_iter(prefix + "*"):
+                thread_id = key.decode().removeprefix(prefix)
+                pipe.sadd(_make_redis_checkpoint_threads_key(), thread_id)
+            async for key in self.conn.scan_iter("writes:*"):
+                key = key.decode()
+                thread_id = key.split(REDIS_KEY_SEPARATOR)[1]
+                pipe.sadd(_make_redis_checkpoint_writes_index_key(thread_id), key)
+            await pipe.execute()
+
+    async def aversion_messages(self) -> None:
+        """Store messages saved by their id alone under their id and digest."""
+        prefix = _make_redis_checkpoint_messages_key("")
+        async for key in self.conn.scan_iter(prefix + "*"):
+            fields = await self.conn.hgetall(key)
+            messages = {}
+            for field, value in fields.items():
+                # <message>:type, versions are <message>:<digest>:type
+                parts = field.decode().split(REDIS_KEY_SEPARATOR)
+                if len(parts) == 2 and parts[1] == "type":
+                    _, value_field = _make_message_fields(parts[0])
+                    messages[parts[0]] = self.serde.loads_typed(
+                        (value.decode(), fields[value_field.encode()])
+                    )
+            if not messages:
+                continue
+            async with self.conn.pipeline(transaction=True) as pipe:
+                pipe.hset(
+                    key,
+                    mapping=_dump_messages(
+                        self.serde,
+                        list(messages.values()),
+                        [_digest_message(message) for message in messages.values()],
+                    ),
+                )
+                pipe.hdel(
+                    key,
+                    *[
+                        field
+                        for message_id in messages
+                        for field in _make_message_fields(message_id)
+                    ],
+                )
+                await pipe.execute()
+
+    async def amerge_writes(self) -> None:
+        """Merge writes saved as one hash per write into one hash per checkpoint."""
+        async for key in self.conn.scan_iter("writes:*"):
+            key = key.decode()
+            if len(key.split(REDIS_KEY_SEPARATOR)) != 6:
+                continue
+            parsed_key = _parse_redis_legacy_writes_key(key)
+            data = await self.conn.hgetall(key)
+            async with self.conn.pipeline(transaction=True) as pipe:
+                pipe.hset(
+                    _make_redis_checkpoint_writes_key(
+                        parsed_key["thread_id"],
+                        parsed_key["checkpoint_ns"],
+                        parsed_key["checkpoint_id"],
+                    ),
+                    mapping={
+                        _make_write_field(
+                            parsed_key["task_id"], parsed_key["idx"], name.decode()
+                        ): value
+                        for name, value in data.items()
+                    },
+                )
+                pipe.unlink(key)
+                await pipe.execute()
+        async for key in self.conn.scan_iter("writes_index:*"):
+            await self.conn.unlink(key)
@@ -0,0 +1,97 @@
+"""
+Background compaction of conversation checkpoints: every graph step saves a full
+checkpoint with all messages, so only the latest ones of each thread are kept.
+"""
+
+import asyncio
+import json
+import logging
+
+from redis import asyncio as aioredis
+
+from app.utils.agent.checkpointer import AsyncRedisSaver
+from app.utils.helper import generate_id
+
+logger = logging.getLogger(__name__)
+
+# taken by the worker compacting in an interval, it expires with the interval
+COMPACTION_LOCK_KEY = "checkpoint_compaction_lock"
+# stats of the compactions of all workers, any worker can answer /metrics
+COMPACTION_STATS_KEY = "checkpoint_compaction_stats"
+
+# extends the lock only if it's still held by the given token
+RENEW_LOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("PEXPIRE", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class CheckpointCompactor:
+    """Prunes checkpoints of all threads every `interval` seconds, keeping the latest `keep`."""
+
+    def __init__(self, redis: aioredis.Redis, keep: int, interval: float) -> None:
+        self.redis = redis
+        self.saver = AsyncRedisSaver(redis)
+        self.keep = keep
+        self.interval = interval
+        self._renew_lock = redis.register_script(RENEW_LOCK_SCRIPT)
+
+    async def _hold_lock(self, token: str) -> bool:
+        return bool(
+            await self._renew_lock(
+                keys=[COMPACTION_LOCK_KEY], args=[token, int(self.interval * 1000)]
+            )
+        )
+
+    async def compact(self, token: str | None = None) -> None:
+        """
+        Prunes all threads, with the `token` of the lock only while it's held:
+        a compaction outliving its lock stops before another worker's one prunes too.
+        """
+        # checkpoint memory per project (thread) as of this compaction
+        projects, num_deleted_keys = {}, 0
+        for thread_id in await self.saver.alist_threads():
+            if token is not None and not await self._hold_lock(token):
+                logger.warning("CHECKPOINT - compaction lock lost, stopping")
+                break
+            num_deleted_keys += await self.saver.aprune(thread_id, self.keep)
+            projects[thread_id] = await self.saver.aget_memory_usage(thread_id)
+        else:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hincrby(COMPACTION_STATS_KEY, "runs", 1)
+                pipe.hincrby(COMPACTION_STATS_KEY, "deletedKeys", num_deleted_keys)
+                pipe.hset(COMPACTION_STATS_KEY, "projects", json.dumps(projects))
+                await pipe.execute()
+            return
+        await self.redis.hincrby(COMPACTION_STATS_KEY, "deletedKeys", num_deleted_keys)
+
+    async def run(self) -> None:
+        """
+        Compacts periodically, runs until it's cancelled. Every worker runs this,
+        but only one of them compacts in an interval.
+        """
+        while True:
+            # not at startup, when all workers start at once
+            await asyncio.sleep(self.interval)
+            try:
+                token = generate_id()
+                if await self.redis.set(
+                    COMPACTION_LOCK_KEY, token, nx=True, px=int(self.interval * 1000)
+                ):
+                    await self.compact(token)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("CHECKPOINT - compaction failed")
+
+    async def get_stats(self) -> dict:
+        stats = await self.redis.hgetall(COMPACTION_STATS_KEY)
+        projects = json.loads(stats.get(b"projects", b"{}"))
+        return {
+            "runs": int(stats.get(b"runs", 0)),
+            "deletedKeys": int(stats.get(b"deletedKeys", 0)),
+            "memoryBytes": sum(p["memoryBytes"] for p in projects.values()),
+            "projects": projects,
+        }
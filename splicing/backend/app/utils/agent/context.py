@@ -0,0 +1,164 @@
+"""
+Keeps the messages sent by the chatbot node within a token budget: the system prompt
+and the recent turns are sent as they are, older turns are replaced with a rolling
+summary that is saved in the graph state and extended as the conversation grows.
+"""
+
+import logging
+import os
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langgraph.constants import TAG_NOSTREAM
+
+from app.core.config import settings
+from app.utils.helper import merge_if_anthropic_content_blocks
+from app.utils.prompt_manager import PromptManager
+
+logger = logging.getLogger(__name__)
+
+dir_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+prompt_manager = PromptManager(os.path.join(dir_path, "prompts.yaml"))
+
+# rough number of characters per token of English text and code
+CHARS_PER_TOKEN = 4
+# tokens of the role and separators of each message
+TOKENS_PER_MESSAGE = 4
+
+
+def count_tokens(messages: list[BaseMessage]) -> int:
+    """Estimates tokens without a tokenizer, the same way for every provider."""
+    num_chars = 0
+    for message in messages:
+        num_chars += len(merge_if_anthropic_content_blocks(message.content))
+        if isinstance(message, AIMessage):
+            num_chars += sum(len(str(call)) for call in message.tool_calls)
+    return num_chars // CHARS_PER_TOKEN + TOKENS_PER_MESSAGE * len(messages)
+
+
+def format_transcript(messages: list[BaseMessage]) -> str:
+    lines = []
+    for message in messages:
+        content = merge_if_anthropic_content_blocks(message.content)
+        if isinstance(message, AIMessage) and message.tool_calls:
+            tools = ", ".join(call["name"] for call in message.tool_calls)
+            content = f"{content}\n(called {tools})".strip()
+        lines.append(f"[{message.type}] {content}")
+    return "\n\n".join(lines)
+
+
+def find_cutoff(messages: list[BaseMessage], max_tokens: int) -> int:
+    """
+    Returns the index of the first message of the recent turns within `max_tokens`,
+    turns start with a user message so tool calls are never split from their results.
+    The last turn is always kept.
+    """
+    cutoff = 0
+    num_tokens = 0
+    for i in range(len(messages) - 1, -1, -1):
+        num_tokens += count_tokens([messages[i]])
+        if isinstance(messages[i], HumanMessage):
+            if num_tokens > max_tokens and cutoff:
+                break
+            cutoff = i
+    return cutoff
+
+
+class ContextManager:
+    """
+    Trims conversations longer than `token_budget` tokens, keeping the latest turns
+    within `recent_tokens` tokens, a budget of 0 sends all messages.
+    """
+
+    def __init__(self, token_budget: int, recent_tokens: int) -> None:
+        self.token_budget = token_budget
+        self.recent_tokens = recent_tokens
+        self.num_calls = 0
+        self.num_summaries = 0
+        self.input_tokens = 0
+        self.saved_tokens = 0
+
+    async def asummarize(
+        self, llm: BaseChatModel, summary: str, messages: list[BaseMessage]
+    ) -> str:
+        response = await llm.ainvoke(
+            [
+                SystemMessage(
+                    content=prompt_manager.get_prompt(
+                        "conversation", "summary_system_message"
+                    )
+                ),
+                HumanMessage(
+                    content=prompt_manager.get_prompt(
+                        "conversation",
+                        "summary_user_message",
+                        summary=summary or "None",
+                        messages=format_transcript(messages),
+                    )
+                ),
+            ],
+            # not streamed to the user with the chatbot response
+            config={"tags": [TAG_NOSTREAM]},
+        )
+        self.num_summaries += 1
+        return merge_if_anthropic_content_blocks(response.content)
+
+    async def atrim(
+        self, llm: BaseChatModel, state: dict
+    ) -> tuple[list[BaseMessage], dict]:
+        """Returns the messages to send and the state update of a new summary."""
+        messages = state["messages"]
+        update = {}
+        if self.token_budget <= 0:
+            return messages, update
+
+        num_system = 0
+        while num_system < len(messages) and isinstance(
+            messages[num_system], SystemMessage
+        ):
+            num_system += 1
+        system_messages = messages[:num_system]
+        summary = state.get("summary", "")
+        num_summarized = max(state.get("num_summarized", 0), num_system)
+        recent_messages = messages[num_summarized:]
+
+        summary_messages = self._get_summary_messages(summary)
+        num_tokens = count_tokens(system_messages + summary_messages + recent_messages)
+        if num_tokens > self.token_budget:
+            cutoff = find_cutoff(recent_messages, self.recent_tokens)
+            if cutoff:
+                summary = await self.asummarize(llm, summary, recent_messages[:cutoff])
+                num_summarized += cutoff
+                recent_messages = recent_messages[cutoff:]
+                update = {"summary": summary, "num_summarized": num_summarized}
+                summary_messages = self._get_summary_messages(summary)
+                logger.debug("CONTEXT - summarized %d messages", num_summarized)
+
+        trimmed = system_messages + summary_messages + recent_messages
+        num_tokens = count_tokens(trimmed)
+        self.num_calls += 1
+        self.input_tokens += num_tokens
+        self.saved_tokens += max(count_tokens(messages) - num_tokens, 0)
+        return trimmed, update
+
+    @staticmethod
+    def _get_summary_messages(summary: str) -> list[BaseMessage]:
+        if not summary:
+            return []
+        content = prompt_manager.get_prompt(
+            "conversation", "summary_context_user_message", summary=summary
+        )
+        return [HumanMessage(content=content, name="hidden")]
+
+    def get_stats(self) -> dict:
+        return {
+            "calls": self.num_calls,
+            "summaries": self.num_summaries,
+            "inputTokens": self.input_tokens,
+            "savedTokens": self.saved_tokens,
+        }
+
+
+context_manager = ContextManager(
+    settings.CONTEXT_TOKEN_BUDGET, settings.CONTEXT_RECENT_TOKENS
+)
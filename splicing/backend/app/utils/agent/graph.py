@@ -1,4 +1,7 @@
-from typing import TYPE_CHECKING, Annotated
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Annotated
 
 from langchain_anthropic import ChatAnthropic
 from langchain_core.language_models import BaseChatModel
@@ -7,22 +10,27 @@ from langgraph.graph import START, StateGraph
 from langgraph.graph.graph import CompiledGraph
 from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode, tools_condition
+from redis import asyncio as aioredis
 from typing_extensions import TypedDict
 
-from app.generated.schema import SectionType
+from app.core.config import settings
+from app.generated.schema import LLMType, SectionType
 from app.utils.agent.checkpointer import AsyncRedisSaver
+from app.utils.agent.context import context_manager
 from app.utils.agent.tools import create_tools
-
-if TYPE_CHECKING:
-    from app.utils.redis_client import RedisClient
+from app.utils.helper import get_llm
+from app.utils.prompt_cache import add_cache_breakpoints
 
 
 class State(TypedDict):
     messages: Annotated[list, add_messages]
+    # rolling summary of the first `num_summarized` messages, see context
+    summary: str
+    num_summarized: int
 
 
 def create_graph(
-    redis_client: "RedisClient",
+    redis: aioredis.Redis,
     llm: BaseChatModel,
     section_type: SectionType | None = None,
 ) -> CompiledGraph:
@@ -34,11 +42,13 @@ def create_graph(
         elif isinstance(llm, ChatAnthropic):
             kwargs["tool_choice"] = {"type": "auto", "disable_parallel_tool_use": True}
 
-        tools = create_tools(redis_client, section_type)
+        tools = create_tools(section_type)
         llm_with_tools = llm.bind_tools(tools, **kwargs)
 
-        def chatbot(state: State):
-            return {"messages": [llm_with_tools.invoke(state["messages"])]}
+        async def chatbot(state: State):
+            messages, update = await context_manager.atrim(llm, state)
+            messages = add_cache_breakpoints(llm, messages, conversation=True)
+            return {"messages": [await llm_with_tools.ainvoke(messages)], **update}
 
         graph_builder.add_node("chatbot", chatbot)
 
@@ -52,15 +62,60 @@ def create_graph(
         graph_builder.add_edge("tools", "chatbot")
     else:
 
-        def chatbot(state: State):
-            return {"messages": [llm.invoke(state["messages"])]}
+        async def chatbot(state: State):
+            messages, update = await context_manager.atrim(llm, state)
+            messages = add_cache_breakpoints(llm, messages, conversation=True)
+            return {"messages": [await llm.ainvoke(messages)], **update}
 
         graph_builder.add_node("chatbot", chatbot)
 
     graph_builder.add_edge(START, "chatbot")
 
-    memory = AsyncRedisSaver(redis_client.redis)
+    # tools get the RedisClient of the request from the config, not the cached graph
+    memory = AsyncRedisSaver(redis)
     return graph_builder.compile(
         checkpointer=memory,
         interrupt_before=["tools"] if section_type else None,
     )
+
+
+# compiled graphs by Redis connection, LLM type, settings fingerprint and section type,
+# they don't keep any state of a request so every request of a project can share them
+_graphs: OrderedDict[tuple, CompiledGraph] = OrderedDict()
+
+
+def get_llm_fingerprint(llm_type: LLMType, llm_settings: dict) -> str:
+    value = json.dumps([llm_type.value, llm_settings], sort_keys=True)
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+def get_graph(
+    redis: aioredis.Redis,
+    llm_type: LLMType,
+    llm_settings: dict,
+    section_type: SectionType | None = None,
+) -> CompiledGraph:
+    """Returns the cached graph of the LLM settings or compiles a new one."""
+    key = (
+        redis,
+        llm_type,
+        get_llm_fingerprint(llm_type, llm_settings),
+        section_type,
+    )
+    graph = _graphs.get(key)
+    if graph is None:
+        llm = get_llm(llm_type, llm_settings)
+        graph = create_graph(redis, llm, section_type)
+        _graphs[key] = graph
+        while len(_graphs) > settings.GRAPH_CACHE_MAX_SIZE:
+            _graphs.popitem(last=False)
+    else:
+        _graphs.move_to_end(key)
+    return graph
+
+
+def clear_graph_cache(llm_type: LLMType | None = None) -> None:
+    """Evicts the graphs of an LLM type, or all of them."""
+    for key in list(_graphs):
+        if llm_type is None or key[1] == llm_type:
+            del _graphs[key]
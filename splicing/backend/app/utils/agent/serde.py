@@ -0,0 +1,57 @@
+"""
+Serializers of graph checkpoints and writes, selected with the CHECKPOINT_SERIALIZER setting.
+"""
+
+from typing import Any
+
+import zstandard
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+ZSTD_SUFFIX = "+zstd"
+
+# types dumped as is by JsonPlusSerializer, they are never compressed
+UNCOMPRESSED_TYPES = {"null", "bytes", "bytearray"}
+
+
+class ZstdMsgpackSerializer(JsonPlusSerializer):
+    """
+    msgpack, as dumped by JsonPlusSerializer, compressed with zstd: every checkpoint holds
+    the whole message history, whose text (code, hidden context) compresses well.
+    With `legacy`, values dumped by JsonPlusSerializer before are read as well.
+    """
+
+    def __init__(self, level: int = 3, legacy: bool = True) -> None:
+        super().__init__()
+        self.legacy = legacy
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        type_, data = super().dumps_typed(obj)
+        if type_ in UNCOMPRESSED_TYPES:
+            return type_, data
+        return type_ + ZSTD_SUFFIX, self._compressor.compress(data)
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        type_, data_ = data
+        if type_.endswith(ZSTD_SUFFIX):
+            return super().loads_typed(
+                (type_.removesuffix(ZSTD_SUFFIX), self._decompressor.decompress(data_))
+            )
+        if type_ not in UNCOMPRESSED_TYPES and not self.legacy:
+            raise ValueError(
+                f"Checkpoint data of type {type_} is not compressed, "
+                "enable CHECKPOINT_LEGACY_READ to read it"
+            )
+        return super().loads_typed(data)
+
+
+SERIALIZERS = ["msgpack_zstd", "jsonplus"]
+
+
+def get_serializer(name: str, legacy: bool = True) -> JsonPlusSerializer:
+    if name == "msgpack_zstd":
+        return ZstdMsgpackSerializer(legacy=legacy)
+    if name == "jsonplus":
+        return JsonPlusSerializer()
+    raise ValueError(f"Unsupported checkpoint serializer: {name}")
@@ -1,30 +1,22 @@
-from typing import TYPE_CHECKING
-
 from langchain_core.runnables.config import RunnableConfig
 from langchain_core.tools import BaseTool
 
 from app.generated.schema import SectionType
 from app.utils.types import GenerateResult
 
-if TYPE_CHECKING:
-    from app.utils.redis_client import RedisClient
-
-
 CODE_GENERATOR_NAME = "generate_code"
 
+# configurable key of the RedisClient used by tools, compiled graphs are shared by
+# requests so tools can't hold it, keys starting with "__" aren't saved in checkpoints
+REDIS_CLIENT_CONFIG_KEY = "__redis_client"
+
 
 class CodeGenerator(BaseTool):
     name: str = CODE_GENERATOR_NAME
     description: str = "Generates code for performing data engineering tasks"
 
-    class Config:
-        extra = "allow"
-
-    def __init__(
-        self, redis_client: "RedisClient", section_type: SectionType | None = None
-    ) -> None:
-        super().__init__(redis_client=redis_client)
-        self.redis_client = redis_client
+    def __init__(self, section_type: SectionType | None = None) -> None:
+        super().__init__()
         self.description = f"Generates code for performing data {section_type.value.lower() if section_type else 'engineering'} tasks"
 
     def _run(
@@ -42,13 +34,12 @@ class CodeGenerator(BaseTool):
         project_id = config["configurable"]["thread_id"]
         section_id = config["configurable"]["section_id"]
         block_id = config["configurable"]["block_id"]
+        redis_client = config["configurable"][REDIS_CLIENT_CONFIG_KEY]
         result = await generate_code(
-            project_id, section_id, block_id, self.redis_client, called_from_agent=True
+            project_id, section_id, block_id, redis_client, called_from_agent=True
         )
         return result
 
 
-def create_tools(
-    redis_client: "RedisClient", section_type: SectionType | None = None
-) -> list[BaseTool]:
-    return [CodeGenerator(redis_client, section_type)]
+def create_tools(section_type: SectionType | None = None) -> list[BaseTool]:
+    return [CodeGenerator(section_type)]
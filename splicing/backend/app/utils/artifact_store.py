@@ -0,0 +1,113 @@
+"""
+Stores full DataFrames of large block results as Arrow IPC files under the project dir,
+Redis only keeps a preview of them and the artifact info written here.
+"""
+
+import logging
+import os
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+
+from app.core.config import settings
+from app.utils.helper import generate_id
+
+logger = logging.getLogger(__name__)
+
+ARTIFACTS_DIR_NAME = ".artifacts"
+
+
+def get_artifacts_dir(
+    project_dir: str, section_id: str | None = None, block_id: str | None = None
+) -> str:
+    path = os.path.join(project_dir, ARTIFACTS_DIR_NAME)
+    if section_id is not None:
+        path = os.path.join(path, section_id)
+        if block_id is not None:
+            path = os.path.join(path, block_id)
+    return path
+
+
+def should_spill(df: pd.DataFrame) -> bool:
+    return (
+        len(df) > settings.ARTIFACT_PREVIEW_ROWS
+        and df.memory_usage(deep=True).sum() >= settings.ARTIFACT_THRESHOLD_BYTES
+    )
+
+
+def write_artifact(
+    project_dir: str, section_id: str, block_id: str, df: pd.DataFrame
+) -> dict:
+    """Writes a DataFrame to a new file and returns the artifact info to keep in Redis."""
+    artifacts_dir = get_artifacts_dir(project_dir, section_id, block_id)
+    os.makedirs(artifacts_dir, exist_ok=True)
+    # relative to the project dir, so moving the project dir keeps artifacts valid
+    path = os.path.relpath(
+        os.path.join(artifacts_dir, f"{generate_id()}.arrow"), project_dir
+    )
+    table = pa.Table.from_pandas(df)
+    # uncompressed, so reads can use the memory-mapped buffers directly
+    with pa.OSFile(os.path.join(project_dir, path), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return {"path": path, "numRows": len(df)}
+
+
+def read_artifact(project_dir: str, artifact: dict) -> pd.DataFrame:
+    with pa.memory_map(os.path.join(project_dir, artifact["path"])) as source:
+        table = pa.ipc.open_file(source).read_all()
+        return table.to_pandas()
+
+
+def read_artifact_head(project_dir: str, artifact: dict, num_rows: int) -> pd.DataFrame:
+    """
+    Reads the first `num_rows` rows of an artifact, for prompts which only need its schema.
+    Only these rows are converted to pandas, dtypes and nullabilities (in
+    `attrs["nullabilities"]`, see get_schema) are still the ones of all rows.
+    """
+    with pa.memory_map(os.path.join(project_dir, artifact["path"])) as source:
+        reader = pa.ipc.open_file(source)
+        batches, null_counts = [], [0] * len(reader.schema)
+        for i in range(reader.num_record_batches):
+            # null counts are stored with the batch, its data isn't read
+            batch = reader.get_batch(i)
+            null_counts = [n + c.null_count for n, c in zip(null_counts, batch.columns)]
+            if sum(len(b) for b in batches) < num_rows:
+                batches.append(batch)
+        table = pa.Table.from_batches(batches, schema=reader.schema).slice(0, num_rows)
+        df = table.to_pandas()
+    nullabilities = {}
+    for field, null_count in zip(reader.schema, null_counts):
+        if field.name not in df.columns:
+            # the index
+            continue
+        nullabilities[field.name] = null_count > 0
+        if null_count and not df[field.name].isna().any():
+            # e.g. integers with nulls are floats in pandas
+            df[field.name] = df[field.name].astype(
+                pa.nulls(1, field.type).to_pandas().dtype
+            )
+    df.attrs["nullabilities"] = nullabilities
+    return df
+
+
+def delete_artifacts(
+    project_dir: str,
+    section_id: str | None = None,
+    block_id: str | None = None,
+    keep: list[dict] | None = None,
+) -> None:
+    """Deletes artifact files of a project, section or block except the ones to keep."""
+    artifacts_dir = get_artifacts_dir(project_dir, section_id, block_id)
+    if not os.path.exists(artifacts_dir):
+        return
+    if not keep:
+        shutil.rmtree(artifacts_dir)
+        return
+    keep_paths = {os.path.join(project_dir, artifact["path"]) for artifact in keep}
+    for file_name in os.listdir(artifacts_dir):
+        path = os.path.join(artifacts_dir, file_name)
+        if path not in keep_paths:
+            logger.debug("ARTIFACT - deleting %s", path)
+            os.remove(path)
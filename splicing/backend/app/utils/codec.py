@@ -0,0 +1,47 @@
+"""
+Codecs of the JSON values stored in Redis, selected with the JSON_CODEC setting.
+All codecs read values written by each other.
+"""
+
+import json
+from enum import Enum
+from typing import Any
+
+import orjson
+
+
+class CustomJsonEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, Enum):
+            return obj.value
+        return super().default(obj)
+
+
+class JsonCodec:
+    """The standard library json module."""
+
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value, cls=CustomJsonEncoder).encode()
+
+    def loads(self, value: bytes) -> Any:
+        return json.loads(value)
+
+
+class OrjsonCodec(JsonCodec):
+    """orjson, which serializes Enums natively and is several times faster."""
+
+    def dumps(self, value: Any) -> bytes:
+        # json.dumps converts non-string keys as well
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(self, value: bytes) -> Any:
+        return orjson.loads(value)
+
+
+CODECS = {"json": JsonCodec, "orjson": OrjsonCodec}
+
+
+def get_codec(name: str) -> JsonCodec:
+    if name not in CODECS:
+        raise ValueError(f"Unsupported JSON codec: {name}")
+    return CODECS[name]()
@@ -0,0 +1,255 @@
+"""
+Pooled DuckDB connections for previews and reads of DuckDB integrations: a read-only
+connection is kept per database file, and reads use cursors of it, so the catalog
+is only loaded once and file handles aren't leaked.
+DuckDB doesn't allow a read-write connection while another one is open, so writers
+of this process, dbt runs and Python blocks on DuckDB, close the pooled connections
+of their database first.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Iterator
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Connection:
+    database_path: str
+    connection: Any
+    # file status when the connection was opened, a changed file is opened again
+    file_version: tuple[int, int, int]
+    idle_cursors: list = field(default_factory=list)
+    num_in_use: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+    closed: bool = False
+
+
+def _get_file_version(database_path: str) -> tuple[int, int, int]:
+    stat = os.stat(database_path)
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def _is_lock_conflict(ex: Exception) -> bool:
+    # raised while a process, this one or another, has the file open for writing
+    return "Could not set lock" in str(ex)
+
+
+class DuckDBPool:
+    """
+    Read-only connections by database path, with up to `max_cursors` idle cursors each.
+    Connections unused for `max_idle` seconds are closed by `run`, so other processes
+    can write the file meanwhile.
+    """
+
+    def __init__(self, max_cursors: int, max_idle: float, lock_timeout: float) -> None:
+        self.max_cursors = max_cursors
+        self.max_idle = max_idle
+        self.lock_timeout = lock_timeout
+        self._connections: dict[str, _Connection] = {}
+        # closed connections whose cursors are still in use
+        self._closing: list[_Connection] = []
+        # databases a connection is opened for, outside the lock
+        self._opening: set[str] = set()
+        # number of blocks writing a database
+        self._writers: dict[str, int] = {}
+        self._condition = threading.Condition()
+        self.num_connections_opened = 0
+        self.num_cursors_reused = 0
+        self.num_invalidations = 0
+        self.num_lock_retries = 0
+        self.num_fallbacks = 0
+
+    def _connect(self, database_path: str) -> Any:
+        import duckdb
+
+        deadline = time.monotonic() + self.lock_timeout
+        delay = 0.05
+        while True:
+            try:
+                return duckdb.connect(database=database_path, read_only=True)
+            except duckdb.IOException as ex:
+                # another process is writing, wait until it's done
+                if not _is_lock_conflict(ex) or time.monotonic() + delay > deadline:
+                    raise
+                self.num_lock_retries += 1
+                time.sleep(delay)
+                delay = min(delay * 2, 1)
+
+    def _close(self, conn: _Connection) -> None:
+        conn.closed = True
+        if conn.num_in_use:
+            self._closing.append(conn)
+            return
+        # cursors are closed with their connection
+        conn.connection.close()
+
+    def _acquire(self, database_path: str) -> tuple[_Connection, Any]:
+        deadline = time.monotonic() + self.lock_timeout
+        with self._condition:
+            while True:
+                # previews wait for dbt runs and Python blocks writing the database,
+                # and for a connection being opened by another read
+                if not self._condition.wait_for(
+                    lambda: not self._writers.get(database_path)
+                    and database_path not in self._opening,
+                    timeout=deadline - time.monotonic(),
+                ):
+                    raise TimeoutError(
+                        f"DuckDB database {database_path} is being written by a block"
+                    )
+                conn = self._connections.get(database_path)
+                file_version = _get_file_version(database_path)
+                if conn is not None and conn.file_version != file_version:
+                    # written by another process since the connection was opened
+                    del self._connections[database_path]
+                    self._close(conn)
+                    conn = None
+                if conn is not None:
+                    break
+                # connecting can wait for a lock of another process,
+                # reads of other databases go on meanwhile
+                self._opening.add(database_path)
+                self._condition.release()
+                try:
+                    connection = self._connect(database_path)
+                finally:
+                    self._condition.acquire()
+                    self._opening.discard(database_path)
+                    self._condition.notify_all()
+                self.num_connections_opened += 1
+                if self._writers.get(database_path):
+                    # a block started writing the database meanwhile
+                    connection.close()
+                    continue
+                conn = _Connection(database_path, connection, file_version)
+                self._connections[database_path] = conn
+                break
+            if conn.idle_cursors:
+                cursor = conn.idle_cursors.pop()
+                self.num_cursors_reused += 1
+            else:
+                cursor = conn.connection.cursor()
+            conn.num_in_use += 1
+            return conn, cursor
+
+    def _release(self, conn: _Connection, cursor: Any) -> None:
+        with self._condition:
+            conn.num_in_use -= 1
+            conn.last_used = time.monotonic()
+            if conn.closed:
+                if conn.num_in_use == 0:
+                    conn.connection.close()
+                    self._closing.remove(conn)
+                    self._condition.notify_all()
+            elif len(conn.idle_cursors) < self.max_cursors:
+                conn.idle_cursors.append(cursor)
+            else:
+                cursor.close()
+
+    @contextmanager
+    def cursor(self, database_path: str) -> Iterator[Any]:
+        """Yields a read-only cursor of the database, which is reused after the block."""
+        import duckdb
+
+        database_path = os.path.realpath(database_path)
+        try:
+            conn, cursor = self._acquire(database_path)
+        except duckdb.ConnectionException:
+            # the file is open for writing in this process outside a block,
+            # a connection with the default configuration shares its database
+            logger.warning("DUCKDB - %s is open for writing", database_path)
+            self.num_fallbacks += 1
+            conn, cursor = None, duckdb.connect(database=database_path)
+        try:
+            yield cursor
+        finally:
+            if conn is None:
+                cursor.close()
+            else:
+                self._release(conn, cursor)
+
+    def invalidate(self, database_path: str | None = None) -> None:
+        """Closes the connections of a database, or all of them."""
+        with self._condition:
+            if database_path is None:
+                paths = list(self._connections)
+            else:
+                paths = [os.path.realpath(database_path)]
+            for path in paths:
+                if conn := self._connections.pop(path, None):
+                    self._close(conn)
+                    self.num_invalidations += 1
+
+    @contextmanager
+    def writing(self, database_path: str) -> Iterator[None]:
+        """
+        Closes the connections of a database while a block of this process writes it,
+        a new one is opened by the first read after it, with the changes.
+        """
+        database_path = os.path.realpath(database_path)
+        with self._condition:
+            self._writers[database_path] = self._writers.get(database_path, 0) + 1
+            try:
+                self.invalidate(database_path)
+                if not self._condition.wait_for(
+                    lambda: database_path not in self._opening
+                    and all(
+                        conn.database_path != database_path for conn in self._closing
+                    ),
+                    timeout=self.lock_timeout,
+                ):
+                    logger.warning("DUCKDB - reads still running before a write")
+            except BaseException:
+                self._remove_writer(database_path)
+                raise
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._remove_writer(database_path)
+
+    def _remove_writer(self, database_path: str) -> None:
+        self._writers[database_path] -= 1
+        if not self._writers[database_path]:
+            del self._writers[database_path]
+        self._condition.notify_all()
+
+    def close_idle(self) -> None:
+        now = time.monotonic()
+        with self._condition:
+            for path, conn in list(self._connections.items()):
+                if conn.num_in_use == 0 and now - conn.last_used > self.max_idle:
+                    del self._connections[path]
+                    self._close(conn)
+
+    async def run(self) -> None:
+        """Closes idle connections periodically, runs until it's cancelled."""
+        while True:
+            await asyncio.sleep(self.max_idle / 2)
+            self.close_idle()
+
+    def get_stats(self) -> dict:
+        return {
+            "connections": len(self._connections),
+            "connectionsOpened": self.num_connections_opened,
+            "cursorsReused": self.num_cursors_reused,
+            "invalidations": self.num_invalidations,
+            "lockRetries": self.num_lock_retries,
+            "fallbacks": self.num_fallbacks,
+        }
+
+
+duckdb_pool = DuckDBPool(
+    settings.DUCKDB_MAX_CURSORS,
+    settings.DUCKDB_MAX_IDLE,
+    settings.DUCKDB_LOCK_TIMEOUT,
+)
@@ -1,18 +1,24 @@
+import asyncio
 import importlib.metadata
 import json
+import logging
 import os
 import shutil
-import subprocess
 import sys
+from contextlib import nullcontext
 from typing import Any
 
 import yaml
 from dbt.cli.main import dbtRunner, dbtRunnerResult
 
 from app.generated.schema import IntegrationType
+from app.utils.duckdb_pool import duckdb_pool
+from app.utils.executor import run_in_code_process
 from app.utils.helper import standardize_name
 from app.utils.project_helper import get_app_dir
 
+logger = logging.getLogger(__name__)
+
 
 def get_dbt_packages(integration_type: IntegrationType) -> set[str]:
     packages = {"dbt-core"}
@@ -23,18 +29,19 @@ def get_dbt_packages(integration_type: IntegrationType) -> set[str]:
     return packages
 
 
-def install_packages(packages: list[str]) -> None:
+async def install_packages(packages: list[str]) -> None:
     # We need to install packages separately otherwise if one failed,
     # all packages are not installed.
     for package in packages:
         try:
             _ = importlib.metadata.version(package)
         except importlib.metadata.PackageNotFoundError:
-            try:
-                subprocess.check_call([sys.executable, "-m", "pip", "install", package])
-            except subprocess.CalledProcessError:
-                # TODO: add log
-                pass
+            # a subprocess the event loop waits for, pip can take minutes
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "pip", "install", package
+            )
+            if await process.wait() != 0:
+                logger.warning("EXECUTE - failed to install %s", package)
 
 
 def execute_python(
@@ -44,9 +51,8 @@ def execute_python(
     function_args: dict[str, Any],
     working_dir: str,
     files_to_copy: list[str],
+    duckdb_database_path: str | None = None,
 ) -> tuple[Any, Exception | None]:
-    local_dict = {}
-    original_cwd = os.getcwd()
     for file in files_to_copy:
         src_path = os.path.join(get_app_dir(), file)
         if os.path.exists(src_path):
@@ -55,20 +61,43 @@ def execute_python(
                 os.path.join(working_dir, file),
             )
     try:
-        # TODO: execute python code using subprocess
-        exec(code, globals(), local_dict)
-        func = local_dict[function_name]
-        os.chdir(working_dir)
-        result = func(**function_args)
+        # the code can write the DuckDB database of its integration,
+        # pooled connections would lock it
+        with (
+            duckdb_pool.writing(duckdb_database_path)
+            if duckdb_database_path
+            else nullcontext()
+        ):
+            result = run_in_code_process(
+                _call_python_function,
+                code=code,
+                function_name=function_name,
+                function_args=function_args,
+                # the code process moves between directories
+                working_dir=os.path.abspath(working_dir),
+            )
         exception = None
     except Exception as ex:
         exception = ex
         result = None
-    finally:
-        os.chdir(original_cwd)
     return result, exception
 
 
+def _call_python_function(
+    *,
+    code: str,
+    function_name: str,
+    function_args: dict[str, Any],
+    working_dir: str,
+) -> Any:
+    # in the code process, files of the code are relative to the project directory
+    os.chdir(working_dir)
+    local_dict = {}
+    exec(code, globals(), local_dict)
+    func = local_dict[function_name]
+    return func(**function_args)
+
+
 def execute_dbt(
     *,
     model_name: str,
@@ -77,7 +106,10 @@ def execute_dbt(
     project_name: str,
     integration_type: IntegrationType,
     working_dir: str,
+    duckdb_database_path: str | None = None,
 ) -> tuple[str | None, Exception | None]:
+    # the code process moves between directories
+    working_dir = os.path.abspath(working_dir)
     profiles_dir = os.path.join(working_dir, "dbt_profiles")
     target = standardize_name(integration_type.name)
     profile_cli_args = [
@@ -107,12 +139,20 @@ def execute_dbt(
             "--select",
             model_name,
         ]
-        run_result = dbtRunner().invoke(run_cli_args + profile_cli_args)
-        if run_result.success:
+        with (
+            duckdb_pool.writing(duckdb_database_path)
+            if duckdb_database_path
+            else nullcontext()
+        ):
+            # dbt moves to the project directory, so it runs in the code process
+            success, error_messages = run_in_code_process(
+                _invoke_dbt, run_cli_args + profile_cli_args
+            )
+        if success:
             # return "success" as a placeholder that the execution succeeds
             result, exception = "success", None
         else:
-            result, exception = None, extract_dbt_error_messages(run_result)
+            result, exception = None, error_messages
         return result, exception
     finally:
         # remove created files because model name is likely to be changed
@@ -122,6 +162,16 @@ def execute_dbt(
             os.remove(model_yml_path)
 
 
+def _invoke_dbt(cli_args: list[str], cwd: str | None = None) -> tuple[bool, str]:
+    """Runs a dbt command in the code process, returns whether it succeeded and its errors."""
+    if cwd is not None:
+        os.chdir(cwd)
+    run_result = dbtRunner().invoke(cli_args)
+    if run_result.success:
+        return True, ""
+    return False, extract_dbt_error_messages(run_result)
+
+
 def create_dbt_profile(
     profile_name: str,
     profiles_dir: str,
@@ -185,6 +235,8 @@ def init_dbt_project(
     project_name: str,
     working_dir: str,
 ) -> None:
+    # the code process moves between directories
+    working_dir = os.path.abspath(working_dir)
     # initialize project if it's not initialized before
     project_dir = os.path.join(working_dir, project_name)
     if not os.path.exists(project_dir):
@@ -196,17 +248,13 @@ def init_dbt_project(
             project_name,
         ]
 
-        original_cwd = os.getcwd()
-        try:
-            os.chdir(working_dir)
-            init_cli_args = ["init", project_name] + profile_cli_args
-            init_result = dbtRunner().invoke(init_cli_args)
-        finally:
-            os.chdir(original_cwd)
-        if not init_result.success:
-            raise ValueError(
-                f"Initialize dbt project failed: {extract_dbt_error_messages(init_result)}"
-            )
+        # the project is created in the working directory of the code process
+        init_cli_args = ["init", project_name] + profile_cli_args
+        success, error_messages = run_in_code_process(
+            _invoke_dbt, init_cli_args, cwd=working_dir
+        )
+        if not success:
+            raise ValueError(f"Initialize dbt project failed: {error_messages}")
 
 
 def extract_dbt_error_messages(run_result: dbtRunnerResult) -> str:
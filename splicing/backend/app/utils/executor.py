@@ -0,0 +1,89 @@
+"""
+Executors of blocking work called from async endpoints, so other requests of the worker,
+chat streams included, keep being served while a block executes or data is read.
+"""
+
+import asyncio
+import contextvars
+import functools
+import importlib
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable
+
+from app.core.config import settings
+
+# blocks execute one at a time, waiting for the code process in this thread
+code_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="code")
+# reads of integrations and files
+io_executor = ThreadPoolExecutor(
+    max_workers=settings.IO_EXECUTOR_MAX_WORKERS, thread_name_prefix="io"
+)
+
+
+async def run_in_executor(
+    executor: Executor, func: Callable, /, *args: Any, **kwargs: Any
+) -> Any:
+    loop = asyncio.get_running_loop()
+    # context variables are kept, as with asyncio.to_thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        executor, functools.partial(context.run, func, *args, **kwargs)
+    )
+
+
+# user code and dbt change the working directory, so they run in a process of their own,
+# started on first use and kept for the next blocks
+_code_process_pool: ProcessPoolExecutor | None = None
+_code_process_pool_lock = threading.Lock()
+
+
+def _get_code_process_pool() -> ProcessPoolExecutor:
+    global _code_process_pool
+    with _code_process_pool_lock:
+        if _code_process_pool is None:
+            # not forked from a process with running threads
+            _code_process_pool = ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _code_process_pool
+
+
+def _import_modules(module_names: tuple[str, ...]) -> None:
+    for module_name in module_names:
+        importlib.import_module(module_name)
+
+
+def start_code_process(*module_names: str) -> None:
+    """
+    Starts the code process in the background and imports modules of the code there,
+    dbt and pandas take seconds to import, so the first block doesn't wait for them.
+    """
+    _get_code_process_pool().submit(_import_modules, module_names)
+
+
+def run_in_code_process(func: Callable, /, *args: Any, **kwargs: Any) -> Any:
+    """
+    Runs a module-level function in the code process and waits for its result,
+    exceptions of the function are raised with its traceback as their cause.
+    """
+    global _code_process_pool
+    pool = _get_code_process_pool()
+    try:
+        return pool.submit(func, *args, **kwargs).result()
+    except BrokenProcessPool:
+        # the process died, e.g. user code exited it, the next block starts another
+        with _code_process_pool_lock:
+            if _code_process_pool is pool:
+                _code_process_pool = None
+        raise
+
+
+def shutdown_code_process() -> None:
+    global _code_process_pool
+    with _code_process_pool_lock:
+        if _code_process_pool is not None:
+            _code_process_pool.shutdown(cancel_futures=True)
+            _code_process_pool = None
@@ -1,3 +1,4 @@
+import hashlib
 import json
 import logging
 import os
@@ -8,6 +9,7 @@ from langchain_core.callbacks.manager import adispatch_custom_event
 from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import HumanMessage, SystemMessage
 
+from app.core.config import settings
 from app.generated.schema import (
     CleaningGenerateResult,
     IntegrationType,
@@ -20,6 +22,8 @@ from app.generated.schema import (
     TransformationTool,
 )
 from app.utils.helper import get_schema, standardize_name
+from app.utils.local_cache import MISSING, LocalCache
+from app.utils.prompt_cache import add_cache_breakpoints
 from app.utils.prompt_manager import PromptManager
 from app.utils.types import GenerateResult
 
@@ -28,6 +32,12 @@ prompt_manager = PromptManager(os.path.join(dir_path, "prompts.yaml"))
 
 logger = logging.getLogger(__name__)
 
+# responses of generate_with_llm by model, section type, block setup and tool, see
+# get_generate_cache_key, regenerating an unchanged block returns the same result
+generate_cache = LocalCache(
+    settings.GENERATE_CACHE_MAX_SIZE, settings.GENERATE_CACHE_TTL
+)
+
 
 def get_generate_result_type(
     section_type: SectionType, tool: str
@@ -46,25 +56,59 @@ def get_generate_result_type(
         return OrchestrationGenerateResult
 
 
+def get_generate_cache_key(
+    llm: BaseChatModel, section_type: SectionType, setup_messages: list[str], tool: str
+) -> str:
+    """
+    `setup_messages` are the system message and the user message built without the
+    conversation, so a chat message in between doesn't change the key.
+    """
+    model = getattr(llm, "model_name", None) or getattr(llm, "model", "")
+    value = json.dumps(
+        [type(llm).__name__, model, section_type.value, setup_messages, tool],
+        sort_keys=True,
+    )
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
 async def generate_with_llm(
     *,
     llm: BaseChatModel,
     section_type: SectionType,
     integration_settings: dict,
     called_from_agent: bool = False,
+    use_cache: bool = True,
     **kwargs,
 ) -> GenerateResult:
-    system_message = prompt_manager.get_prompt(
-        "generate", "system_message", section_type=section_type.value.lower()
-    )
+    # instructions and examples only depend on the block setup, so they're part of
+    # the system message, the cached prefix of calls for the same kind of block
+    system_message = build_system_message(section_type, integration_settings, **kwargs)
     user_message = build_user_message(section_type, integration_settings, **kwargs)
-    messages = [
-        SystemMessage(content=system_message),
-        HumanMessage(content=user_message),
-    ]
+    messages = add_cache_breakpoints(
+        llm,
+        [
+            SystemMessage(content=system_message),
+            HumanMessage(content=user_message),
+        ],
+    )
 
     try:
         generate_result_type = get_generate_result_type(section_type, kwargs["tool"])
+        cache_key = None
+        if settings.GENERATE_CACHE_ENABLED and use_cache:
+            setup_message = build_user_message(
+                section_type, integration_settings, **{**kwargs, "context": ""}
+            )
+            cache_key = get_generate_cache_key(
+                llm, section_type, [system_message, setup_message], kwargs["tool"]
+            )
+            response = generate_cache.get(cache_key)
+            if response is not MISSING:
+                logger.debug("GENERATE CODE - cache hit: %s", cache_key)
+                if called_from_agent:
+                    await adispatch_custom_event("generate-result", response)
+                return generate_result_type(**response)
+
         # Using pydantic model will cause langchain to only start output in streaming
         # when all required fields are generated, so convert to use json schema (dict)
         structured_llm = llm.with_structured_output(
@@ -79,22 +123,94 @@ async def generate_with_llm(
             response = chunk
 
         logger.debug("GENERATE CODE - messages: %s, response: %s", messages, response)
-        return generate_result_type(**response)
+        result = generate_result_type(**response)
+        if cache_key is not None:
+            generate_cache.set(cache_key, response)
+        return result
     except Exception as ex:
         logger.error("GENERATE CODE - exception: %s", ex)
 
 
+def get_sensitive_settings_instruction(integration: str, settings: dict | None) -> str:
+    if not settings:
+        return ""
+    sensitive_fields = settings.get("sensitiveFields", [])
+    if not any(settings[k] for k in sensitive_fields):
+        return ""
+    sensitive_settings_yaml = yaml.dump(
+        {standardize_name(integration): {key: "..." for key in sensitive_fields}},
+        default_flow_style=False,
+    )
+    return prompt_manager.get_prompt(
+        "generate",
+        "sensitive_settings_instruction",
+        info=sensitive_settings_yaml,
+    )
+
+
+def build_system_message(
+    section_type: SectionType, integration_settings: dict, **kwargs
+) -> str:
+    system_message = prompt_manager.get_prompt(
+        "generate", "system_message", section_type=section_type.value.lower()
+    )
+    if section_type == SectionType.ORCHESTRATION:
+        function_instruction = prompt_manager.get_prompt(
+            "generate", "airflow_dag_instruction"
+        )
+        return f"{system_message}{function_instruction}"
+
+    source, tool = kwargs["source"], kwargs["tool"]
+    if (
+        section_type == SectionType.TRANSFORMATION
+        and TransformationTool(tool) == TransformationTool.DBT
+    ):
+        function_instruction = prompt_manager.get_prompt(
+            "generate",
+            "dbt_model_instruction",
+            source=source,
+        )
+        return f"{system_message}{function_instruction}"
+
+    sensitive_settings_instruction = get_sensitive_settings_instruction(
+        source, integration_settings.get(source)
+    )
+    if section_type == SectionType.MOVEMENT:
+        destination = kwargs["destination"]
+        destination_settings_instruction = get_sensitive_settings_instruction(
+            destination, integration_settings.get(destination)
+        )
+        sensitive_settings_instruction = (
+            f"{sensitive_settings_instruction}\n{destination_settings_instruction}"
+        )
+    source_python_environment_instruction = prompt_manager.get_prompt(
+        "generate",
+        "source_python_environment_instruction"
+        if IntegrationType(source) == IntegrationType.PYTHON
+        else "not_source_python_environment_instruction",
+    )
+    function_instruction = prompt_manager.get_prompt(
+        "generate",
+        "python_function_instruction",
+        sensitive_settings_instruction=sensitive_settings_instruction,
+        source_python_environment_instruction=source_python_environment_instruction,
+    )
+    example = prompt_manager.get_prompt(
+        "generate",
+        f"python_function_{section_type.value.lower()}_example",
+    )
+    return f"{system_message}{function_instruction}{example}"
+
+
 def build_user_message(
     section_type: SectionType, integration_settings: dict, **kwargs
 ) -> str:
     def parse_integration_settings(
-        integration: str,
         integration_details: str,
         settings: dict | None,
         use_details_from_last_block: bool = False,
-    ) -> tuple[str, str]:
+    ) -> str:
         details_str = integration_details
-        settings_instruction = ""
         if settings:
             sensitive_fields = settings.get("sensitiveFields", [])
             integration_details_from_settings = "\n".join(
@@ -107,21 +223,7 @@ def build_user_message(
             else:
                 details_from_last_block = ""
             details_str = f"{integration_details_from_settings}\n{details_from_last_block}\n{integration_details}"
-            if any(settings[k] for k in sensitive_fields):
-                sensitive_settings_yaml = yaml.dump(
-                    {
-                        standardize_name(integration): {
-                            key: "..." for key in sensitive_fields
-                        }
-                    },
-                    default_flow_style=False,
-                )
-                settings_instruction = prompt_manager.get_prompt(
-                    "generate",
-                    "sensitive_settings_instruction",
-                    info=sensitive_settings_yaml,
-                )
-        return details_str, settings_instruction
+        return details_str
 
     context_instruction = prompt_manager.get_prompt(
         "generate",
@@ -131,8 +233,7 @@ def build_user_message(
     )
     if section_type == SectionType.MOVEMENT:
         source, source_details = kwargs["source"], kwargs["sourceDetails"]
-        source_details_str, source_settings_instruction = parse_integration_settings(
-            source,
+        source_details_str = parse_integration_settings(
             source_details,
             integration_settings.get(source),
             use_details_from_last_block=True,
@@ -141,30 +242,8 @@ def build_user_message(
             kwargs["destination"],
             kwargs["destinationDetails"],
         )
-        (
-            destination_details_str,
-            destination_settings_instruction,
-        ) = parse_integration_settings(
-            destination, destination_details, integration_settings.get(destination)
-        )
-        sensitive_settings_instruction = (
-            f"{source_settings_instruction}\n{destination_settings_instruction}"
-        )
-        source_python_environment_instruction = prompt_manager.get_prompt(
-            "generate",
-            "source_python_environment_instruction"
-            if IntegrationType(source) == IntegrationType.PYTHON
-            else "not_source_python_environment_instruction",
-        )
-        function_instruction = prompt_manager.get_prompt(
-            "generate",
-            "python_function_instruction",
-            sensitive_settings_instruction=sensitive_settings_instruction,
-            source_python_environment_instruction=source_python_environment_instruction,
-        )
-        example = prompt_manager.get_prompt(
-            "generate",
-            "python_function_movement_example",
+        destination_details_str = parse_integration_settings(
+            destination_details, integration_settings.get(destination)
         )
         return prompt_manager.get_prompt(
             "generate",
@@ -175,13 +254,10 @@ def build_user_message(
             sourceDetails=source_details_str,
             destination=destination,
             destinationDetails=destination_details_str,
-            function_instruction=function_instruction,
-            example=example,
         )
     elif section_type in [SectionType.CLEANING, SectionType.TRANSFORMATION]:
         source, source_details = kwargs["source"], kwargs["sourceDetails"]
-        source_details_str, source_settings_instruction = parse_integration_settings(
-            source,
+        source_details_str = parse_integration_settings(
             source_details,
             integration_settings.get(source),
             use_details_from_last_block=True,
@@ -213,34 +289,6 @@ def build_user_message(
             )
         else:
             data_instruction = ""
-        if (
-            section_type == SectionType.TRANSFORMATION
-            and TransformationTool(tool) == TransformationTool.DBT
-        ):
-            function_instruction = prompt_manager.get_prompt(
-                "generate",
-                "dbt_model_instruction",
-                source=source,
-            )
-            example = ""
-        else:
-            source_python_environment_instruction = prompt_manager.get_prompt(
-                "generate",
-                "source_python_environment_instruction"
-                if IntegrationType(source) == IntegrationType.PYTHON
-                else "not_source_python_environment_instruction",
-            )
-            function_instruction = prompt_manager.get_prompt(
-                "generate",
-                "python_function_instruction",
-                sensitive_settings_instruction=source_settings_instruction,
-                source_python_environment_instruction=source_python_environment_instruction,
-            )
-            example = prompt_manager.get_prompt(
-                "generate",
-                f"python_function_{section_type.value.lower()}_example",
-            )
-
         return prompt_manager.get_prompt(
             "generate",
             "user_message",
@@ -249,8 +297,6 @@ def build_user_message(
             source=source,
             tool=tool,
             data_instruction=data_instruction,
-            function_instruction=function_instruction,
-            example=example,
         )
     elif section_type == SectionType.ORCHESTRATION:
         return prompt_manager.get_prompt(
@@ -266,7 +312,7 @@ def build_user_message(
         )
 
 
-def update_generate_result(
+async def update_generate_result(
     *,
     llm: BaseChatModel,
     section_type: SectionType,
@@ -309,15 +355,18 @@ def update_generate_result(
         change=json.dumps(change, indent=4, separators=(",", ": ")),
         example=example,
     )
-    messages = [
-        SystemMessage(content=system_message),
-        HumanMessage(content=user_message),
-    ]
+    messages = add_cache_breakpoints(
+        llm,
+        [
+            SystemMessage(content=system_message),
+            HumanMessage(content=user_message),
+        ],
+    )
     generate_result_type = get_generate_result_type(section_type, tool)
     structured_llm = llm.with_structured_output(
         generate_result_type, method="json_mode"
     )
-    response = structured_llm.invoke(messages)
+    response = await structured_llm.ainvoke(messages)
     logger.debug(
         "UPDATE GENERATE RESULT - messages: %s, response: %s", messages, response
     )
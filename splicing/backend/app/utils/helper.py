@@ -1,40 +1,96 @@
 import base64
+import hashlib
 import io
 import logging
 import random
 import string
 import sys
 import traceback
+from collections import OrderedDict
 
+import httpx
+import openai
 import pandas as pd
 from langchain_anthropic import ChatAnthropic
 from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
 from langchain_openai import ChatOpenAI
 
+from app.core.config import settings
 from app.generated.schema import LLMType
+from app.utils.prompt_cache import prompt_cache_stats
 
 CHUNK_DELIMITER = "\n---\n"
 
 
-def serialize_df(df: pd.DataFrame) -> str:
+def serialize_df(df: pd.DataFrame, compression: str = "zstd") -> bytes:
     buffer = io.BytesIO()
-    df.to_parquet(buffer)
-    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+    df.to_parquet(buffer, compression=None if compression == "none" else compression)
+    return buffer.getvalue()
 
 
-def deserialize_df(value: str) -> pd.DataFrame:
-    bytes_value = base64.b64decode(value.encode("utf-8"))
-    return pd.read_parquet(io.BytesIO(bytes_value))
+def deserialize_df(value: bytes | str) -> pd.DataFrame:
+    if isinstance(value, str):
+        # base64 encoded, as stored before block data was kept as raw bytes
+        value = base64.b64decode(value.encode("utf-8"))
+    return pd.read_parquet(io.BytesIO(value))
 
 
 def get_schema(df: pd.DataFrame) -> list[tuple[str, str, str]]:
     dtypes = df.dtypes.astype(str)
-    nullabilities = df.isna().any().astype(str)
-    return list(zip(df.columns, dtypes, nullabilities))
+    nullabilities = df.isna().any()
+    # DataFrames with only some rows of the data, see read_artifact_head
+    nullabilities = nullabilities.to_dict() | df.attrs.get("nullabilities", {})
+    return [
+        (column, dtype, str(nullabilities[column]))
+        for column, dtype in zip(df.columns, dtypes)
+    ]
+
+
+# chat models by provider, model and API key hash, shared by all requests
+_llms: OrderedDict[tuple[LLMType, str, str], BaseChatModel] = OrderedDict()
+# connection pools of the OpenAI chat models, created on first use
+_http_client: httpx.Client | None = None
+_http_async_client: httpx.AsyncClient | None = None
+
+
+def _get_http_clients() -> tuple[httpx.Client, httpx.AsyncClient]:
+    global _http_client, _http_async_client
+    limits = httpx.Limits(
+        max_connections=settings.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+    )
+    if _http_client is None:
+        _http_client = openai.DefaultHttpxClient(limits=limits)
+    if _http_async_client is None:
+        _http_async_client = openai.DefaultAsyncHttpxClient(limits=limits)
+    return _http_client, _http_async_client
+
+
+def _create_llm(llm_type: LLMType, model: str, api_key: str) -> BaseChatModel:
+    if llm_type == LLMType.OPENAI:
+        http_client, http_async_client = _get_http_clients()
+        return ChatOpenAI(
+            openai_api_key=api_key,
+            model_name=model,
+            temperature=0,
+            http_client=http_client,
+            http_async_client=http_async_client,
+            # token usage of streamed responses, which includes cached tokens
+            stream_usage=True,
+            callbacks=[prompt_cache_stats],
+        )
+    # ChatAnthropic can't be given an HTTP client, each instance keeps its own pool
+    return ChatAnthropic(
+        anthropic_api_key=api_key,
+        model_name=model,
+        temperature=0,
+        callbacks=[prompt_cache_stats],
+    )
 
 
 def get_llm(llm_type: LLMType, llm_settings: dict) -> BaseChatModel:
+    """Returns the chat model of the settings, reused until it's evicted."""
     if llm_type in [LLMType.OPENAI, LLMType.ANTHROPIC]:
         api_key = llm_settings.get("apiKey")
         model = llm_settings.get("model")
@@ -42,16 +98,38 @@ def get_llm(llm_type: LLMType, llm_settings: dict) -> BaseChatModel:
         if not api_key or not model:
             raise ValueError(f"{llm_type} missing configuration: {llm_settings}")
 
-        if llm_type == LLMType.OPENAI:
-            return ChatOpenAI(openai_api_key=api_key, model_name=model, temperature=0)
-        elif llm_type == LLMType.ANTHROPIC:
-            return ChatAnthropic(
-                anthropic_api_key=api_key, model_name=model, temperature=0
-            )
+        key = (llm_type, model, hashlib.sha256(api_key.encode()).hexdigest())
+        llm = _llms.get(key)
+        if llm is None:
+            llm = _create_llm(llm_type, model, api_key)
+            _llms[key] = llm
+            while len(_llms) > settings.LLM_CACHE_MAX_SIZE:
+                _llms.popitem(last=False)
+        else:
+            _llms.move_to_end(key)
+        return llm
 
     raise ValueError(f"{llm_type} is not supported")
 
 
+def evict_llms(llm_type: LLMType | None = None) -> None:
+    """Evicts the chat models of a provider, or all of them."""
+    for key in list(_llms):
+        if llm_type is None or key[0] == llm_type:
+            del _llms[key]
+
+
+async def close_llm_clients() -> None:
+    global _http_client, _http_async_client
+    evict_llms()
+    if _http_client is not None:
+        _http_client.close()
+        _http_client = None
+    if _http_async_client is not None:
+        await _http_async_client.aclose()
+        _http_async_client = None
+
+
 def convert_message_to_dict(message: BaseMessage) -> dict[str, str]:
     content = merge_if_anthropic_content_blocks(message.content)
     if isinstance(message, HumanMessage):
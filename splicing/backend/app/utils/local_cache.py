@@ -0,0 +1,91 @@
+"""
+In-process cache of hot Redis keys that rarely change, such as project metadata and settings.
+Writes publish the changed key to CACHE_INVALIDATION_CHANNEL, and every worker
+listening on it evicts the key from its own cache.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any
+
+from redis import asyncio as aioredis
+
+logger = logging.getLogger(__name__)
+
+CACHE_INVALIDATION_CHANNEL = "cache:invalidate"
+
+# returned by `LocalCache.get` for keys not in the cache, cached values can be None
+MISSING = object()
+
+
+class LocalCache:
+    """An LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        # incremented by every invalidation, see `set`
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return MISSING
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: str, value: Any, version: int | None = None) -> None:
+        """
+        Caches a value read from Redis, `version` is the cache version before reading it:
+        if a key was invalidated meanwhile, the value can be outdated and isn't cached.
+        """
+        if version is not None and version != self.version:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, *keys: str) -> None:
+        self.version += 1
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self.version += 1
+        self._entries.clear()
+
+    def get_stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / total if total else 0.0,
+        }
+
+
+async def listen_for_invalidations(redis: aioredis.Redis, cache: LocalCache) -> None:
+    """Evicts keys published by writes of any worker, runs until it's cancelled."""
+    while True:
+        try:
+            async with redis.pubsub() as pubsub:
+                await pubsub.subscribe(CACHE_INVALIDATION_CHANNEL)
+                # invalidations published while not subscribed are lost
+                cache.clear()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        cache.invalidate(message["data"].decode())
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("CACHE - invalidation listener failed, reconnecting")
+            cache.clear()
+            await asyncio.sleep(1)
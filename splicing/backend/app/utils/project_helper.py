@@ -5,6 +5,7 @@ from collections import defaultdict
 import pandas as pd
 from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import BaseMessage
+from langgraph.graph.graph import CompiledGraph
 
 from app.core.config import settings
 from app.generated.schema import (
@@ -13,9 +14,18 @@ from app.generated.schema import (
     SettingsSectionType,
     TransformationTool,
 )
-from app.utils.agent.graph import create_graph
+from app.utils.agent.checkpointer import AsyncRedisSaver
+from app.utils.agent.graph import get_graph
+from app.utils.artifact_store import (
+    delete_artifacts,
+    read_artifact,
+    read_artifact_head,
+    should_spill,
+    write_artifact,
+)
 from app.utils.converse import get_context_update_user_message
-from app.utils.helper import deserialize_df, get_llm, serialize_df, standardize_name
+from app.utils.executor import io_executor, run_in_executor
+from app.utils.helper import deserialize_df, get_llm, standardize_name
 from app.utils.redis_client import RedisClient
 
 logger = logging.getLogger(__name__)
@@ -30,38 +40,65 @@ def get_dbt_project_name(section_type: SectionType, section_title: str) -> str:
 
 
 async def get_project_dir(redis_client: RedisClient, project_id: str) -> str:
-    project_metadata = await redis_client.get_project_data(project_id, "metadata")
+    project_metadata = await redis_client.get_project_metadata(project_id)
     return project_metadata.get("projectDir", get_app_dir())
 
 
-async def get_llm_for_project(
+async def get_llm_settings_for_project(
     redis_client: RedisClient, project_id: str
-) -> BaseChatModel:
-    project_metadata = await redis_client.get_project_data(project_id, "metadata")
+) -> tuple[LLMType, dict]:
+    project_metadata = await redis_client.get_project_metadata(project_id)
     llm_type = LLMType(project_metadata["llm"])
     settings = await redis_client.get_settings_data(
         SettingsSectionType.LLM.value, llm_type.value
     )
+    return llm_type, settings
+
+
+async def get_llm_for_project(
+    redis_client: RedisClient, project_id: str
+) -> BaseChatModel:
+    llm_type, settings = await get_llm_settings_for_project(redis_client, project_id)
     return get_llm(llm_type, settings)
 
 
+async def get_graph_for_project(
+    redis_client: RedisClient, project_id: str, section_type: SectionType | None = None
+) -> CompiledGraph:
+    llm_type, settings = await get_llm_settings_for_project(redis_client, project_id)
+    return get_graph(redis_client.redis, llm_type, settings, section_type)
+
+
 async def add_chat_messages(
     redis_client: RedisClient, project_id: str, *messages: BaseMessage
 ) -> None:
-    llm = await get_llm_for_project(redis_client, project_id)
-    graph = create_graph(redis_client, llm)
+    graph = await get_graph_for_project(redis_client, project_id)
     config = {"configurable": {"thread_id": project_id}}
     await graph.aupdate_state(config, {"messages": list(messages)}, as_node="chatbot")
 
 
 async def get_chat_history(
-    redis_client: RedisClient, project_id: str
+    redis_client: RedisClient,
+    project_id: str,
+    offset: int = 0,
+    limit: int | None = None,
 ) -> list[BaseMessage]:
-    llm = await get_llm_for_project(redis_client, project_id)
-    graph = create_graph(redis_client, llm)
+    # the messages of the latest state, read without building the graph
+    checkpointer = AsyncRedisSaver(redis_client.redis)
     config = {"configurable": {"thread_id": project_id}}
-    snapshot = await graph.aget_state(config)
-    return snapshot.values["messages"]
+    return await checkpointer.aget_messages(config, offset=offset, limit=limit)
+
+
+async def get_chat_messages(
+    redis_client: RedisClient, project_id: str, include_hidden: bool = False
+) -> list[dict[str, str]]:
+    # kept up to date by the checkpointer, read without loading the graph state
+    checkpointer = AsyncRedisSaver(redis_client.redis)
+    return [
+        {"role": message["role"], "content": message["content"]}
+        for message in await checkpointer.aget_chat_history(project_id)
+        if include_hidden or not message.get("hidden")
+    ]
 
 
 async def set_data_dict_in_block(
@@ -71,18 +108,85 @@ async def set_data_dict_in_block(
     block_id: str,
     data_dict: dict[str, pd.DataFrame],
 ) -> None:
-    serialized_dict = {k: serialize_df(v) for k, v in data_dict.items()}
-    await redis_client.set_block_data(
-        project_id, section_id, block_id, "data", serialized_dict
+    project_dir = await get_project_dir(redis_client, project_id)
+    previews, artifacts = {}, {}
+    for name, df in data_dict.items():
+        if should_spill(df):
+            artifacts[name] = await run_in_executor(
+                io_executor, write_artifact, project_dir, section_id, block_id, df
+            )
+            previews[name] = df.head(settings.ARTIFACT_PREVIEW_ROWS)
+        else:
+            previews[name] = df
+    await redis_client.set_block_dataframes(
+        project_id, section_id, block_id, previews, artifacts=artifacts
+    )
+    # files of the previous result
+    await run_in_executor(
+        io_executor,
+        delete_artifacts,
+        project_dir,
+        section_id,
+        block_id,
+        keep=list(artifacts.values()),
     )
 
 
 async def get_data_dict_in_block(
-    redis_client: RedisClient, project_id: str, section_id: str, block_id: str
+    redis_client: RedisClient,
+    project_id: str,
+    section_id: str,
+    block_id: str,
+    head_only: bool = False,
 ) -> dict[str, pd.DataFrame]:
-    serialized_dict = await redis_client.get_block_data(
-        project_id, section_id, block_id, "data"
+    """
+    Gets the DataFrames of a block, with `head_only` only the first ARTIFACT_PREVIEW_ROWS
+    rows of the ones stored as artifacts, enough for the schema given to the LLM.
+    """
+    data_dict = await redis_client.get_block_dataframes(
+        project_id, section_id, block_id
+    )
+    artifacts = await redis_client.get_block_data(
+        project_id, section_id, block_id, "artifacts"
+    )
+    if artifacts:
+        project_dir = await get_project_dir(redis_client, project_id)
+        for name, artifact in artifacts.items():
+            try:
+                if head_only:
+                    data_dict[name] = await run_in_executor(
+                        io_executor,
+                        read_artifact_head,
+                        project_dir,
+                        artifact,
+                        settings.ARTIFACT_PREVIEW_ROWS,
+                    )
+                else:
+                    data_dict[name] = await run_in_executor(
+                        io_executor, read_artifact, project_dir, artifact
+                    )
+            except FileNotFoundError:
+                logger.warning(
+                    "ARTIFACT - %s not found, only its preview is used",
+                    artifact["path"],
+                )
+    return data_dict
+
+
+async def delete_data_dict_in_block(
+    redis_client: RedisClient,
+    project_id: str,
+    section_id: str,
+    block_id: str,
+) -> None:
+    await redis_client.delete_block_dataframes(project_id, section_id, block_id)
+    project_dir = await get_project_dir(redis_client, project_id)
+    await run_in_executor(
+        io_executor, delete_artifacts, project_dir, section_id, block_id
     )
+
+
+def deserialize_data_dict(serialized_dict: dict | None) -> dict[str, pd.DataFrame]:
     if serialized_dict is None:
         return {}
     return {k: deserialize_df(v) for k, v in serialized_dict.items()}
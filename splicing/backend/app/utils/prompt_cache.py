@@ -0,0 +1,99 @@
+"""
+Prompt caching of the stable prefix of LLM calls: system messages with instructions
+and examples come first, followed by messages that change per call. OpenAI caches
+identical prefixes automatically, Anthropic only caches up to marked breakpoints.
+"""
+
+import logging
+from typing import Any
+
+from langchain_anthropic import ChatAnthropic
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import LLMResult
+
+logger = logging.getLogger(__name__)
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def _add_cache_control(message: BaseMessage) -> BaseMessage:
+    if isinstance(message.content, str):
+        blocks = [{"type": "text", "text": message.content}]
+    else:
+        blocks = list(message.content)
+    blocks[-1] = {**blocks[-1], "cache_control": CACHE_CONTROL}
+    # a copy, messages of the graph state are saved as they are
+    return message.model_copy(update={"content": blocks})
+
+
+def add_cache_breakpoints(
+    llm: BaseChatModel, messages: list[BaseMessage], conversation: bool = False
+) -> list[BaseMessage]:
+    """
+    Marks the leading system message as a cache breakpoint for Anthropic, and with
+    `conversation` the latest user message too, so the next call of the conversation
+    reads everything before its new messages from the cache.
+    """
+    if not isinstance(llm, ChatAnthropic):
+        return messages
+    indexes = []
+    if messages and isinstance(messages[0], SystemMessage):
+        indexes.append(0)
+    if conversation:
+        for i in range(len(messages) - 1, 0, -1):
+            if isinstance(messages[i], HumanMessage):
+                indexes.append(i)
+                break
+    messages = list(messages)
+    for i in indexes:
+        if messages[i].content:
+            messages[i] = _add_cache_control(messages[i])
+    return messages
+
+
+class PromptCacheStats(BaseCallbackHandler):
+    """Counts input tokens of all LLM calls read from the prompt cache or not."""
+
+    # counters are only updated in the event loop, not in executor threads
+    run_inline = True
+
+    def __init__(self) -> None:
+        self.num_calls = 0
+        self.input_tokens = 0
+        self.cached_input_tokens = 0
+        self.cache_creation_input_tokens = 0
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if not usage:
+                    continue
+                details = usage.get("input_token_details") or {}
+                cached = details.get("cache_read") or 0
+                created = details.get("cache_creation") or 0
+                self.num_calls += 1
+                self.input_tokens += usage["input_tokens"]
+                self.cached_input_tokens += cached
+                self.cache_creation_input_tokens += created
+                logger.debug(
+                    "LLM - input tokens: %d, cached: %d, uncached: %d",
+                    usage["input_tokens"],
+                    cached,
+                    usage["input_tokens"] - cached,
+                )
+
+    def get_stats(self) -> dict:
+        return {
+            "calls": self.num_calls,
+            "inputTokens": self.input_tokens,
+            "cachedInputTokens": self.cached_input_tokens,
+            "uncachedInputTokens": self.input_tokens - self.cached_input_tokens,
+            "cacheCreationInputTokens": self.cache_creation_input_tokens,
+        }
+
+
+prompt_cache_stats = PromptCacheStats()
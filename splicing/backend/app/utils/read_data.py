@@ -1,3 +1,5 @@
+import hashlib
+import json
 import logging
 import os
 
@@ -7,8 +9,13 @@ from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
 from langchain_core.tools import InjectedToolArg, StructuredTool
 from typing_extensions import Annotated
 
+from app.core.config import settings as app_settings
 from app.generated.schema import IntegrationType
+from app.utils.duckdb_pool import duckdb_pool
+from app.utils.executor import io_executor, run_in_executor
+from app.utils.local_cache import MISSING, LocalCache
 from app.utils.project_helper import get_app_dir
+from app.utils.prompt_cache import add_cache_breakpoints
 from app.utils.prompt_manager import PromptManager
 
 dir_path = os.path.dirname(os.path.realpath(__file__))
@@ -16,6 +23,12 @@ prompt_manager = PromptManager(os.path.join(dir_path, "prompts.yaml"))
 
 logger = logging.getLogger(__name__)
 
+# tool calls of the LLM resolving which tables to read, see get_table_cache_key,
+# previews of unchanged blocks and settings then only query the warehouse
+table_cache = LocalCache(
+    app_settings.READ_DATA_CACHE_MAX_SIZE, app_settings.READ_DATA_CACHE_TTL
+)
+
 
 def get_read_data_tool(integration_type: IntegrationType) -> StructuredTool | None:
     func = None
@@ -72,7 +85,18 @@ def get_read_data_messages(
     ]
 
 
-def read_df_from_integration(
+def get_table_cache_key(
+    source: str, messages: list[BaseMessage], settings: dict
+) -> str:
+    # messages only include non-sensitive settings, the key covers all of them
+    value = json.dumps(
+        [source, [message.content for message in messages], settings],
+        sort_keys=True,
+    )
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+async def read_df_from_integration(
     *,
     llm: BaseChatModel,
     source: str,
@@ -85,6 +109,7 @@ def read_df_from_integration(
     LLM can be used to get the arguments of a tool and read data.
     There might be multiple datasets, so we return a dict,
     where the key is "table_name" and the value is data.
+    Queries run in the IO executor, not to block the event loop.
     """
     result = {}
     integration_type = IntegrationType(source)
@@ -94,57 +119,82 @@ def read_df_from_integration(
             settings = integration_settings.get(source)
             # if the source block is using dbt, we can read data directly
             if generate_result is not None and "modelName" in generate_result:
-                if integration_type == IntegrationType.DUCKDB:
-                    table_name = f'{settings.get("schema", "main")}.{generate_result["modelName"]}'
-                    result[table_name] = read_df_from_duckdb(
-                        database_path=settings["databaseFilePath"],
-                        table_name=table_name,
-                    )
-                elif integration_type == IntegrationType.BIGQUERY:
-                    table_id = f'{settings["projectId"]}.{settings["datasetId"]}.{generate_result["modelName"]}'
-                    service_account_key_file_path = os.path.join(
-                        get_app_dir(), settings["serviceAccountKeyFileName"]
-                    )
-                    result[table_id] = read_df_from_bigquery(
-                        service_account_key_file_path=service_account_key_file_path,
-                        table_id=table_id,
-                    )
+                try:
+                    if integration_type == IntegrationType.DUCKDB:
+                        table_name = f'{settings.get("schema", "main")}.{generate_result["modelName"]}'
+                        result[table_name] = await run_in_executor(
+                            io_executor,
+                            read_df_from_duckdb,
+                            database_path=settings["databaseFilePath"],
+                            table_name=table_name,
+                        )
+                    elif integration_type == IntegrationType.BIGQUERY:
+                        table_id = f'{settings["projectId"]}.{settings["datasetId"]}.{generate_result["modelName"]}'
+                        service_account_key_file_path = os.path.join(
+                            get_app_dir(), settings["serviceAccountKeyFileName"]
+                        )
+                        result[table_id] = await run_in_executor(
+                            io_executor,
+                            read_df_from_bigquery,
+                            service_account_key_file_path=service_account_key_file_path,
+                            table_id=table_id,
+                        )
+                except TimeoutError as ex:
+                    # the database is being written by a block, like other failed reads
+                    logger.error("READ DATA - exception: %s", ex)
             else:
-                # get messages and invoke llm with tool
+                # get messages and invoke llm with tool, unless the table was resolved
+                # for the same messages and settings before
                 messages = get_read_data_messages(
                     source, source_details, settings, generate_result
                 )
-                llm_with_tools = llm.bind_tools([read_data_tool])
-                response = llm_with_tools.invoke(messages)
-                logger.debug(
-                    "READ DATA - messages: %s, response: %s", messages, response
-                )
-                if tool_calls := response.tool_calls:
-                    for tool_call in tool_calls:
-                        tool_call_args = tool_call.get("args", {})
-                        # we shouldn't raise any exception here because of LLM's incapability
-                        # i.e., use tool incorrectly
-                        try:
-                            df, key = None, None
-                            if integration_type == IntegrationType.DUCKDB:
-                                key = tool_call_args["table_name"].split(".")[-1]
-                                df = read_df_from_duckdb(
-                                    database_path=settings["databaseFilePath"],
-                                    **tool_call_args,
-                                )
-                            elif integration_type == IntegrationType.BIGQUERY:
-                                service_account_key_file_path = os.path.join(
-                                    get_app_dir(), settings["serviceAccountKeyFileName"]
-                                )
-                                key = tool_call_args["table_id"].split(".")[-1]
-                                df = read_df_from_bigquery(
-                                    service_account_key_file_path=service_account_key_file_path,
-                                    **tool_call_args,
-                                )
-                            if key is not None and df is not None:
-                                result[key] = df
-                        except Exception as ex:
-                            logger.error("READ DATA - exception: %s", ex)
+                cache_key = get_table_cache_key(source, messages, settings)
+                tool_calls = table_cache.get(cache_key)
+                if tool_calls is MISSING:
+                    llm_with_tools = llm.bind_tools([read_data_tool])
+                    response = await llm_with_tools.ainvoke(
+                        add_cache_breakpoints(llm, messages)
+                    )
+                    logger.debug(
+                        "READ DATA - messages: %s, response: %s", messages, response
+                    )
+                    tool_calls = response.tool_calls
+                    if tool_calls:
+                        table_cache.set(cache_key, tool_calls)
+                for tool_call in tool_calls:
+                    tool_call_args = tool_call.get("args", {})
+                    # we shouldn't raise any exception here because of LLM's incapability
+                    # i.e., use tool incorrectly
+                    try:
+                        df, key = None, None
+                        if integration_type == IntegrationType.DUCKDB:
+                            key = tool_call_args["table_name"].split(".")[-1]
+                            df = await run_in_executor(
+                                io_executor,
+                                read_df_from_duckdb,
+                                database_path=settings["databaseFilePath"],
+                                **tool_call_args,
+                            )
+                        elif integration_type == IntegrationType.BIGQUERY:
+                            service_account_key_file_path = os.path.join(
+                                get_app_dir(), settings["serviceAccountKeyFileName"]
+                            )
+                            key = tool_call_args["table_id"].split(".")[-1]
+                            df = await run_in_executor(
+                                io_executor,
+                                read_df_from_bigquery,
+                                service_account_key_file_path=service_account_key_file_path,
+                                **tool_call_args,
+                            )
+                        if key is not None and df is not None:
+                            result[key] = df
+                    except TimeoutError as ex:
+                        # the database is being written by a block, the tables are right
+                        logger.error("READ DATA - exception: %s", ex)
+                    except Exception as ex:
+                        logger.error("READ DATA - exception: %s", ex)
+                        # resolve the tables again next time
+                        table_cache.invalidate(cache_key)
     return result
 
 
@@ -160,10 +210,8 @@ def read_df_from_duckdb(
         table_name: The fully-qualified table name. If schema is specified,
             use `<schema_name>.<table_name>`; else just use `<table_name>`.
     """
-    import duckdb
-
-    conn = duckdb.connect(database=database_path, read_only=True)
-    df = conn.execute(f"SELECT * FROM {table_name} LIMIT {num_rows}").fetchdf()
+    with duckdb_pool.cursor(database_path) as cursor:
+        df = cursor.execute(f"SELECT * FROM {table_name} LIMIT {num_rows}").fetchdf()
     return df
 
 
@@ -9,6 +9,7 @@ from pydantic import BaseModel
 
 from app.generated.schema import SectionType
 from app.utils.helper import get_schema
+from app.utils.prompt_cache import add_cache_breakpoints
 from app.utils.prompt_manager import PromptManager
 
 dir_path = os.path.dirname(os.path.realpath(__file__))
@@ -32,8 +33,12 @@ async def recommend(
     data_dict: dict[str, pd.DataFrame],
     **kwargs,
 ) -> AsyncIterator[list[str] | None]:
+    # the instruction only depends on the section type, so it's part of the system
+    # message, the cached prefix of calls for the same section type
     system_message = prompt_manager.get_prompt(
         "recommend", "system_message", section_type=section_type.value.lower()
+    ) + prompt_manager.get_prompt(
+        "recommend", "instruction", section_type.value.lower(), **kwargs
     )
     dataset_summary = []
     for name, data in data_dict.items():
@@ -47,23 +52,19 @@ async def recommend(
             )
         )
     # we don't need source details to give recommendations
-    data_instruction = prompt_manager.get_prompt(
+    user_message = prompt_manager.get_prompt(
         "data_instruction",
         "with_data",
         dataset_summary="\n".join(dataset_summary),
         context="",
     )
-    user_message = prompt_manager.get_prompt(
-        "recommend",
-        "user_message",
-        section_type.value.lower(),
-        data_instruction=data_instruction,
-        **kwargs,
+    messages = add_cache_breakpoints(
+        llm,
+        [
+            SystemMessage(content=system_message),
+            HumanMessage(content=user_message),
+        ],
     )
-    messages = [
-        SystemMessage(content=system_message),
-        HumanMessage(content=user_message),
-    ]
     structured_llm = llm.with_structured_output(RecommendResult.model_json_schema())
 
     async def response_generator():
@@ -1,42 +1,261 @@
 import datetime
 import json
-from enum import Enum
-from typing import Any
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any, AsyncIterator, Awaitable, Callable
 
 import pandas as pd
 from redis import asyncio as aioredis
-
-from app.utils.helper import serialize_df
-
-
-class CustomJsonEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, Enum):
-            return obj.value
-        return super().default(obj)
+from redis.asyncio.client import Pipeline
+
+from app.core.config import settings
+from app.generated.schema import SettingsSectionType
+from app.utils.codec import CustomJsonEncoder, JsonCodec, get_codec
+from app.utils.executor import io_executor, run_in_executor
+from app.utils.helper import deserialize_df, serialize_df
+from app.utils.local_cache import CACHE_INVALIDATION_CHANNEL, MISSING, LocalCache
+
+SECTION_SNAPSHOT_KEYS = ["metadata", "current_block_id"]
+BLOCK_SNAPSHOT_KEYS = ["metadata", "setup", "generate_result", "data", "execute_result"]
+
+# "key": every section/block field is a string key `<section or block key>:<field>`
+# "hash": every section/block is a hash and its fields are hash fields
+STORAGE_LAYOUTS = ["key", "hash"]
+
+DATA_COMPRESSIONS = ["zstd", "lz4", "snappy", "gzip", "none"]
+
+# swaps an item of a list with the one before ("up") or after ("down") it,
+# in one round trip and atomically, returns the new index or -1 if it's not found
+MOVE_LIST_ITEM_SCRIPT = """
+local idx = redis.call("LPOS", KEYS[1], ARGV[1])
+if not idx then
+    return -1
+end
+local swap_idx = idx
+if ARGV[2] == "up" then
+    swap_idx = idx - 1
+elseif ARGV[2] == "down" then
+    swap_idx = idx + 1
+end
+if swap_idx < 0 or swap_idx >= redis.call("LLEN", KEYS[1]) then
+    return idx
+end
+redis.call("LSET", KEYS[1], idx, redis.call("LINDEX", KEYS[1], swap_idx))
+redis.call("LSET", KEYS[1], swap_idx, ARGV[1])
+return swap_idx
+"""
+
+# deletes all keys registered in a registry (last key) and the registry itself, and
+# removes them from the parent registries (other keys) in one atomic step, so keys
+# registered meanwhile can't be left behind, returns the number of deleted keys
+DELETE_REGISTERED_KEYS_SCRIPT = """
+local registry_key = KEYS[#KEYS]
+local keys = redis.call("SMEMBERS", registry_key)
+-- in chunks, unpack is limited by the Lua stack size
+for i = 1, #keys, 1000 do
+    local chunk = {unpack(keys, i, math.min(i + 999, #keys))}
+    redis.call("UNLINK", unpack(chunk))
+    for j = 1, #KEYS - 1 do
+        redis.call("SREM", KEYS[j], unpack(chunk))
+    end
+end
+redis.call("UNLINK", registry_key)
+for j = 1, #KEYS - 1 do
+    redis.call("SREM", KEYS[j], registry_key)
+end
+return #keys
+"""
+
+
+def _serialize_dfs(
+    data_dict: dict[str, pd.DataFrame], compression: str
+) -> dict[str, bytes]:
+    return {k: serialize_df(v, compression) for k, v in data_dict.items()}
+
+
+def _deserialize_dfs(datasets: dict) -> dict[str, pd.DataFrame]:
+    return {k: deserialize_df(v) for k, v in datasets.items()}
 
 
 class RedisClient:
-    def __init__(self, redis: aioredis.Redis) -> None:
+    def __init__(
+        self,
+        redis: aioredis.Redis,
+        layout: str | None = None,
+        legacy_fallback: bool | None = None,
+        compression: str | None = None,
+        cache: LocalCache | None = None,
+        codec: JsonCodec | None = None,
+    ) -> None:
         self.redis = redis
+        self._move_list_item = redis.register_script(MOVE_LIST_ITEM_SCRIPT)
+        self._delete_registered = redis.register_script(DELETE_REGISTERED_KEYS_SCRIPT)
+        self.codec = codec or get_codec(settings.JSON_CODEC)
+        # in-process cache of project metadata and settings, shared by all requests
+        self.cache = cache
+        self.layout = layout or settings.REDIS_STORAGE_LAYOUT
+        if self.layout not in STORAGE_LAYOUTS:
+            raise ValueError(f"Unsupported storage layout: {self.layout}")
+        # with hash layout, also read fields from string keys not migrated yet
+        self.legacy_fallback = (
+            settings.REDIS_LEGACY_FALLBACK
+            if legacy_fallback is None
+            else legacy_fallback
+        ) and self.layout == "hash"
+        self.compression = compression or settings.REDIS_DATA_COMPRESSION
+        if self.compression not in DATA_COMPRESSIONS:
+            raise ValueError(f"Unsupported data compression: {self.compression}")
+
+    def _dumps(self, value: Any) -> bytes:
+        return self.codec.dumps(value)
+
+    def _loads(self, value: bytes | None) -> Any:
+        return self.codec.loads(value) if value else None
+
+    async def _get_cached(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Gets the raw value of a key through the local cache, if there is one."""
+        if self.cache is None:
+            return await fetch()
+        value = self.cache.get(key)
+        if value is MISSING:
+            version = self.cache.version
+            value = await fetch()
+            self.cache.set(key, value, version)
+        return value
+
+    @staticmethod
+    def _queue_invalidate(pipe: Pipeline, key: str) -> None:
+        # every worker evicts the key from its local cache, see local_cache
+        pipe.publish(CACHE_INVALIDATION_CHANNEL, key)
+
+    def _evict(self, key: str) -> None:
+        # the published invalidation arrives later, evict right after the write
+        if self.cache is not None:
+            self.cache.invalidate(key)
+
+    @staticmethod
+    def _section_key(project_id: str, section_id: str) -> str:
+        return f"{project_id}:section:{section_id}"
+
+    @classmethod
+    def _block_key(cls, project_id: str, section_id: str, block_id: str) -> str:
+        return f"{cls._section_key(project_id, section_id)}:block:{block_id}"
 
     async def _set(self, key: str, value: Any) -> None:
-        if isinstance(value, pd.DataFrame):
-            value = serialize_df(value)
-        else:
-            value = json.dumps(value, cls=CustomJsonEncoder)
-        await self.redis.set(key, value)
+        await self.redis.set(key, self._dumps(value))
 
     async def _get(self, key: str) -> Any:
         result = await self.redis.get(key)
-        if result:
-            return json.loads(result.decode())
-        else:
-            return None
+        return self._loads(result)
 
     async def _delete(self, key: str) -> None:
         await self.redis.delete(key)
 
+    async def _get_field(self, key: str, field: str) -> Any:
+        """Gets a field of a section or block, `key` is the section or block key."""
+        if self.layout == "key":
+            return await self._get(f"{key}:{field}")
+        if self.legacy_fallback:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hget(key, field)
+                pipe.get(f"{key}:{field}")
+                value, legacy_value = await pipe.execute()
+            return self._loads(value or legacy_value)
+        return self._loads(await self.redis.hget(key, field))
+
+    @classmethod
+    def _datasets_key(cls, project_id: str, section_id: str, block_id: str) -> str:
+        # a hash of Parquet bytes per dataset of the block
+        return f"{cls._block_key(project_id, section_id, block_id)}:datasets"
+
+    @classmethod
+    def _registry_keys(
+        cls, project_id: str, section_id: str | None = None, block_id: str | None = None
+    ) -> list[str]:
+        """
+        Keys of the sets which index all keys of the project, the section and the block,
+        so they can be deleted without scanning the keyspace.
+        """
+        registry_keys = [f"{project_id}:keys"]
+        if section_id is not None:
+            registry_keys.append(f"{cls._section_key(project_id, section_id)}:keys")
+        if block_id is not None:
+            registry_keys.append(
+                f"{cls._block_key(project_id, section_id, block_id)}:keys"
+            )
+        return registry_keys
+
+    def _queue_register(
+        self,
+        pipe: Pipeline,
+        key: str,
+        project_id: str,
+        section_id: str | None = None,
+        block_id: str | None = None,
+    ) -> None:
+        registry_keys = self._registry_keys(project_id, section_id, block_id)
+        for idx, registry_key in enumerate(registry_keys, start=1):
+            # registries of nested sections and blocks are indexed as well
+            pipe.sadd(registry_key, key, *registry_keys[idx:])
+
+    async def _delete_registered_keys(
+        self,
+        project_id: str,
+        section_id: str | None = None,
+        block_id: str | None = None,
+    ) -> None:
+        await self._delete_registered(
+            keys=self._registry_keys(project_id, section_id, block_id)
+        )
+
+    @asynccontextmanager
+    async def _project_write(self, project_id: str) -> AsyncIterator[Pipeline]:
+        """
+        Yields a transaction to queue writes of a project in, the project's
+        modification time is updated in the same transaction.
+        """
+        async with self.redis.pipeline(transaction=True) as pipe:
+            yield pipe
+            key = f"{project_id}:modified_on"
+            pipe.set(key, self._dumps(datetime.datetime.utcnow().isoformat()))
+            self._queue_register(pipe, key, project_id)
+            await pipe.execute()
+
+    def _queue_set_field(
+        self,
+        pipe: Pipeline,
+        field: str,
+        value: Any,
+        project_id: str,
+        section_id: str,
+        block_id: str | None = None,
+    ) -> None:
+        key = (
+            self._section_key(project_id, section_id)
+            if block_id is None
+            else self._block_key(project_id, section_id, block_id)
+        )
+        if self.layout == "key":
+            pipe.set(f"{key}:{field}", self._dumps(value))
+            self._queue_register(
+                pipe, f"{key}:{field}", project_id, section_id, block_id
+            )
+            return
+        pipe.hset(key, field, self._dumps(value))
+        self._queue_register(pipe, key, project_id, section_id, block_id)
+        if self.legacy_fallback:
+            pipe.unlink(f"{key}:{field}")
+
+    def _queue_delete_field(self, pipe: Pipeline, key: str, field: str) -> None:
+        if self.layout == "key":
+            pipe.delete(f"{key}:{field}")
+            return
+        pipe.hdel(key, field)
+        if self.legacy_fallback:
+            pipe.unlink(f"{key}:{field}")
+
+    # members of sets and lists are matched byte by byte by SREM, LREM etc.,
+    # so they're always encoded with json instead of the codec
     async def _add_set_data(self, key: str, *values: Any) -> None:
         await self.redis.sadd(
             key, *[json.dumps(value, cls=CustomJsonEncoder) for value in values]
@@ -64,20 +283,9 @@ class RedisClient:
         await self.redis.lrem(key, 1, json.dumps(value, cls=CustomJsonEncoder))
 
     async def _move_list_data(self, key: str, value: Any, direction: str) -> None:
-        data = await self._get_list_data(key)
-        idx = data.index(value)
-        idx_swap = -1
-        if idx > 0 and direction == "up":
-            idx_swap = idx - 1
-        elif idx < len(data) - 1 and direction == "down":
-            idx_swap = idx + 1
-        if idx_swap >= 0:
-            await self.redis.lset(
-                key, idx, json.dumps(data[idx_swap], cls=CustomJsonEncoder)
-            )
-            await self.redis.lset(
-                key, idx_swap, json.dumps(value, cls=CustomJsonEncoder)
-            )
+        await self._move_list_item(
+            keys=[key], args=[json.dumps(value, cls=CustomJsonEncoder), direction]
+        )
 
     async def add_project_id(self, project_id: str) -> None:
         await self._add_set_data("projects", project_id)
@@ -92,62 +300,226 @@ class RedisClient:
         result = await self._get_set_data(key)
         return result
 
-    async def update_project_modified_on(self, project_id: str) -> None:
-        metadata = await self.get_project_data(project_id, "metadata")
-        metadata["modifiedOn"] = datetime.datetime.utcnow().isoformat()
-        await self._set(f"{project_id}:metadata", metadata)
-
     async def set_project_data(self, project_id: str, key: str, value: Any) -> None:
-        await self._set(f"{project_id}:{key}", value)
-        await self.update_project_modified_on(project_id)
+        async with self._project_write(project_id) as pipe:
+            pipe.set(f"{project_id}:{key}", self._dumps(value))
+            self._queue_register(pipe, f"{project_id}:{key}", project_id)
+            if key == "metadata":
+                self._queue_invalidate(pipe, f"{project_id}:{key}")
+        if key == "metadata":
+            self._evict(f"{project_id}:{key}")
 
     async def delete_project_data(self, project_id: str, key: str) -> None:
-        await self._delete(f"{project_id}:{key}")
-        await self.update_project_modified_on(project_id)
+        async with self._project_write(project_id) as pipe:
+            pipe.delete(f"{project_id}:{key}")
+            if key == "metadata":
+                self._queue_invalidate(pipe, f"{project_id}:{key}")
+        if key == "metadata":
+            self._evict(f"{project_id}:{key}")
 
     async def get_project_data(self, project_id: str, key: str) -> Any:
-        result = await self._get(f"{project_id}:{key}")
+        if key == "metadata":
+            result = (await self.get_projects_metadata([project_id]))[0]
+        else:
+            result = await self._get(f"{project_id}:{key}")
         return result
 
+    async def get_project_metadata(self, project_id: str) -> dict | None:
+        """
+        Gets project metadata through the local cache, for the fields which only change
+        when the project is updated. Its modifiedOn can be outdated, use
+        `get_project_data` for that.
+        """
+        key = f"{project_id}:metadata"
+        result = await self._get_cached(key, partial(self.redis.get, key))
+        return self._loads(result)
+
+    async def get_projects_metadata(self, project_ids: list[str]) -> list[dict | None]:
+        """Gets metadata of many projects with one MGET."""
+        if not project_ids:
+            return []
+        result = await self.redis.mget(
+            [
+                key
+                for project_id in project_ids
+                for key in [f"{project_id}:metadata", f"{project_id}:modified_on"]
+            ]
+        )
+        return [
+            self._with_modified_on(self._loads(metadata), self._loads(modified_on))
+            for metadata, modified_on in zip(result[::2], result[1::2])
+        ]
+
+    @staticmethod
+    def _with_modified_on(
+        metadata: dict | None, modified_on: str | None
+    ) -> dict | None:
+        # modifiedOn is kept in its own key so writes don't need to rewrite metadata,
+        # projects which are not written since then only have it in metadata
+        if metadata is not None and modified_on is not None:
+            metadata["modifiedOn"] = modified_on
+        return metadata
+
+    async def get_project_snapshot(self, project_id: str) -> dict:
+        """
+        Loads a project with all its sections and blocks.
+        The number of round trips doesn't depend on the number of sections or blocks:
+        one for the project, one for the block ids, one MGET for the fields and one
+        for the datasets of all blocks.
+        Block "data" is a dict of serialized DataFrames, see `deserialize_data_dict`.
+        """
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.get(f"{project_id}:metadata")
+            pipe.get(f"{project_id}:modified_on")
+            pipe.get(f"{project_id}:last_worked_section_id")
+            pipe.lrange(f"{project_id}:sections", 0, -1)
+            (
+                metadata,
+                modified_on,
+                last_worked_section_id,
+                section_ids,
+            ) = await pipe.execute()
+        section_ids = [json.loads(e.decode()) for e in section_ids]
+
+        all_block_ids = []
+        if section_ids:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for section_id in section_ids:
+                    pipe.lrange(f"{project_id}:section:{section_id}:blocks", 0, -1)
+                result = await pipe.execute()
+            all_block_ids = [[json.loads(e.decode()) for e in ids] for ids in result]
+
+        # (key of the section or block, fields to load)
+        entries = []
+        for section_id, block_ids in zip(section_ids, all_block_ids):
+            entries.append(
+                (self._section_key(project_id, section_id), SECTION_SNAPSHOT_KEYS)
+            )
+            entries += [
+                (self._block_key(project_id, section_id, block_id), BLOCK_SNAPSHOT_KEYS)
+                for block_id in block_ids
+            ]
+        values = iter(await self._get_fields_of_many(entries))
+        all_datasets = iter(
+            await self._get_datasets_of_many(
+                [
+                    (project_id, section_id, block_id)
+                    for section_id, block_ids in zip(section_ids, all_block_ids)
+                    for block_id in block_ids
+                ]
+            )
+        )
+
+        sections = []
+        for section_id, block_ids in zip(section_ids, all_block_ids):
+            section = {"id": section_id, **next(values)}
+            section["blocks"] = []
+            for block_id in block_ids:
+                block = {"id": block_id, **next(values)}
+                # data written before datasets were stored as bytes is in the field
+                block["data"] = next(all_datasets) or block["data"]
+                section["blocks"].append(block)
+            sections.append(section)
+        return {
+            "metadata": self._with_modified_on(
+                self._loads(metadata), self._loads(modified_on)
+            ),
+            "last_worked_section_id": self._loads(last_worked_section_id),
+            "sections": sections,
+        }
+
+    async def _get_fields_of_many(
+        self, entries: list[tuple[str, list[str]]]
+    ) -> list[dict[str, Any]]:
+        """
+        Gets the given fields of many sections or blocks in one round trip:
+        a single MGET with "key" layout, or one HGETALL per entry in a pipeline
+        with "hash" layout.
+        """
+        if not entries:
+            return []
+        legacy_keys = [f"{key}:{field}" for key, fields in entries for field in fields]
+        if self.layout == "key":
+            legacy_values = iter(await self.redis.mget(legacy_keys))
+            return [
+                {field: self._loads(next(legacy_values)) for field in fields}
+                for _, fields in entries
+            ]
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, _ in entries:
+                pipe.hgetall(key)
+            if self.legacy_fallback:
+                pipe.mget(legacy_keys)
+            result = await pipe.execute()
+        legacy_values = iter(result[-1] if self.legacy_fallback else [])
+        fields_of_many = []
+        for (_, fields), values in zip(entries, result):
+            fields_of_many.append({})
+            for field in fields:
+                value = values.get(field.encode())
+                legacy_value = next(legacy_values) if self.legacy_fallback else None
+                fields_of_many[-1][field] = self._loads(value or legacy_value)
+        return fields_of_many
+
+    async def _get_datasets_of_many(
+        self, block_ids: list[tuple[str, str, str]]
+    ) -> list[dict[str, bytes]]:
+        if not block_ids:
+            return []
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for ids in block_ids:
+                pipe.hgetall(self._datasets_key(*ids))
+            result = await pipe.execute()
+        return [{k.decode(): v for k, v in datasets.items()} for datasets in result]
+
     async def delete_all_project_data(self, project_id: str) -> None:
-        async for key in self.redis.scan_iter(f"{project_id}:*"):
-            await self._delete(key.decode())
+        await self._delete_registered_keys(project_id)
+        await self.redis.publish(CACHE_INVALIDATION_CHANNEL, f"{project_id}:metadata")
+        self._evict(f"{project_id}:metadata")
 
     async def get_settings_data(
         self, section_type: str, key: str | None = None
     ) -> dict:
+        settings_key = f"settings:{section_type}"
+        result = await self._get_cached(
+            settings_key, partial(self.redis.hgetall, settings_key)
+        )
         if key:
-            result = await self._get(f"settings:{section_type}:{key}")
-            return result
-        else:
-            result = {}
-            async for key in self.redis.scan_iter(f"settings:{section_type}:*"):
-                key = key.decode()
-                _, _, key_name = key.split(":")
-                value = await self._get(key)
-                result[key_name] = value
-            return result
+            return self._loads(result.get(key.encode()))
+        return {k.decode(): self._loads(v) for k, v in result.items()}
 
     async def get_all_settings_data(self) -> list:
-        result = []
-        async for key in self.redis.scan_iter("settings:*"):
-            key = key.decode()
-            _, section_type, key_name = key.split(":")
-            value = await self._get(key)
-            result.append(
-                {
-                    "sectionType": section_type,
-                    "key": key_name,
-                    "value": value,
-                }
-            )
-        return result
+        section_types = [e.value for e in SettingsSectionType]
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for section_type in section_types:
+                pipe.hgetall(f"settings:{section_type}")
+            all_settings = await pipe.execute()
+        return [
+            {
+                "sectionType": section_type,
+                "key": key_name.decode(),
+                "value": self._loads(value),
+            }
+            for section_type, settings_data in zip(section_types, all_settings)
+            for key_name, value in settings_data.items()
+        ]
 
     async def set_settings_data(self, section_type: str, key: str, value: dict) -> None:
-        await self._set(f"settings:{section_type}:{key}", value)
+        settings_key = f"settings:{section_type}"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(settings_key, key, self._dumps(value))
+            self._queue_invalidate(pipe, settings_key)
+            await pipe.execute()
+        self._evict(settings_key)
 
     async def delete_settings_data(self, section_type: str, key: str) -> None:
-        await self._delete(f"settings:{section_type}:{key}")
+        settings_key = f"settings:{section_type}"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hdel(settings_key, key)
+            self._queue_invalidate(pipe, settings_key)
+            await pipe.execute()
+        self._evict(settings_key)
 
     async def get_all_section_ids(self, project_id: str) -> list:
         key = f"{project_id}:sections"
@@ -157,12 +529,11 @@ class RedisClient:
         return result
 
     async def get_section_data(self, project_id: str, section_id: str, key: str) -> Any:
-        result = await self.get_project_data(project_id, f"section:{section_id}:{key}")
+        result = await self._get_field(self._section_key(project_id, section_id), key)
         return result
 
     async def delete_all_section_data(self, project_id: str, section_id: str) -> None:
-        async for key in self.redis.scan_iter(f"{project_id}:section:{section_id}:*"):
-            await self._delete(key)
+        await self._delete_registered_keys(project_id, section_id)
 
     async def move_section(
         self, project_id: str, section_id: str, direction: str
@@ -170,7 +541,12 @@ class RedisClient:
         await self._move_list_data(f"{project_id}:sections", section_id, direction)
 
     async def add_section_id(self, project_id: str, section_id: str) -> None:
-        await self._append_list_data(f"{project_id}:sections", section_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.rpush(
+                f"{project_id}:sections", json.dumps(section_id, cls=CustomJsonEncoder)
+            )
+            self._queue_register(pipe, f"{project_id}:sections", project_id)
+            await pipe.execute()
 
     async def delete_section_id(self, project_id: str, section_id: str) -> None:
         await self._delete_list_data(f"{project_id}:sections", section_id)
@@ -178,12 +554,16 @@ class RedisClient:
     async def set_section_data(
         self, project_id: str, section_id: str, key: str, value: Any
     ) -> None:
-        await self.set_project_data(project_id, f"section:{section_id}:{key}", value)
+        async with self._project_write(project_id) as pipe:
+            self._queue_set_field(pipe, key, value, project_id, section_id)
 
     async def delete_section_data(
         self, project_id: str, section_id: str, key: str
     ) -> None:
-        await self.delete_project_data(project_id, f"section:{section_id}:{key}")
+        async with self._project_write(project_id) as pipe:
+            self._queue_delete_field(
+                pipe, self._section_key(project_id, section_id), key
+            )
 
     async def get_all_block_ids(self, project_id: str, section_id: str) -> list:
         key = f"{project_id}:section:{section_id}:blocks"
@@ -199,26 +579,30 @@ class RedisClient:
         block_id: str,
         key: str,
     ) -> Any:
-        result = await self.get_section_data(
-            project_id,
-            section_id,
-            f"block:{block_id}:{key}",
+        result = await self._get_field(
+            self._block_key(project_id, section_id, block_id), key
         )
         return result
 
     async def delete_all_block_data(
         self, project_id: str, section_id: str, block_id: str
     ) -> None:
-        async for key in self.redis.scan_iter(
-            f"{project_id}:section:{section_id}:block:{block_id}:*"
-        ):
-            await self._delete(key.decode())
+        await self._delete_registered_keys(project_id, section_id, block_id)
 
     async def add_block_id(
         self, project_id: str, section_id: str, block_id: str
     ) -> None:
-        await self._append_list_data(
-            f"{project_id}:section:{section_id}:blocks", block_id
+        key = f"{self._section_key(project_id, section_id)}:blocks"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.rpush(key, json.dumps(block_id, cls=CustomJsonEncoder))
+            self._queue_register(pipe, key, project_id, section_id)
+            await pipe.execute()
+
+    async def move_block(
+        self, project_id: str, section_id: str, block_id: str, direction: str
+    ) -> None:
+        await self._move_list_data(
+            f"{self._section_key(project_id, section_id)}:blocks", block_id, direction
         )
 
     async def delete_block_id(
@@ -231,13 +615,67 @@ class RedisClient:
     async def set_block_data(
         self, project_id: str, section_id: str, block_id: str, key: str, value: Any
     ) -> None:
-        await self.set_section_data(
-            project_id, section_id, f"block:{block_id}:{key}", value
+        async with self._project_write(project_id) as pipe:
+            self._queue_set_field(pipe, key, value, project_id, section_id, block_id)
+
+    async def set_block_dataframes(
+        self,
+        project_id: str,
+        section_id: str,
+        block_id: str,
+        data_dict: dict[str, pd.DataFrame],
+        artifacts: dict[str, dict] | None = None,
+    ) -> None:
+        """
+        Stores the DataFrames of a block as compressed Parquet, one hash field each.
+        `artifacts` are the files of DataFrames only stored partially, see artifact_store.
+        """
+        key = self._datasets_key(project_id, section_id, block_id)
+        block_key = self._block_key(project_id, section_id, block_id)
+        # Parquet encoding of large DataFrames would block the event loop
+        mapping = await run_in_executor(
+            io_executor, _serialize_dfs, data_dict, self.compression
         )
+        async with self._project_write(project_id) as pipe:
+            pipe.unlink(key)
+            if mapping:
+                pipe.hset(key, mapping=mapping)
+                self._queue_register(pipe, key, project_id, section_id, block_id)
+            self._queue_delete_field(pipe, block_key, "data")
+            if artifacts:
+                self._queue_set_field(
+                    pipe, "artifacts", artifacts, project_id, section_id, block_id
+                )
+            else:
+                self._queue_delete_field(pipe, block_key, "artifacts")
+
+    async def get_block_dataframes(
+        self, project_id: str, section_id: str, block_id: str
+    ) -> dict[str, pd.DataFrame]:
+        datasets = (
+            await self._get_datasets_of_many([(project_id, section_id, block_id)])
+        )[0]
+        if not datasets:
+            # data written before datasets were stored as bytes
+            datasets = (
+                await self.get_block_data(project_id, section_id, block_id, "data")
+                or {}
+            )
+        return await run_in_executor(io_executor, _deserialize_dfs, datasets)
+
+    async def delete_block_dataframes(
+        self, project_id: str, section_id: str, block_id: str
+    ) -> None:
+        block_key = self._block_key(project_id, section_id, block_id)
+        async with self._project_write(project_id) as pipe:
+            pipe.unlink(self._datasets_key(project_id, section_id, block_id))
+            self._queue_delete_field(pipe, block_key, "data")
+            self._queue_delete_field(pipe, block_key, "artifacts")
 
     async def delete_block_data(
         self, project_id: str, section_id: str, block_id: str, key: str
     ) -> None:
-        await self.delete_section_data(
-            project_id, section_id, f"block:{block_id}:{key}"
-        )
+        async with self._project_write(project_id) as pipe:
+            self._queue_delete_field(
+                pipe, self._block_key(project_id, section_id, block_id), key
+            )
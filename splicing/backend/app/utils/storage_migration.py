@@ -0,0 +1,351 @@
+"""
+Migrations of the data stored in Redis.
+Every step can run while the app is serving requests, and can be re-run if it's interrupted.
+"""
+
+import asyncio
+import base64
+import logging
+from contextlib import suppress
+from typing import Awaitable, Callable
+
+from redis import asyncio as aioredis
+from redis.exceptions import WatchError
+
+from app.utils.agent.checkpointer import AsyncRedisSaver
+from app.utils.helper import generate_id
+from app.utils.redis_client import RedisClient
+
+logger = logging.getLogger(__name__)
+
+STORAGE_META_KEY = "storage:meta"
+# held by the worker migrating the storage, renewed while it runs,
+# and expires if the worker dies meanwhile
+MIGRATION_LOCK_KEY = "storage:migration_lock"
+MIGRATION_LOCK_TTL = 60
+# other workers poll the storage version until it's migrated, and fail to start after
+MIGRATION_POLL_INTERVAL = 1
+MIGRATION_WAIT_TIMEOUT = 1800
+
+# deletes the lock only if it's still held by the given token
+RELEASE_LOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+# extends the lock only if it's still held by the given token
+RENEW_LOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("PEXPIRE", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+async def index_keys(redis_client: RedisClient) -> None:
+    """Indexes keys of existing projects and moves settings to one hash per section type."""
+    redis = redis_client.redis
+    for project_id in await redis_client.get_all_project_ids():
+        async with redis.pipeline(transaction=False) as pipe:
+            async for key in redis.scan_iter(f"{project_id}:*"):
+                key = key.decode()
+                if key.endswith(":keys"):
+                    continue
+                parts = key.removeprefix(f"{project_id}:").split(":")
+                section_id, block_id = None, None
+                if parts[0] == "section":
+                    section_id = parts[1]
+                    if len(parts) >= 4 and parts[2] == "block":
+                        block_id = parts[3]
+                redis_client._queue_register(
+                    pipe, key, project_id, section_id, block_id
+                )
+            await pipe.execute()
+
+    async for key in redis.scan_iter("settings:*:*"):
+        key = key.decode()
+        _, section_type, name = key.split(":")
+        await _move_keys_to_hash(redis, f"settings:{section_type}", {name: key})
+
+
+async def move_block_data_to_datasets(redis_client: RedisClient) -> None:
+    """Moves block data from a JSON field of base64 strings to a hash of Parquet bytes."""
+    for project_id in await redis_client.get_all_project_ids():
+        for section_id in await redis_client.get_all_section_ids(project_id):
+            for block_id in await redis_client.get_all_block_ids(
+                project_id, section_id
+            ):
+                await _move_data_to_datasets(
+                    redis_client, project_id, section_id, block_id
+                )
+
+
+async def index_checkpoints(redis_client: RedisClient) -> None:
+    await AsyncRedisSaver(redis_client.redis).aindex_checkpoints()
+
+
+async def merge_checkpoint_writes(redis_client: RedisClient) -> None:
+    await AsyncRedisSaver(redis_client.redis).amerge_writes()
+
+
+async def index_checkpoint_metadata(redis_client: RedisClient) -> None:
+    await AsyncRedisSaver(redis_client.redis).aindex_metadata()
+
+
+async def index_checkpoint_threads_and_writes(redis_client: RedisClient) -> None:
+    await AsyncRedisSaver(redis_client.redis).aindex_threads_and_writes()
+
+
+async def version_checkpoint_messages(redis_client: RedisClient) -> None:
+    await AsyncRedisSaver(redis_client.redis).aversion_messages()
+
+
+# (version, description, migration), applied in order after the layout conversion
+MIGRATIONS: list[tuple[int, str, Callable[[RedisClient], Awaitable[None]]]] = [
+    (1, "index keys of projects, sections and blocks", index_keys),
+    (2, "store block data as Parquet bytes", move_block_data_to_datasets),
+    (3, "index checkpoints of conversations", index_checkpoints),
+    (4, "store writes of a checkpoint in one hash", merge_checkpoint_writes),
+    (5, "index metadata of checkpoints", index_checkpoint_metadata),
+    (6, "index threads and writes of checkpoints", index_checkpoint_threads_and_writes),
+    (7, "store messages of checkpoints by version", version_checkpoint_messages),
+]
+
+
+async def get_storage_meta(redis: aioredis.Redis) -> dict:
+    meta = await redis.hgetall(STORAGE_META_KEY)
+    return {
+        "layout": meta.get(b"layout", b"key").decode(),
+        "version": int(meta.get(b"version", b"0")),
+    }
+
+
+async def migrate(redis_client: RedisClient) -> None:
+    """Converts stored data to the layout of `redis_client` and applies new migrations."""
+    redis = redis_client.redis
+
+    async def is_migrated() -> bool:
+        meta = await get_storage_meta(redis)
+        return meta["layout"] == redis_client.layout and meta["version"] >= len(
+            MIGRATIONS
+        )
+
+    async def run() -> None:
+        if (await get_storage_meta(redis))["layout"] != redis_client.layout:
+            await convert_layout(redis_client, redis_client.layout)
+            await redis.hset(STORAGE_META_KEY, "layout", redis_client.layout)
+        await _apply_new_migrations(redis_client)
+
+    await _run_locked(redis, is_migrated, run)
+
+
+async def apply_migrations(redis_client: RedisClient) -> None:
+    """
+    Applies migrations newer than the stored version, the app runs this on startup.
+    Only one worker applies them, the others wait until they're applied.
+    """
+    redis = redis_client.redis
+
+    async def is_migrated() -> bool:
+        return (await get_storage_meta(redis))["version"] >= len(MIGRATIONS)
+
+    await _run_locked(redis, is_migrated, lambda: _apply_new_migrations(redis_client))
+
+
+async def _apply_new_migrations(redis_client: RedisClient) -> None:
+    redis = redis_client.redis
+    # read after taking the lock, the previous holder could have applied some
+    meta = await get_storage_meta(redis)
+    for version, description, migration in MIGRATIONS:
+        if version > meta["version"]:
+            logger.info("MIGRATE - version %s: %s", version, description)
+            await migration(redis_client)
+            await redis.hset(STORAGE_META_KEY, "version", version)
+
+
+async def _run_locked(
+    redis: aioredis.Redis,
+    is_migrated: Callable[[], Awaitable[bool]],
+    run: Callable[[], Awaitable[None]],
+) -> None:
+    """
+    Runs `run` in the worker taking the migration lock, until `is_migrated`.
+    A worker dying meanwhile lets its lock expire, and a waiting worker takes over.
+    """
+    deadline = asyncio.get_running_loop().time() + MIGRATION_WAIT_TIMEOUT
+    waiting = False
+    while not await is_migrated():
+        token = generate_id()
+        if await redis.set(
+            MIGRATION_LOCK_KEY, token, nx=True, px=int(MIGRATION_LOCK_TTL * 1000)
+        ):
+            renewal = asyncio.create_task(_renew_lock(redis, token))
+            try:
+                if not await is_migrated():
+                    await run()
+            finally:
+                renewal.cancel()
+                with suppress(asyncio.CancelledError):
+                    await renewal
+                await redis.eval(RELEASE_LOCK_SCRIPT, 1, MIGRATION_LOCK_KEY, token)
+            return
+        if asyncio.get_running_loop().time() >= deadline:
+            raise TimeoutError(
+                f"Storage wasn't migrated by another worker in {MIGRATION_WAIT_TIMEOUT}s"
+            )
+        if not waiting:
+            logger.info("MIGRATE - waiting for another worker to migrate the storage")
+            waiting = True
+        await asyncio.sleep(MIGRATION_POLL_INTERVAL)
+
+
+async def _renew_lock(redis: aioredis.Redis, token: str) -> None:
+    # a layout conversion or a migration can run longer than the lock TTL
+    while True:
+        await asyncio.sleep(MIGRATION_LOCK_TTL / 3)
+        if not await redis.eval(
+            RENEW_LOCK_SCRIPT,
+            1,
+            MIGRATION_LOCK_KEY,
+            token,
+            int(MIGRATION_LOCK_TTL * 1000),
+        ):
+            logger.warning("MIGRATE - migration lock lost")
+            return
+
+
+async def convert_layout(redis_client: RedisClient, layout: str) -> None:
+    """
+    Converts sections and blocks of all projects to the given layout.
+    Converting to "hash" is safe while the app runs with "hash" layout and legacy fallback,
+    converting back to "key" should be done while the app is stopped.
+    """
+    for project_id in await redis_client.get_all_project_ids():
+        logger.info("MIGRATE - converting project %s to %s layout", project_id, layout)
+        keys = [
+            key.decode()
+            async for key in redis_client.redis.scan_iter(f"{project_id}:section:*")
+        ]
+        async with redis_client.redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.type(key)
+            key_types = [key_type.decode() for key_type in await pipe.execute()]
+        legacy_keys, hash_keys = {}, []
+        for key, key_type in zip(keys, key_types):
+            parts = key.removeprefix(f"{project_id}:section:").split(":")
+            # fields are strings, lists of ids, registries and datasets are kept
+            if key_type == "string" and len(parts) == 2:
+                # <section>:<field>
+                ids = (project_id, parts[0])
+                hash_key = redis_client._section_key(*ids)
+                legacy_keys.setdefault((hash_key, ids), {})[parts[1]] = key
+            elif key_type == "string" and len(parts) == 4 and parts[1] == "block":
+                # <section>:block:<block>:<field>
+                ids = (project_id, parts[0], parts[2])
+                hash_key = redis_client._block_key(*ids)
+                legacy_keys.setdefault((hash_key, ids), {})[parts[3]] = key
+            elif key_type == "hash" and len(parts) == 1:
+                hash_keys.append((key, (project_id, parts[0])))
+            elif key_type == "hash" and len(parts) == 3 and parts[1] == "block":
+                hash_keys.append((key, (project_id, parts[0], parts[2])))
+
+        if layout == "hash":
+            for (hash_key, ids), fields in legacy_keys.items():
+                await _move_keys_to_hash(
+                    redis_client.redis,
+                    hash_key,
+                    fields,
+                    registry_keys=redis_client._registry_keys(*ids),
+                )
+        else:
+            for hash_key, ids in hash_keys:
+                await _move_hash_to_keys(
+                    redis_client.redis,
+                    hash_key,
+                    registry_keys=redis_client._registry_keys(*ids),
+                )
+
+
+async def _move_keys_to_hash(
+    redis: aioredis.Redis,
+    hash_key: str,
+    fields: dict[str, str],
+    registry_keys: list[str] | None = None,
+) -> None:
+    legacy_keys = list(fields.values())
+    async with redis.pipeline(transaction=True) as pipe:
+        while True:
+            try:
+                # retry if a request writes or deletes one of the fields meanwhile
+                await pipe.watch(*legacy_keys)
+                values = await pipe.mget(legacy_keys)
+                pipe.multi()
+                for field, value in zip(fields, values):
+                    if value is not None:
+                        # a value written with hash layout is newer than the legacy one
+                        pipe.hsetnx(hash_key, field, value)
+                pipe.unlink(*legacy_keys)
+                for registry_key in registry_keys or []:
+                    pipe.srem(registry_key, *legacy_keys)
+                    pipe.sadd(registry_key, hash_key)
+                await pipe.execute()
+                return
+            except WatchError:
+                continue
+
+
+async def _move_hash_to_keys(
+    redis: aioredis.Redis, hash_key: str, registry_keys: list[str] | None = None
+) -> None:
+    async with redis.pipeline(transaction=True) as pipe:
+        while True:
+            try:
+                await pipe.watch(hash_key)
+                values = await pipe.hgetall(hash_key)
+                pipe.multi()
+                for field, value in values.items():
+                    key = f"{hash_key}:{field.decode()}"
+                    pipe.set(key, value, nx=True)
+                    for registry_key in registry_keys or []:
+                        pipe.sadd(registry_key, key)
+                pipe.unlink(hash_key)
+                for registry_key in registry_keys or []:
+                    pipe.srem(registry_key, hash_key)
+                await pipe.execute()
+                return
+            except WatchError:
+                continue
+
+
+async def _move_data_to_datasets(
+    redis_client: RedisClient, project_id: str, section_id: str, block_id: str
+) -> None:
+    block_key = redis_client._block_key(project_id, section_id, block_id)
+    datasets_key = redis_client._datasets_key(project_id, section_id, block_id)
+    # the data field is a hash field or a string key, depending on the layout
+    watched_keys = [datasets_key, block_key, f"{block_key}:data"]
+    async with redis_client.redis.pipeline(transaction=True) as pipe:
+        while True:
+            try:
+                # retry if a request writes the block data meanwhile
+                await pipe.watch(*watched_keys)
+                data = await redis_client.get_block_data(
+                    project_id, section_id, block_id, "data"
+                )
+                if not data:
+                    return
+                pipe.multi()
+                pipe.hset(
+                    datasets_key,
+                    mapping={k: base64.b64decode(v) for k, v in data.items()},
+                )
+                redis_client._queue_register(
+                    pipe, datasets_key, project_id, section_id, block_id
+                )
+                redis_client._queue_delete_field(pipe, block_key, "data")
+                await pipe.execute()
+                return
+            except WatchError:
+                continue
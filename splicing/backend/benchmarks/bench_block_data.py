@@ -0,0 +1,98 @@
+"""
+Compares block data stored as base64 Parquet in JSON, as before, against
+raw Parquet bytes with each compression: encode/decode time and Redis memory.
+
+Usage (from splicing/backend, with Redis running at REDIS_URL):
+    python -m benchmarks.bench_block_data --rows 10000 100000 1000000
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import time
+from functools import partial
+
+import numpy as np
+import pandas as pd
+from redis import asyncio as aioredis
+
+from app.core.config import settings
+from app.utils.helper import deserialize_df, serialize_df
+from app.utils.redis_client import DATA_COMPRESSIONS
+
+KEY = "benchmark:block_data"
+
+
+def create_df(num_rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "id": np.arange(num_rows),
+            "amount": rng.normal(100, 20, num_rows).round(2),
+            "category": rng.choice(["a", "b", "c", "d"], num_rows),
+            "created_at": pd.date_range("2024-01-01", periods=num_rows, freq="s"),
+        }
+    )
+
+
+def encode_legacy(df: pd.DataFrame) -> str:
+    value = base64.b64encode(serialize_df(df, "snappy")).decode("utf-8")
+    return json.dumps({"df": value})
+
+
+def decode_legacy(value: bytes) -> pd.DataFrame:
+    return deserialize_df(json.loads(value.decode())["df"])
+
+
+async def measure(
+    redis: aioredis.Redis, name: str, encode, decode, repeat: int
+) -> None:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        value = encode()
+    encode_ms = (time.perf_counter() - start) / repeat * 1000
+    await redis.set(KEY, value)
+    memory = await redis.memory_usage(KEY)
+    stored = await redis.get(KEY)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        decode(stored)
+    decode_ms = (time.perf_counter() - start) / repeat * 1000
+    result = f"encode {encode_ms:8.1f} ms, decode {decode_ms:8.1f} ms, {memory / 2**20:7.2f} MiB"
+    print(f"  {name:<12} {result}")  # noqa: T201
+
+
+async def main(args: argparse.Namespace) -> None:
+    redis = aioredis.from_url(settings.REDIS_URL)
+    try:
+        for num_rows in args.rows:
+            df = create_df(num_rows)
+            print(f"{num_rows} rows:")  # noqa: T201
+            await measure(
+                redis,
+                "legacy",
+                partial(encode_legacy, df),
+                decode_legacy,
+                args.repeat,
+            )
+            for compression in DATA_COMPRESSIONS:
+                await measure(
+                    redis,
+                    compression,
+                    partial(serialize_df, df, compression),
+                    deserialize_df,
+                    args.repeat,
+                )
+    finally:
+        await redis.delete(KEY)
+        await redis.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
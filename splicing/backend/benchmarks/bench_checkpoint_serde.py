@@ -0,0 +1,92 @@
+"""
+Compares the checkpoint serializers on conversations like the ones of a project:
+hidden context messages, generated code and tool calls. Reports the size of a
+checkpoint with the whole history and the time to dump and load it.
+
+Usage (from splicing/backend):
+    python -m benchmarks.bench_checkpoint_serde --messages 200 500 1000
+"""
+
+import argparse
+import time
+from functools import partial
+from typing import Callable
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.base import empty_checkpoint
+
+from app.generated.schema import SectionType
+from app.utils.agent.serde import SERIALIZERS, get_serializer
+from app.utils.converse import get_context_update_user_message, get_initial_messages
+
+CODE = """
+import pandas as pd
+
+
+def transform_{step}(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.dropna(subset=["{column}_id"])
+    df["amount_{step}"] = df["amount"].astype(float).round({step} % 4)
+    df["created_at"] = pd.to_datetime(df["created_at"], utc=True)
+    df = df[df["amount_{step}"] > {threshold}]
+    return df.groupby(["{column}_id", df["created_at"].dt.date])["amount"].sum().reset_index()
+"""
+
+COLUMNS = ["customer", "order", "product", "store", "supplier", "region"]
+
+
+def create_messages(num_messages: int) -> list[BaseMessage]:
+    messages = get_initial_messages()
+    block_setup = {"tool": "Python", "sourceTable": "orders", "columns": "id, amount"}
+    step = 0
+    while len(messages) < num_messages:
+        tool_call_id = f"call_{step}"
+        code = CODE.format(
+            step=step, column=COLUMNS[step % len(COLUMNS)], threshold=step * 7.5
+        )
+        block_setup["sourceTable"] = f"orders_{step}"
+        messages += [
+            get_context_update_user_message(SectionType.CLEANING, block_setup),
+            HumanMessage(content=f"Please clean the orders, step {step}."),
+            AIMessage(
+                content="",
+                tool_calls=[
+                    {
+                        "name": "generate_code",
+                        "args": {"code": code},
+                        "id": tool_call_id,
+                    }
+                ],
+            ),
+            ToolMessage(content=f"```python\n{code}\n```", tool_call_id=tool_call_id),
+            AIMessage(content=f"Here is the code:\n```python\n{code}\n```"),
+        ]
+        step += 1
+    return messages[:num_messages]
+
+
+def repeat_call(func: Callable, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main(args: argparse.Namespace) -> None:
+    for num_messages in args.messages:
+        checkpoint = empty_checkpoint()
+        checkpoint["channel_values"] = {"messages": create_messages(num_messages)}
+        print(f"{num_messages} messages:")  # noqa: T201
+        for name in SERIALIZERS:
+            serde = get_serializer(name)
+            dumped = serde.dumps_typed(checkpoint)
+            dumps_ms = repeat_call(partial(serde.dumps_typed, checkpoint), args.repeat)
+            loads_ms = repeat_call(partial(serde.loads_typed, dumped), args.repeat)
+            result = f"{len(dumped[1]) / 2**10:9.1f} KiB, dumps {dumps_ms:7.2f} ms, loads {loads_ms:7.2f} ms"
+            print(f"  {name:<14} {result}")  # noqa: T201
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, nargs="+", default=[200, 500, 1000])
+    parser.add_argument("--repeat", type=int, default=10)
+    main(parser.parse_args())
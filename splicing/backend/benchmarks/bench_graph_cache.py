@@ -0,0 +1,70 @@
+"""
+Compares compiling the conversation graph on every request, as before, against
+reusing the compiled graph cached per LLM settings and section type.
+
+Usage (from splicing/backend):
+    python -m benchmarks.bench_graph_cache --repeat 100
+"""
+
+import argparse
+import time
+from functools import partial
+from typing import Callable
+
+from fakeredis import aioredis
+
+from app.generated.schema import LLMType, SectionType
+from app.utils.agent.graph import clear_graph_cache, create_graph, get_graph
+from app.utils.helper import get_llm
+from app.utils.redis_client import RedisClient
+
+LLM_SETTINGS = {
+    LLMType.OPENAI: {"model": "gpt-4o", "apiKey": "sk-benchmark"},
+    LLMType.ANTHROPIC: {"model": "claude-3-5-sonnet-latest", "apiKey": "sk-benchmark"},
+}
+
+
+def build(
+    redis_client: RedisClient,
+    llm_type: LLMType,
+    section_type: SectionType | None,
+) -> None:
+    llm = get_llm(llm_type, LLM_SETTINGS[llm_type])
+    create_graph(redis_client, llm, section_type)
+
+
+def measure(name: str, func: Callable, repeat: int) -> None:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed_ms = (time.perf_counter() - start) / repeat * 1000
+    print(f"  {name:<12} {elapsed_ms:8.3f} ms")  # noqa: T201
+
+
+def main(args: argparse.Namespace) -> None:
+    redis_client = RedisClient(aioredis.FakeRedis())
+    for llm_type in LLM_SETTINGS:
+        for section_type in [None, SectionType.CLEANING]:
+            section = section_type.value if section_type else "none"
+            print(f"{llm_type.value}, section type {section}:")  # noqa: T201
+            measure(
+                "build",
+                partial(build, redis_client, llm_type, section_type),
+                args.repeat,
+            )
+            clear_graph_cache()
+            get = partial(
+                get_graph,
+                redis_client,
+                llm_type,
+                LLM_SETTINGS[llm_type],
+                section_type,
+            )
+            get()
+            measure("reuse", get, args.repeat)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=100)
+    main(parser.parse_args())
@@ -0,0 +1,113 @@
+"""
+Compares the JSON codecs of RedisClient on the values of a large project, and
+the response serialization of FastAPI before 0.130 (jsonable_encoder + json.dumps)
+against the Pydantic fast path used for routes with a return type since then.
+
+Usage (from splicing/backend):
+    python -m benchmarks.bench_json_codec --sections 20 --blocks 20 --rows 100
+"""
+
+import argparse
+import json
+import time
+from functools import partial
+from typing import Callable
+
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.generated.schema import ProjectData
+from app.utils.codec import CODECS
+
+
+def create_project(num_sections: int, num_blocks: int, num_rows: int) -> dict:
+    df = pd.DataFrame(
+        {
+            "id": range(num_rows),
+            "name": [f"name {i}" for i in range(num_rows)],
+            "amount": [i * 1.5 for i in range(num_rows)],
+            "created_at": pd.date_range("2024-01-01", periods=num_rows, freq="h"),
+        }
+    )
+    preview = df.to_json(orient="records", date_format="iso")
+    sections = []
+    for i in range(num_sections):
+        blocks = [
+            {
+                "id": f"s{i}b{j}",
+                "numRows": num_rows,
+                "data": {"df": preview},
+                "executeResult": {"returnValue": None, "error": None},
+            }
+            for j in range(num_blocks)
+        ]
+        sections.append(
+            {
+                "id": f"s{i}",
+                "title": f"Section {i}",
+                "sectionType": "Cleaning",
+                "blocks": blocks,
+                "currentBlockId": blocks[0]["id"] if blocks else None,
+            }
+        )
+    return {
+        "metadata": {
+            "id": "benchmark",
+            "title": "Benchmark",
+            "createdOn": "2024-01-01T00:00:00",
+            "modifiedOn": "2024-01-01T00:00:00",
+            "llm": "OpenAI",
+            "projectDir": "/tmp/benchmark",
+        },
+        "sections": sections,
+        "messages": [{"role": "assistant", "content": "Hi!"}] * 50,
+    }
+
+
+def map_all(func: Callable, values: list) -> list:
+    return [func(value) for value in values]
+
+
+def measure(name: str, func: Callable, repeat: int) -> None:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed_ms = (time.perf_counter() - start) / repeat * 1000
+    print(f"  {name:<32} {elapsed_ms:8.2f} ms")  # noqa: T201
+
+
+def main(args: argparse.Namespace) -> None:
+    payload = create_project(args.sections, args.blocks, args.rows)
+    values = [
+        value
+        for section in payload["sections"]
+        for block in section["blocks"]
+        for value in block.values()
+    ]
+    print("RedisClient values of the project:")  # noqa: T201
+    for name, codec_class in CODECS.items():
+        codec = codec_class()
+        encoded = [codec.dumps(value) for value in values]
+        measure(f"{name} dumps", partial(map_all, codec.dumps, values), args.repeat)
+        measure(f"{name} loads", partial(map_all, codec.loads, encoded), args.repeat)
+
+    project = ProjectData(**payload)
+    adapter = TypeAdapter(ProjectData)
+    size = len(adapter.dump_json(project)) / 2**20
+    print(f"GET /project response ({size:.1f} MiB):")  # noqa: T201
+    measure(
+        "jsonable_encoder + json.dumps",
+        lambda: json.dumps(jsonable_encoder(project)).encode(),
+        args.repeat,
+    )
+    measure("pydantic dump_json", lambda: adapter.dump_json(project), args.repeat)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sections", type=int, default=20)
+    parser.add_argument("--blocks", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=10)
+    main(parser.parse_args())
@@ -0,0 +1,122 @@
+"""
+Compares API throughput with a Redis client created per request against
+the connection pool shared by the whole app.
+
+Usage (from splicing/backend, with Redis running at REDIS_URL):
+    python -m benchmarks.bench_redis_pool --requests 2000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+from redis import asyncio as aioredis
+
+from app.api.dependencies import create_local_cache, create_redis_pool, get_redis_client
+from app.core.config import settings
+from app.main import app
+from app.utils.agent.checkpointer import AsyncRedisSaver
+from app.utils.converse import get_initial_messages
+from app.utils.project_helper import add_chat_messages
+from app.utils.redis_client import RedisClient
+
+PROJECT_ID = "benchmark"
+
+
+async def get_redis_client_per_request() -> RedisClient:
+    # behavior before the shared pool was introduced
+    redis = aioredis.from_url(settings.REDIS_URL)
+    try:
+        yield RedisClient(redis)
+    finally:
+        await redis.close()
+
+
+async def seed(redis_client: RedisClient, num_sections: int, num_blocks: int) -> None:
+    # no LLM call is made, the key is only needed to build the chat graph
+    await redis_client.set_settings_data(
+        "LLM", "OpenAI", {"model": "gpt-4o", "apiKey": "benchmark"}
+    )
+    await redis_client.set_project_data(
+        PROJECT_ID,
+        "metadata",
+        {
+            "id": PROJECT_ID,
+            "title": "Benchmark",
+            "description": "",
+            "llm": "OpenAI",
+            "createdOn": "2024-01-01T00:00:00",
+            "modifiedOn": "2024-01-01T00:00:00",
+            "projectDir": "/tmp/benchmark",
+        },
+    )
+    await redis_client.add_project_id(PROJECT_ID)
+    await add_chat_messages(redis_client, PROJECT_ID, *get_initial_messages())
+    for i in range(num_sections):
+        section_id = f"s{i}"
+        await redis_client.add_section_id(PROJECT_ID, section_id)
+        await redis_client.set_section_data(
+            PROJECT_ID,
+            section_id,
+            "metadata",
+            {"id": section_id, "title": f"Section {i}", "sectionType": "Cleaning"},
+        )
+        for j in range(num_blocks):
+            block_id = f"s{i}b{j}"
+            await redis_client.add_block_id(PROJECT_ID, section_id, block_id)
+            await redis_client.set_block_data(
+                PROJECT_ID,
+                section_id,
+                block_id,
+                "metadata",
+                {"id": block_id, "numRows": 10},
+            )
+
+
+async def run(path: str, num_requests: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def request():
+            async with semaphore:
+                response = await client.get(path)
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*[request() for _ in range(num_requests)])
+        return num_requests / (time.perf_counter() - start)
+
+
+async def main(args: argparse.Namespace) -> None:
+    redis_pool = create_redis_pool()
+    app.state.redis = aioredis.Redis(connection_pool=redis_pool)
+    app.state.local_cache = create_local_cache()
+    redis_client = RedisClient(app.state.redis)
+    await seed(redis_client, args.sections, args.blocks)
+    try:
+        for path in ["/projects", f"/project/{PROJECT_ID}"]:
+            app.dependency_overrides[get_redis_client] = get_redis_client_per_request
+            before = await run(path, args.requests, args.concurrency)
+            app.dependency_overrides.clear()
+            after = await run(path, args.requests, args.concurrency)
+            result = f"per-request {before:.0f} req/s, pooled {after:.0f} req/s"
+            print(f"{path}: {result}")  # noqa: T201
+    finally:
+        await redis_client.delete_all_project_data(PROJECT_ID)
+        await redis_client.delete_project_id(PROJECT_ID)
+        await redis_client.delete_settings_data("LLM", "OpenAI")
+        await AsyncRedisSaver(redis_client.redis).adelete_checkpoint(PROJECT_ID)
+        await redis_pool.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--sections", type=int, default=5)
+    parser.add_argument("--blocks", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
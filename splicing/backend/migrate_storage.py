@@ -0,0 +1,42 @@
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
+
+def main():
+    curr_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, curr_dir)
+
+    from redis import asyncio as aioredis
+
+    from app.core.config import settings
+    from app.utils.helper import setup_logging
+    from app.utils.redis_client import STORAGE_LAYOUTS, RedisClient
+    from app.utils.storage_migration import migrate
+
+    parser = argparse.ArgumentParser(
+        description="Migrates data in Redis to a storage layout and the latest version."
+    )
+    parser.add_argument(
+        "--layout",
+        choices=STORAGE_LAYOUTS,
+        default=settings.REDIS_STORAGE_LAYOUT,
+        help="target storage layout, REDIS_STORAGE_LAYOUT by default",
+    )
+    args = parser.parse_args()
+    setup_logging(logging.INFO)
+
+    async def run():
+        redis = aioredis.from_url(settings.REDIS_URL)
+        try:
+            await migrate(RedisClient(redis, layout=args.layout))
+        finally:
+            await redis.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import pandas as pd
+
+from app.utils.artifact_store import (
+    delete_artifacts,
+    read_artifact,
+    read_artifact_head,
+    write_artifact,
+)
+from app.utils.helper import get_schema
+
+
+def test_write_and_read_artifact(tmp_path):
+    df = pd.DataFrame(
+        {"A": [1, 2, 3], "B": ["a", "b", None]}, index=pd.Index([5, 6, 7], name="i")
+    )
+
+    artifact = write_artifact(str(tmp_path), "s1", "b1", df)
+
+    assert artifact["numRows"] == 3
+    assert artifact["path"].startswith(".artifacts/s1/b1/")
+    pd.testing.assert_frame_equal(read_artifact(str(tmp_path), artifact), df)
+
+
+def test_read_artifact_head(tmp_path):
+    df = pd.DataFrame(
+        {"A": [1, 2, 3, None], "B": ["a", "b", "c", None], "C": [1, 2, 3, 4]}
+    )
+    artifact = write_artifact(str(tmp_path), "s1", "b1", df)
+
+    head = read_artifact_head(str(tmp_path), artifact, 2)
+
+    assert len(head) == 2
+    assert head["C"].tolist() == [1, 2]
+    # the schema is the one of all rows, nulls are only in the last one
+    assert get_schema(head) == get_schema(df)
+
+
+def test_delete_artifacts(tmp_path):
+    df = pd.DataFrame({"A": [1, 2, 3]})
+    artifact_1 = write_artifact(str(tmp_path), "s1", "b1", df)
+    artifact_2 = write_artifact(str(tmp_path), "s1", "b1", df)
+    artifact_3 = write_artifact(str(tmp_path), "s1", "b2", df)
+
+    delete_artifacts(str(tmp_path), "s1", "b1", keep=[artifact_2])
+    assert not (tmp_path / artifact_1["path"]).exists()
+    assert (tmp_path / artifact_2["path"]).exists()
+
+    delete_artifacts(str(tmp_path), "s1")
+    assert not (tmp_path / artifact_3["path"]).exists()
+    assert not (tmp_path / ".artifacts" / "s1").exists()
+    # nothing to delete
+    delete_artifacts(str(tmp_path), "s2", "b1")
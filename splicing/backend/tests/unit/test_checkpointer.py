@@ -0,0 +1,403 @@
+import pytest
+import pytest_asyncio
+from fakeredis import aioredis
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.base import empty_checkpoint
+
+from app.utils.agent import checkpointer
+from app.utils.agent.checkpointer import AsyncRedisSaver
+from app.utils.agent.serde import get_serializer
+
+THREAD_ID = "test_project"
+
+
+@pytest_asyncio.fixture(scope="function")
+async def saver():
+    fake_redis = aioredis.FakeRedis()
+    yield AsyncRedisSaver(fake_redis)
+    await fake_redis.flushall()
+
+
+def make_config(checkpoint_id: str | None = None) -> dict:
+    config = {"configurable": {"thread_id": THREAD_ID, "checkpoint_ns": ""}}
+    if checkpoint_id:
+        config["configurable"]["checkpoint_id"] = checkpoint_id
+    return config
+
+
+async def put_checkpoints(saver: AsyncRedisSaver, num: int) -> list[str]:
+    checkpoint_ids = []
+    config = make_config()
+    for step in range(num):
+        checkpoint = empty_checkpoint()
+        config = await saver.aput(config, checkpoint, {"step": step}, {})
+        checkpoint_ids.append(checkpoint["id"])
+    return checkpoint_ids
+
+
+@pytest.mark.asyncio
+async def test_get_latest_checkpoint_with_writes(saver):
+    checkpoint_ids = await put_checkpoints(saver, 3)
+    await saver.aput_writes(
+        make_config(checkpoint_ids[-1]), [("messages", "a"), ("next", "b")], "task"
+    )
+
+    checkpoint_tuple = await saver.aget_tuple(make_config())
+
+    assert checkpoint_tuple.config["configurable"]["checkpoint_id"] == (
+        checkpoint_ids[-1]
+    )
+    assert checkpoint_tuple.parent_config["configurable"]["checkpoint_id"] == (
+        checkpoint_ids[-2]
+    )
+    assert checkpoint_tuple.metadata == {"step": 2}
+    assert checkpoint_tuple.pending_writes == [
+        ("task", "messages", "a"),
+        ("task", "next", "b"),
+    ]
+    checkpoint_tuple = await saver.aget_tuple(make_config(checkpoint_ids[0]))
+    assert checkpoint_tuple.metadata == {"step": 0}
+    assert checkpoint_tuple.pending_writes == []
+    assert await saver.aget_tuple({"configurable": {"thread_id": "other"}}) is None
+
+
+@pytest.mark.asyncio
+async def test_latest_checkpoint_saved_out_of_order(saver):
+    older, newer = empty_checkpoint(), empty_checkpoint()
+    assert older["id"] < newer["id"]
+    # concurrent saves of a thread finish in any order
+    await saver.aput(make_config(), newer, {"step": 1}, {})
+    await saver.aput(make_config(), older, {"step": 0}, {})
+
+    checkpoint_tuple = await saver.aget_tuple(make_config())
+    assert checkpoint_tuple.config["configurable"]["checkpoint_id"] == newer["id"]
+
+
+@pytest.mark.asyncio
+async def test_get_checkpoint_with_writes_of_many_tasks(saver):
+    checkpoint_ids = await put_checkpoints(saver, 1)
+    config = make_config(checkpoint_ids[0])
+    await saver.aput_writes(config, [("next", "b")], "task2")
+    await saver.aput_writes(config, [("messages", "a"), ("next", "c")], "task1")
+
+    checkpoint_tuple = await saver.aget_tuple(make_config())
+
+    assert checkpoint_tuple.pending_writes == [
+        ("task1", "messages", "a"),
+        ("task1", "next", "c"),
+        ("task2", "next", "b"),
+    ]
+    assert await saver.conn.keys("writes:*") == [
+        f"writes:{THREAD_ID}::{checkpoint_ids[0]}".encode()
+    ]
+
+
+@pytest.mark.asyncio
+async def test_list_checkpoints(saver):
+    checkpoint_ids = await put_checkpoints(saver, 5)
+
+    result = [t.metadata["step"] async for t in saver.alist(make_config())]
+    assert result == [4, 3, 2, 1, 0]
+    result = [
+        t.metadata["step"]
+        async for t in saver.alist(
+            make_config(), before=make_config(checkpoint_ids[3]), limit=2
+        )
+    ]
+    assert result == [2, 1]
+
+
+@pytest.mark.asyncio
+async def test_delete_checkpoints(saver):
+    checkpoint_ids = await put_checkpoints(saver, 2)
+    await saver.aput_writes(make_config(checkpoint_ids[-1]), [("a", 1)], "task")
+    other_saver_config = {"configurable": {"thread_id": "other", "checkpoint_ns": ""}}
+    await saver.aput(other_saver_config, empty_checkpoint(), {}, {})
+
+    await saver.adelete_checkpoint(THREAD_ID)
+
+    assert await saver.aget_tuple(make_config()) is None
+    assert all(THREAD_ID not in key.decode() for key in await saver.conn.keys())
+    assert await saver.aget_tuple({"configurable": {"thread_id": "other"}})
+    assert await saver.alist_threads() == ["other"]
+
+
+@pytest.mark.asyncio
+async def test_index_threads_and_writes(saver):
+    checkpoint_ids = await put_checkpoints(saver, 2)
+    await saver.aput_writes(make_config(checkpoint_ids[0]), [("a", 1)], "task")
+    # threads and writes saved before they were indexed
+    await saver.conn.delete("checkpoint_threads", f"checkpoint_writes:{THREAD_ID}")
+    assert await saver.alist_threads() == []
+
+    await saver.aindex_threads_and_writes()
+
+    assert await saver.alist_threads() == [THREAD_ID]
+    await saver.aprune(THREAD_ID, 1)
+    assert await saver.conn.keys("writes:*") == []
+
+
+@pytest.mark.asyncio
+async def test_index_checkpoints(saver):
+    checkpoint_ids = await put_checkpoints(saver, 3)
+    await saver.aput_writes(make_config(checkpoint_ids[-1]), [("a", 1)], "task")
+    # checkpoints saved before they were indexed
+    for key in await saver.conn.keys("checkpoint_*"):
+        await saver.conn.delete(key)
+
+    await saver.aindex_checkpoints()
+
+    checkpoint_tuple = await saver.aget_tuple(make_config())
+    assert checkpoint_tuple.metadata == {"step": 2}
+    assert checkpoint_tuple.pending_writes == [("task", "a", 1)]
+    assert [t.metadata["step"] async for t in saver.alist(make_config())] == [2, 1, 0]
+
+
+@pytest.mark.asyncio
+async def test_merge_writes(saver):
+    checkpoint_ids = await put_checkpoints(saver, 1)
+    # writes saved as one hash per write, with an index of them
+    legacy_keys = []
+    for idx, (channel, value) in enumerate([("messages", "a"), ("next", "b")]):
+        type_, serialized_value = saver.serde.dumps_typed(value)
+        key = f"writes:{THREAD_ID}::{checkpoint_ids[0]}:task:{idx}"
+        await saver.conn.hset(
+            key, mapping={"channel": channel, "type": type_, "value": serialized_value}
+        )
+        legacy_keys.append(key)
+    await saver.conn.sadd(
+        f"writes_index:{THREAD_ID}::{checkpoint_ids[0]}", *legacy_keys
+    )
+
+    await saver.amerge_writes()
+
+    checkpoint_tuple = await saver.aget_tuple(make_config())
+    assert checkpoint_tuple.pending_writes == [
+        ("task", "messages", "a"),
+        ("task", "next", "b"),
+    ]
+    assert await saver.conn.keys("writes*") == [
+        f"writes:{THREAD_ID}::{checkpoint_ids[0]}".encode()
+    ]
+
+
+@pytest.mark.asyncio
+async def test_prune_checkpoints(saver):
+    checkpoint_ids = await put_checkpoints(saver, 5)
+    for checkpoint_id in checkpoint_ids:
+        await saver.aput_writes(make_config(checkpoint_id), [("a", 1)], "task")
+    # writes of a checkpoint deleted without them
+    await saver.conn.delete(f"checkpoint:{THREAD_ID}::{checkpoint_ids[-1]}")
+
+    num_deleted = await saver.aprune(THREAD_ID, 2)
+
+    assert num_deleted == 7
+    assert [t.metadata["step"] async for t in saver.alist(make_config())] == [3]
+    assert await saver.conn.keys("writes:*") == [
+        f"writes:{THREAD_ID}::{checkpoint_ids[3]}".encode()
+    ]
+    assert await saver.conn.smembers(f"checkpoint_writes:{THREAD_ID}") == {
+        f"writes:{THREAD_ID}::{checkpoint_ids[3]}".encode()
+    }
+    with pytest.raises(ValueError):
+        await saver.aprune(THREAD_ID, 0)
+
+
+@pytest.mark.asyncio
+async def test_read_legacy_checkpoints(saver):
+    # checkpoints saved uncompressed, with metadata as JSON
+    legacy_saver = AsyncRedisSaver(saver.conn, serde=get_serializer("jsonplus"))
+    checkpoint = empty_checkpoint()
+    config = await legacy_saver.aput(make_config(), checkpoint, {"step": 0}, {})
+    await legacy_saver.aput_writes(config, [("a", 1)], "task")
+    await saver.conn.hset(
+        f"checkpoint:{THREAD_ID}::{checkpoint['id']}",
+        mapping={"metadata": legacy_saver.serde.dumps({"step": 0})},
+    )
+    await saver.conn.hdel(
+        f"checkpoint:{THREAD_ID}::{checkpoint['id']}", "metadata_type"
+    )
+
+    checkpoint_tuple = await saver.aget_tuple(make_config())
+
+    assert checkpoint_tuple.checkpoint["id"] == checkpoint["id"]
+    assert checkpoint_tuple.metadata == {"step": 0}
+    assert checkpoint_tuple.pending_writes == [("task", "a", 1)]
+
+
+async def put_messages(
+    saver: AsyncRedisSaver, all_messages: list[list], config: dict | None = None
+) -> dict:
+    config = config or make_config()
+    for step, messages in enumerate(all_messages):
+        checkpoint = empty_checkpoint()
+        checkpoint["channel_values"] = {"messages": messages, "other": step}
+        config = await saver.aput(config, checkpoint, {"step": step}, {})
+    return config
+
+
+@pytest.mark.asyncio
+async def test_messages_are_stored_once(saver, monkeypatch):
+    messages = [HumanMessage(content="Hi", id="1"), AIMessage(content="Hey", id="2")]
+    config = await put_messages(saver, [messages[:1]])
+    dumped_messages = []
+    dump_messages = checkpointer._dump_messages
+    monkeypatch.setattr(
+        checkpointer,
+        "_dump_messages",
+        lambda serde, messages, digests: dumped_messages.extend(messages)
+        or dump_messages(serde, messages, digests),
+    )
+    config = await put_messages(saver, [messages], config)
+    assert dumped_messages == messages[1:]
+    # replaced with a message of the same id
+    messages[1] = AIMessage(content="Hello", id="2")
+    config = await put_messages(saver, [messages], config)
+    assert dumped_messages == [AIMessage(content="Hey", id="2"), messages[1]]
+
+    checkpoint_tuple = await saver.aget_tuple(make_config())
+    assert checkpoint_tuple.checkpoint["channel_values"] == {
+        "messages": messages,
+        "other": 0,
+    }
+    # older checkpoints read the version they were saved with
+    assert [
+        t.checkpoint["channel_values"]["messages"] async for t in saver.alist(config)
+    ] == [
+        messages,
+        [messages[0], AIMessage(content="Hey", id="2")],
+        messages[:1],
+    ]
+    parent_config = (await saver.aget_tuple(make_config())).parent_config
+    assert await saver.aget_messages(parent_config, offset=1) == [
+        AIMessage(content="Hey", id="2")
+    ]
+    assert await saver.aget_messages(make_config(), offset=1) == messages[1:]
+    assert await saver.aget_messages(make_config(), limit=1) == messages[:1]
+
+
+@pytest.mark.asyncio
+async def test_prune_messages(saver):
+    messages = [HumanMessage(content=str(i), id=str(i)) for i in range(3)]
+    await put_messages(saver, [messages[:1], messages[1:2], messages[1:]])
+
+    assert await saver.aprune(THREAD_ID, 2) == 2
+
+    assert sorted(
+        field.decode().split(":")[0]
+        for field in await saver.conn.hkeys(f"checkpoint_messages:{THREAD_ID}")
+    ) == ["1", "1", "2", "2"]
+    assert await saver.aget_messages(make_config()) == messages[1:]
+
+
+@pytest.mark.asyncio
+async def test_version_messages(saver):
+    messages = [HumanMessage(content="Hi", id="1"), AIMessage(content="Hey", id="2")]
+    await put_messages(saver, [messages])
+    # saved by their id alone
+    messages_key = f"checkpoint_messages:{THREAD_ID}"
+    fields = await saver.conn.hgetall(messages_key)
+    await saver.conn.delete(messages_key)
+    await saver.conn.hset(
+        messages_key,
+        mapping={
+            b":".join([field.split(b":")[0], field.split(b":")[2]]): value
+            for field, value in fields.items()
+        },
+    )
+    assert await saver.aget_messages(make_config()) == []
+
+    await saver.aversion_messages()
+
+    assert await saver.conn.hgetall(messages_key) == fields
+    assert await saver.aget_messages(make_config()) == messages
+
+
+async def put_checkpoints_with_metadata(saver: AsyncRedisSaver) -> list[str]:
+    checkpoint_ids = []
+    config = make_config()
+    all_metadata = [
+        {"source": "input", "step": -1, "writes": None},
+        {"source": "loop", "step": 0, "writes": None},
+        {"source": "update", "step": 1, "writes": {"chatbot": {"messages": ["a"]}}},
+        {"source": "loop", "step": 2, "writes": {"tools": {"messages": ["b"]}}},
+        {"source": "loop", "step": 3, "writes": {"chatbot": {"messages": ["c"]}}},
+    ]
+    for metadata in all_metadata:
+        checkpoint = empty_checkpoint()
+        config = await saver.aput(config, checkpoint, metadata, {})
+        checkpoint_ids.append(checkpoint["id"])
+    return checkpoint_ids
+
+
+async def list_steps(saver: AsyncRedisSaver, **kwargs) -> list[int]:
+    return [t.metadata["step"] async for t in saver.alist(make_config(), **kwargs)]
+
+
+@pytest.mark.asyncio
+async def test_list_checkpoints_with_filter(saver):
+    checkpoint_ids = await put_checkpoints_with_metadata(saver)
+
+    assert await list_steps(saver, filter={"source": "loop"}) == [3, 2, 0]
+    assert await list_steps(saver, filter={"source": "loop"}, limit=2) == [3, 2]
+    assert await list_steps(
+        saver, filter={"source": "loop"}, before=make_config(checkpoint_ids[3])
+    ) == [0]
+    assert await list_steps(saver, filter={"source": "loop", "step": 2}) == [2]
+    assert await list_steps(saver, filter={"source": "input", "step": 2}) == []
+    assert await list_steps(
+        saver, filter={"writes": {"chatbot": {"messages": ["a"]}}}
+    ) == [1]
+    assert await list_steps(saver, filter={"writes": None}) == [0, -1]
+    assert await list_steps(saver, filter={"other": "value"}) == []
+    assert await list_steps(saver, filter={}, limit=1) == [3]
+
+
+@pytest.mark.asyncio
+async def test_prune_and_index_metadata(saver):
+    checkpoint_ids = await put_checkpoints_with_metadata(saver)
+
+    await saver.aprune(THREAD_ID, 2)
+    assert await list_steps(saver, filter={"source": "loop"}) == [3, 2]
+    index_key = f"checkpoint_metadata:{THREAD_ID}::source"
+    assert await saver.conn.zrange(index_key, 0, -1) == [
+        f'"loop":{checkpoint_id}'.encode() for checkpoint_id in checkpoint_ids[3:]
+    ]
+
+    # checkpoints saved before their metadata was indexed
+    for key in await saver.conn.keys("checkpoint_metadata:*"):
+        await saver.conn.delete(key)
+    await saver.aindex_metadata()
+    assert await list_steps(saver, filter={"source": "loop", "step": 3}) == [3]
+
+
+@pytest.mark.asyncio
+async def test_chat_history(saver):
+    messages = [
+        HumanMessage(content="Context", name="hidden", id="1"),
+        HumanMessage(content="Hi", id="2"),
+        AIMessage(
+            content="", id="3", tool_calls=[{"name": "a", "args": {}, "id": "c"}]
+        ),
+        ToolMessage(content="Done", tool_call_id="c", id="4"),
+    ]
+    config = await put_messages(saver, [messages[:2]])
+    old_checkpoint = empty_checkpoint()
+    await put_messages(saver, [messages])
+    expected = [
+        {"role": "user", "content": "Context", "hidden": True},
+        {"role": "user", "content": "Hi"},
+        {"role": "assistant", "content": ""},
+    ]
+    assert await saver.aget_chat_history(THREAD_ID) == expected
+
+    # saved before chat histories were kept
+    await saver.conn.delete(f"chat_history:{THREAD_ID}")
+    assert await saver.aget_chat_history(THREAD_ID) == expected
+    assert await saver.conn.exists(f"chat_history:{THREAD_ID}")
+    assert await saver.aget_chat_history("other") == []
+
+    # saved late by another worker
+    old_checkpoint["channel_values"] = {"messages": messages[:1]}
+    await saver.aput(config, old_checkpoint, {}, {})
+    assert await saver.aget_chat_history(THREAD_ID) == expected
@@ -0,0 +1,30 @@
+import pytest
+
+from app.generated.schema import SectionType
+from app.utils.codec import get_codec
+
+
+@pytest.mark.parametrize("name", ["json", "orjson"])
+def test_codec_round_trip(name):
+    codec = get_codec(name)
+    value = {"sectionType": SectionType.CLEANING, "ids": ["a", "b"], "numRows": 10}
+
+    assert codec.loads(codec.dumps(value)) == {
+        "sectionType": "Cleaning",
+        "ids": ["a", "b"],
+        "numRows": 10,
+    }
+
+
+def test_codecs_read_each_other():
+    json_codec, orjson_codec = get_codec("json"), get_codec("orjson")
+    value = {"title": "Café", "nested": {"1": [1.5, None, True]}}
+
+    assert orjson_codec.loads(json_codec.dumps(value)) == value
+    assert json_codec.loads(orjson_codec.dumps(value)) == value
+    assert orjson_codec.loads(orjson_codec.dumps({1: "a"})) == {"1": "a"}
+
+
+def test_unsupported_codec():
+    with pytest.raises(ValueError):
+        get_codec("pickle")
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+from fakeredis import aioredis
+from langgraph.checkpoint.base import empty_checkpoint
+
+from app.utils.agent.compactor import COMPACTION_LOCK_KEY, CheckpointCompactor
+
+
+@pytest_asyncio.fixture(scope="function")
+async def fake_redis():
+    fake_redis = aioredis.FakeRedis()
+    yield fake_redis
+    await fake_redis.flushall()
+
+
+@pytest.mark.asyncio
+async def test_compact(fake_redis, monkeypatch):
+    compactor = CheckpointCompactor(fake_redis, keep=2, interval=60)
+    for thread_id, num in [("project1", 3), ("project2", 1)]:
+        config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+        for _ in range(num):
+            config = await compactor.saver.aput(config, empty_checkpoint(), {}, {})
+
+    # fakeredis doesn't support MEMORY USAGE
+    async def get_memory_usage(thread_id: str) -> dict:
+        num_checkpoints = await fake_redis.zcard(f"checkpoint_index:{thread_id}:")
+        return {"numCheckpoints": num_checkpoints, "memoryBytes": 100}
+
+    monkeypatch.setattr(compactor.saver, "aget_memory_usage", get_memory_usage)
+    await compactor.compact()
+
+    # any worker reads the stats of the compaction
+    other_compactor = CheckpointCompactor(fake_redis, keep=2, interval=60)
+    assert await other_compactor.get_stats() == {
+        "runs": 1,
+        "deletedKeys": 1,
+        "memoryBytes": 200,
+        "projects": {
+            "project1": {"numCheckpoints": 2, "memoryBytes": 100},
+            "project2": {"numCheckpoints": 1, "memoryBytes": 100},
+        },
+    }
+
+
+@pytest.mark.asyncio
+async def test_run_in_one_worker(fake_redis):
+    compactors = [
+        CheckpointCompactor(fake_redis, keep=2, interval=0.05) for _ in range(3)
+    ]
+    tasks = [asyncio.create_task(compactor.run()) for compactor in compactors]
+    await asyncio.sleep(0.12)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    # one compaction per interval among all workers
+    assert 1 <= (await compactors[0].get_stats())["runs"] <= 2
+
+
+@pytest.mark.asyncio
+async def test_compact_stops_without_lock(fake_redis):
+    compactor = CheckpointCompactor(fake_redis, keep=1, interval=60)
+    config = {"configurable": {"thread_id": "project1", "checkpoint_ns": ""}}
+    for _ in range(3):
+        config = await compactor.saver.aput(config, empty_checkpoint(), {}, {})
+    # the lock expired, and another worker took it
+    await fake_redis.set(COMPACTION_LOCK_KEY, "other")
+
+    await compactor.compact("token")
+
+    assert await fake_redis.zcard("checkpoint_index:project1:") == 3
+    assert (await compactor.get_stats())["runs"] == 0
@@ -0,0 +1,100 @@
+import pytest
+from fakeredis import aioredis
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from app.utils.agent.context import ContextManager, count_tokens, find_cutoff
+from app.utils.agent.graph import create_graph
+
+# about 100 tokens
+TEXT = "word " * 80
+
+
+def create_turns(num_turns: int) -> list:
+    messages = []
+    for i in range(num_turns):
+        messages.append(HumanMessage(content=f"{i} {TEXT}"))
+        messages.append(AIMessage(content=f"{i} {TEXT}"))
+    return messages
+
+
+def test_find_cutoff():
+    messages = [
+        HumanMessage(content=TEXT),
+        AIMessage(content="", tool_calls=[{"name": "tool", "args": {}, "id": "1"}]),
+        ToolMessage(content=TEXT, tool_call_id="1"),
+        AIMessage(content=TEXT),
+        HumanMessage(content=TEXT),
+        AIMessage(content=TEXT),
+    ]
+    # turns start with a user message, tool results stay with their calls
+    assert find_cutoff(messages, 250) == 4
+    assert find_cutoff(messages, 1000) == 0
+    # the last turn is kept even if it's over the limit
+    assert find_cutoff(messages, 10) == 4
+
+
+@pytest.mark.asyncio
+async def test_trim():
+    manager = ContextManager(token_budget=1000, recent_tokens=500)
+    llm = FakeListChatModel(responses=["first summary", "second summary"])
+    system_message = SystemMessage(content="You are an assistant")
+    messages = [system_message, *create_turns(4)]
+
+    # within the budget
+    trimmed, update = await manager.atrim(llm, {"messages": messages})
+    assert trimmed == messages
+    assert update == {}
+
+    messages += create_turns(6)
+    trimmed, update = await manager.atrim(llm, {"messages": messages})
+    assert update["summary"] == "first summary"
+    assert trimmed[0] == system_message
+    assert "first summary" in trimmed[1].content
+    num_summarized = update["num_summarized"]
+    assert trimmed[2:] == messages[num_summarized:]
+    assert count_tokens(trimmed) <= 1000
+
+    # the saved summary is reused until the conversation is over the budget again
+    state = {"messages": messages, **update}
+    assert await manager.atrim(llm, state) == (trimmed, {})
+    state["messages"] = messages + create_turns(6)
+    trimmed, update = await manager.atrim(llm, state)
+    assert update["summary"] == "second summary"
+    assert update["num_summarized"] > state["num_summarized"]
+
+    stats = manager.get_stats()
+    assert stats["calls"] == 4
+    assert stats["summaries"] == 2
+    assert stats["savedTokens"] > 0
+
+
+@pytest.mark.asyncio
+async def test_trim_disabled():
+    manager = ContextManager(token_budget=0, recent_tokens=0)
+    messages = create_turns(20)
+    assert await manager.atrim(
+        FakeListChatModel(responses=[]), {"messages": messages}
+    ) == (
+        messages,
+        {},
+    )
+
+
+@pytest.mark.asyncio
+async def test_summary_saved_in_state(monkeypatch):
+    manager = ContextManager(token_budget=1000, recent_tokens=500)
+    monkeypatch.setattr("app.utils.agent.graph.context_manager", manager)
+    llm = FakeListChatModel(responses=["summary", "Hello"])
+    graph = create_graph(aioredis.FakeRedis(), llm)
+    config = {"configurable": {"thread_id": "test_project"}}
+    await graph.aupdate_state(config, {"messages": create_turns(10)}, as_node="chatbot")
+
+    await graph.ainvoke({"messages": [HumanMessage(content="Hi")]}, config)
+
+    snapshot = await graph.aget_state(config)
+    assert snapshot.values["summary"] == "summary"
+    assert snapshot.values["num_summarized"] > 0
+    assert snapshot.values["messages"][-1].content == "Hello"
+    # all messages are kept in the state
+    assert len(snapshot.values["messages"]) == 22
@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+
+import pytest
+
+from app.utils.duckdb_pool import DuckDBPool
+
+duckdb = pytest.importorskip("duckdb")
+
+
+@pytest.fixture
+def database_path(tmp_path):
+    path = str(tmp_path / "test.duckdb")
+    with duckdb.connect(path) as conn:
+        conn.execute("CREATE TABLE orders AS SELECT range AS id FROM range(3)")
+    return path
+
+
+def count(pool: DuckDBPool, database_path: str, table_name: str) -> int:
+    with pool.cursor(database_path) as cursor:
+        return cursor.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+
+
+def test_cursor_reused(database_path):
+    pool = DuckDBPool(max_cursors=2, max_idle=60, lock_timeout=1)
+    assert count(pool, database_path, "orders") == 3
+    assert count(pool, database_path, "orders") == 3
+    # cursors in use at once are all kept, up to max_cursors
+    with pool.cursor(database_path), pool.cursor(database_path):
+        with pool.cursor(database_path):
+            pass
+    stats = pool.get_stats()
+    assert stats["connections"] == 1
+    assert stats["connectionsOpened"] == 1
+    assert stats["cursorsReused"] == 2
+
+
+def test_writing(database_path):
+    pool = DuckDBPool(max_cursors=2, max_idle=60, lock_timeout=1)
+    assert count(pool, database_path, "orders") == 3
+    # read-write connections can't be opened next to the pooled one
+    with pytest.raises(duckdb.ConnectionException):
+        duckdb.connect(database_path)
+    with pool.writing(database_path):
+        with duckdb.connect(database_path) as conn:
+            conn.execute("CREATE TABLE customers AS SELECT 1 AS id")
+    assert count(pool, database_path, "customers") == 1
+    assert pool.get_stats()["connectionsOpened"] == 2
+
+
+def test_writing_waits_for_reads(database_path):
+    pool = DuckDBPool(max_cursors=2, max_idle=60, lock_timeout=5)
+    reading, read = threading.Event(), threading.Event()
+
+    def read_orders():
+        with pool.cursor(database_path) as cursor:
+            reading.set()
+            time.sleep(0.2)
+            cursor.execute("SELECT COUNT(*) FROM orders").fetchone()
+            read.set()
+
+    thread = threading.Thread(target=read_orders)
+    thread.start()
+    reading.wait()
+    # the running read isn't interrupted, its connection is closed after it
+    with pool.writing(database_path):
+        assert read.is_set()
+        duckdb.connect(database_path).close()
+    thread.join()
+
+
+def test_writing_other_database(database_path, tmp_path):
+    pool = DuckDBPool(max_cursors=2, max_idle=60, lock_timeout=0.1)
+    other_path = str(tmp_path / "other.duckdb")
+    duckdb.connect(other_path).close()
+    with pool.writing(other_path):
+        assert count(pool, database_path, "orders") == 3
+        # reads of the written database wait for the write
+        with pytest.raises(TimeoutError):
+            count(pool, other_path, "orders")
+
+
+def test_connect_outside_lock(database_path, tmp_path, monkeypatch):
+    pool = DuckDBPool(max_cursors=2, max_idle=60, lock_timeout=5)
+    other_path = str(tmp_path / "other.duckdb")
+    with duckdb.connect(other_path) as conn:
+        conn.execute("CREATE TABLE orders AS SELECT 1 AS id")
+    connecting, locked = threading.Event(), threading.Event()
+    connect = pool._connect
+
+    def wait_for_lock(path):
+        # another process writes this database for a while
+        if path == os.path.realpath(database_path):
+            connecting.set()
+            locked.wait(5)
+        return connect(path)
+
+    monkeypatch.setattr(pool, "_connect", wait_for_lock)
+    thread = threading.Thread(target=count, args=(pool, database_path, "orders"))
+    thread.start()
+    connecting.wait()
+    # reads of other databases don't wait meanwhile
+    assert count(pool, other_path, "orders") == 1
+    assert thread.is_alive()
+    locked.set()
+    thread.join()
+    assert pool.get_stats()["connections"] == 2
+
+
+def test_file_replaced(database_path, tmp_path):
+    pool = DuckDBPool(max_cursors=2, max_idle=60, lock_timeout=1)
+    assert count(pool, database_path, "orders") == 3
+    # replaced by another process while the connection was open
+    other_path = str(tmp_path / "other.duckdb")
+    with duckdb.connect(other_path) as conn:
+        conn.execute("CREATE TABLE orders AS SELECT 1 AS id")
+    os.replace(other_path, database_path)
+    assert count(pool, database_path, "orders") == 1
+    assert pool.get_stats()["connectionsOpened"] == 2
+
+
+def test_fallback_when_open_for_writing(database_path):
+    pool = DuckDBPool(max_cursors=2, max_idle=60, lock_timeout=1)
+    with duckdb.connect(database_path):
+        assert count(pool, database_path, "orders") == 3
+    assert pool.get_stats()["fallbacks"] == 1
+    assert pool.get_stats()["connections"] == 0
+
+
+def test_close_idle(database_path):
+    pool = DuckDBPool(max_cursors=2, max_idle=0, lock_timeout=1)
+    assert count(pool, database_path, "orders") == 3
+    pool.close_idle()
+    assert pool.get_stats()["connections"] == 0
+    # other processes can write the file again
+    duckdb.connect(database_path).close()
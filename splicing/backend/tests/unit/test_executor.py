@@ -0,0 +1,94 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from app.utils.executor import (
+    code_executor,
+    io_executor,
+    run_in_executor,
+    shutdown_code_process,
+    start_code_process,
+)
+
+# a long-running user block, reading a file relative to the project directory
+CODE = """
+def read_after(seconds):
+    import time
+
+    time.sleep(seconds)
+    with open("input.txt") as f:
+        return f.read()
+"""
+
+
+async def monitor_lag(interval: float, stop: asyncio.Event) -> float:
+    max_lag = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        max_lag = max(max_lag, time.perf_counter() - start - interval)
+    return max_lag
+
+
+@pytest.fixture(scope="module")
+def code_process():
+    # started as on startup, shared by the tests
+    start_code_process("app.utils.execute")
+    yield
+    shutdown_code_process()
+
+
+@pytest.mark.asyncio
+async def test_execute_python_does_not_block_event_loop(tmp_path, code_process):
+    # imported here, project_helper is imported with mocked settings by its tests
+    from app.utils.execute import execute_python
+
+    (tmp_path / "input.txt").write_text("done")
+    cwd = os.getcwd()
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_lag(0.01, stop))
+    result, exception = await run_in_executor(
+        code_executor,
+        execute_python,
+        code=CODE,
+        function_name="read_after",
+        function_args={"seconds": 0.5},
+        working_dir=str(tmp_path),
+        files_to_copy=[],
+    )
+    stop.set()
+    assert (result, exception) == ("done", None)
+    # the event loop kept serving while the block ran
+    assert await monitor < 0.1
+    # the block ran in the project directory, the working directory of the app is kept
+    assert os.getcwd() == cwd
+
+
+@pytest.mark.asyncio
+async def test_execute_python_exception(tmp_path, code_process):
+    from app.utils.execute import execute_python
+
+    result, exception = await run_in_executor(
+        code_executor,
+        execute_python,
+        code=CODE,
+        function_name="read_after",
+        function_args={"seconds": 0},
+        working_dir=str(tmp_path),
+        files_to_copy=[],
+    )
+    assert result is None
+    assert isinstance(exception, FileNotFoundError)
+    # with the traceback of the user code
+    assert "read_after" in str(exception.__cause__)
+
+
+@pytest.mark.asyncio
+async def test_io_executor_does_not_block_event_loop():
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_lag(0.01, stop))
+    assert await run_in_executor(io_executor, time.sleep, 0.5) is None
+    stop.set()
+    assert await monitor < 0.1
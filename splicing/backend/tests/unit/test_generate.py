@@ -0,0 +1,83 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.generated.schema import SectionType
+from app.utils.generate import generate_cache, generate_with_llm
+
+RESPONSE = {
+    "functionName": "drop_missing_values",
+    "functionArgs": '{"df": null}',
+    "returnValue": "pandas DataFrame containing the cleaned data",
+    "code": "def drop_missing_values(df=None):\n    return df.dropna()",
+    "packages": ["pandas"],
+}
+
+
+def create_llm() -> MagicMock:
+    async def astream(messages):
+        yield {"functionName": RESPONSE["functionName"]}
+        yield RESPONSE
+
+    llm = MagicMock()
+    llm.model_name = "test_model"
+    llm.with_structured_output.return_value.astream = MagicMock(side_effect=astream)
+    return llm
+
+
+async def generate(llm: MagicMock, **kwargs):
+    return await generate_with_llm(
+        llm=llm,
+        section_type=SectionType.CLEANING,
+        integration_settings={},
+        **{
+            "source": "DuckDB",
+            "sourceDetails": "",
+            "tool": "Pandas",
+            "data_dict": {},
+            **kwargs,
+        },
+    )
+
+
+@pytest.fixture
+def enable_generate_cache():
+    generate_cache.clear()
+    with patch("app.utils.generate.settings.GENERATE_CACHE_ENABLED", True):
+        yield
+    generate_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_generate_with_llm_cache(enable_generate_cache):
+    llm = create_llm()
+    astream = llm.with_structured_output.return_value.astream
+    result = await generate(llm, context="user: clean data")
+    assert result.code == RESPONSE["code"]
+    assert await generate(llm, context="user: clean data") == result
+    assert astream.call_count == 1
+
+    # the conversation isn't part of the key, only the block setup
+    assert await generate(llm, context="user: clean data\nuser: thanks") == result
+    assert astream.call_count == 1
+
+    # another block setup, or bypassing the cache, call the LLM
+    await generate(llm, context="user: clean data", sourceDetails="orders table")
+    await generate(llm, context="user: clean data", use_cache=False)
+    assert astream.call_count == 3
+
+    # cached results are streamed to the agent as a single event
+    with patch(
+        "app.utils.generate.adispatch_custom_event", new_callable=AsyncMock
+    ) as mock_dispatch:
+        await generate(llm, context="user: clean data", called_from_agent=True)
+        mock_dispatch.assert_called_once_with("generate-result", RESPONSE)
+    assert astream.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_generate_with_llm_cache_disabled():
+    llm = create_llm()
+    await generate(llm, context="user: clean data")
+    await generate(llm, context="user: clean data")
+    assert llm.with_structured_output.return_value.astream.call_count == 2
@@ -1,3 +1,5 @@
+import base64
+
 import pandas as pd
 import pytest
 from langchain_anthropic import ChatAnthropic
@@ -8,6 +10,7 @@ from app.generated.schema import LLMType
 from app.utils.helper import (
     convert_message_to_dict,
     deserialize_df,
+    evict_llms,
     format_exception_message,
     generate_id,
     get_llm,
@@ -30,6 +33,18 @@ def test_serialize_deserialize_df():
     pd.testing.assert_frame_equal(df, deserialized)
 
 
+@pytest.mark.parametrize("compression", ["zstd", "lz4", "none"])
+def test_serialize_df_compression(compression):
+    df = pd.DataFrame({"A": range(100), "B": ["a"] * 100})
+    pd.testing.assert_frame_equal(df, deserialize_df(serialize_df(df, compression)))
+
+
+def test_deserialize_legacy_base64_df():
+    df = pd.DataFrame({"A": [1, 2, 3]})
+    serialized = base64.b64encode(serialize_df(df)).decode("utf-8")
+    pd.testing.assert_frame_equal(df, deserialize_df(serialized))
+
+
 def test_get_schema():
     df = pd.DataFrame({"A": [1, 2, None], "B": ["a", "b", "c"]})
     schema = get_schema(df)
@@ -56,6 +71,22 @@ def test_get_llm(llm_type, expected_class):
         get_llm("INVALID_TYPE", {})
 
 
+def test_get_llm_reuses_clients():
+    llm_settings = {"apiKey": "test_api_key", "model": "test_model"}
+    llm = get_llm(LLMType.OPENAI, llm_settings)
+    assert get_llm(LLMType.OPENAI, dict(llm_settings)) is llm
+
+    other_key_llm = get_llm(LLMType.OPENAI, {**llm_settings, "apiKey": "other_key"})
+    assert other_key_llm is not llm
+    # every OpenAI chat model shares one connection pool
+    assert other_key_llm.http_async_client is llm.http_async_client
+
+    evict_llms(LLMType.ANTHROPIC)
+    assert get_llm(LLMType.OPENAI, llm_settings) is llm
+    evict_llms(LLMType.OPENAI)
+    assert get_llm(LLMType.OPENAI, llm_settings) is not llm
+
+
 def test_convert_message_to_dict():
     # Test basic message conversion
     human_msg = HumanMessage(content="Hello")
@@ -0,0 +1,59 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+from fakeredis import aioredis
+
+from app.utils.local_cache import (
+    CACHE_INVALIDATION_CHANNEL,
+    MISSING,
+    LocalCache,
+    listen_for_invalidations,
+)
+
+
+def test_local_cache_lru_and_ttl():
+    cache = LocalCache(max_size=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", None)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    # "b" is the least recently used
+    assert cache.get("b") is MISSING
+    assert cache.get("c") == 3
+
+    with patch("time.monotonic", return_value=time.monotonic() + 11):
+        assert cache.get("a") is MISSING
+
+    assert cache.get_stats() == {"size": 2, "hits": 2, "misses": 2, "hitRate": 0.5}
+
+
+def test_local_cache_skips_values_read_before_invalidation():
+    cache = LocalCache(max_size=2, ttl=10)
+    version = cache.version
+    cache.invalidate("a")
+    cache.set("a", "outdated", version)
+    assert cache.get("a") is MISSING
+    cache.set("a", "new", cache.version)
+    assert cache.get("a") == "new"
+
+
+@pytest.mark.asyncio
+async def test_listen_for_invalidations():
+    redis = aioredis.FakeRedis()
+    cache = LocalCache(max_size=10, ttl=10)
+    listener = asyncio.create_task(listen_for_invalidations(redis, cache))
+    await asyncio.sleep(0.1)
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    await redis.publish(CACHE_INVALIDATION_CHANNEL, "a")
+    for _ in range(50):
+        if cache.get("a") is MISSING:
+            break
+        await asyncio.sleep(0.01)
+
+    assert cache.get("a") is MISSING
+    assert cache.get("b") == 2
+    listener.cancel()
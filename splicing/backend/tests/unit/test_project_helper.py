@@ -7,6 +7,7 @@ from fakeredis import aioredis
 from langchain_core.messages import AIMessage, HumanMessage
 
 from app.generated.schema import LLMType, SectionType, TransformationTool
+from app.utils.agent.graph import clear_graph_cache
 from app.utils.helper import standardize_name
 from app.utils.redis_client import RedisClient
 
@@ -15,15 +16,22 @@ mock_settings = MagicMock()
 mock_settings.SOURCE_DIR = "/source"
 mock_settings.APP_NAME = "TestApp"
 mock_settings.REDIS_URL = "redis://fake"
+mock_settings.ARTIFACT_THRESHOLD_BYTES = 1024
+mock_settings.ARTIFACT_PREVIEW_ROWS = 10
+mock_settings.CHECKPOINT_SERIALIZER = "msgpack_zstd"
+mock_settings.CHECKPOINT_LEGACY_READ = True
 
 with patch("app.core.config.settings", mock_settings):
     from app.utils.project_helper import (
         add_chat_messages,
         build_dag,
         context_update,
+        delete_data_dict_in_block,
         get_app_dir,
         get_chat_history,
+        get_chat_messages,
         get_data_dict_in_block,
+        get_graph_for_project,
         get_llm_for_project,
         get_project_dir,
         set_data_dict_in_block,
@@ -74,12 +82,60 @@ async def test_get_llm_for_project(redis_client, setup_project_data):
         )
 
 
+@pytest.mark.asyncio
+async def test_get_graph_for_project(redis_client, setup_project_data):
+    project_id = setup_project_data
+    clear_graph_cache()
+    with patch(
+        "app.utils.agent.graph.create_graph", side_effect=lambda *args: MagicMock()
+    ) as mock_create_graph, patch(
+        "app.utils.agent.graph.settings.GRAPH_CACHE_MAX_SIZE", 2
+    ):
+        graph = await get_graph_for_project(redis_client, project_id)
+        assert await get_graph_for_project(redis_client, project_id) is graph
+        section_graph = await get_graph_for_project(
+            redis_client, project_id, SectionType.CLEANING
+        )
+        assert section_graph is not graph
+        assert mock_create_graph.call_count == 2
+
+        # new settings compile a new graph, evicting the least recently used one
+        await redis_client.set_settings_data(
+            "LLM", LLMType.OPENAI.value, {"model": "gpt-4o-mini", "apiKey": "sk-123"}
+        )
+        assert await get_graph_for_project(redis_client, project_id) is not graph
+        assert mock_create_graph.call_count == 3
+
+        await redis_client.set_settings_data(
+            "LLM", LLMType.OPENAI.value, {"model": "gpt-4o", "apiKey": "sk-123"}
+        )
+        assert (
+            await get_graph_for_project(redis_client, project_id, SectionType.CLEANING)
+            is section_graph
+        )
+        assert await get_graph_for_project(redis_client, project_id) is not graph
+        assert mock_create_graph.call_count == 4
+
+        # shared by requests, which have a RedisClient each, only the connection is kept
+        other_redis_client = RedisClient(redis_client.redis)
+        assert (
+            await get_graph_for_project(
+                other_redis_client, project_id, SectionType.CLEANING
+            )
+            is section_graph
+        )
+        assert all(
+            call.args[0] is redis_client.redis
+            for call in mock_create_graph.call_args_list
+        )
+
+
 @pytest.mark.asyncio
 async def test_add_chat_messages(redis_client, setup_project_data):
     project_id = setup_project_data
-    with patch("app.utils.project_helper.create_graph") as mock_create_graph:
+    with patch("app.utils.project_helper.get_graph") as mock_get_graph:
         mock_graph = AsyncMock()
-        mock_create_graph.return_value = mock_graph
+        mock_get_graph.return_value = mock_graph
 
         messages = [AIMessage(content="Hello"), HumanMessage(content="World")]
         await add_chat_messages(redis_client, project_id, *messages)
@@ -94,15 +150,34 @@ async def test_add_chat_messages(redis_client, setup_project_data):
 @pytest.mark.asyncio
 async def test_get_chat_history(redis_client, setup_project_data):
     project_id = setup_project_data
-    with patch("app.utils.project_helper.create_graph") as mock_create_graph:
-        mock_graph = AsyncMock()
-        messages = [AIMessage(content="Hello"), HumanMessage(content="World")]
-        mock_graph.aget_state.return_value.values = {"messages": messages}
-        mock_create_graph.return_value = mock_graph
+    messages = [AIMessage(content="Hello"), HumanMessage(content="World")]
+    await add_chat_messages(redis_client, project_id, *messages)
+    await add_chat_messages(redis_client, project_id, AIMessage(content="!"))
+
+    history = await get_chat_history(redis_client, project_id)
+    assert [message.content for message in history] == ["Hello", "World", "!"]
+    history = await get_chat_history(redis_client, project_id, offset=1, limit=1)
+    assert [message.content for message in history] == ["World"]
+    assert await get_chat_history(redis_client, "other_project") == []
 
-        history = await get_chat_history(redis_client, project_id)
 
-        assert history == messages
+@pytest.mark.asyncio
+async def test_get_chat_messages(redis_client, setup_project_data):
+    project_id = setup_project_data
+    messages = [
+        HumanMessage(content="Context", name="hidden"),
+        HumanMessage(content="Hi"),
+        AIMessage(content="Hello"),
+    ]
+    await add_chat_messages(redis_client, project_id, *messages)
+
+    with patch("app.utils.project_helper.get_graph") as mock_get_graph:
+        assert await get_chat_messages(redis_client, project_id) == [
+            {"role": "user", "content": "Hi"},
+            {"role": "assistant", "content": "Hello"},
+        ]
+        assert len(await get_chat_messages(redis_client, project_id, True)) == 3
+        mock_get_graph.assert_not_called()
 
 
 @pytest.mark.asyncio
@@ -127,6 +202,58 @@ async def test_set_and_get_data_dict_in_block(redis_client, setup_project_data):
     assert all(result[k].equals(v) for k, v in data_dict.items())
 
 
+@pytest.mark.asyncio
+async def test_set_and_get_data_dict_in_block_with_artifacts(redis_client, tmp_path):
+    project_id, section_id, block_id = "test_project", "test_section", "test_block"
+    await redis_client.set_project_data(
+        project_id, "metadata", {"projectDir": str(tmp_path)}
+    )
+    data_dict = {
+        "large": pd.DataFrame({"A": range(1000)}),
+        "small": pd.DataFrame({"B": [1, 2, 3]}),
+    }
+
+    with patch("app.utils.artifact_store.settings", mock_settings):
+        await set_data_dict_in_block(
+            redis_client, project_id, section_id, block_id, data_dict
+        )
+        # Redis only keeps a preview of the large DataFrame
+        previews = await redis_client.get_block_dataframes(
+            project_id, section_id, block_id
+        )
+        assert len(previews["large"]) == 10
+        assert len(previews["small"]) == 3
+        artifacts = await redis_client.get_block_data(
+            project_id, section_id, block_id, "artifacts"
+        )
+        assert list(artifacts) == ["large"]
+        artifact_path = tmp_path / artifacts["large"]["path"]
+        assert artifact_path.exists()
+
+        result = await get_data_dict_in_block(
+            redis_client, project_id, section_id, block_id
+        )
+        assert all(result[k].equals(v) for k, v in data_dict.items())
+        result = await get_data_dict_in_block(
+            redis_client, project_id, section_id, block_id, head_only=True
+        )
+        assert len(result["large"]) == 10
+        assert len(result["small"]) == 3
+
+        # a new result replaces the files of the previous one
+        await set_data_dict_in_block(
+            redis_client, project_id, section_id, block_id, data_dict
+        )
+        assert not artifact_path.exists()
+
+        await delete_data_dict_in_block(redis_client, project_id, section_id, block_id)
+        assert (
+            await get_data_dict_in_block(redis_client, project_id, section_id, block_id)
+            == {}
+        )
+        assert not (tmp_path / ".artifacts" / section_id / block_id).exists()
+
+
 @pytest.mark.asyncio
 async def test_context_update():
     redis_client = AsyncMock()
@@ -0,0 +1,65 @@
+from langchain_anthropic import ChatAnthropic
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+from langchain_openai import ChatOpenAI
+
+from app.utils.prompt_cache import (
+    CACHE_CONTROL,
+    PromptCacheStats,
+    add_cache_breakpoints,
+)
+
+MESSAGES = [
+    SystemMessage(content="You are an assistant"),
+    HumanMessage(content="Hi"),
+    AIMessage(content="", tool_calls=[{"name": "tool", "args": {}, "id": "1"}]),
+    ToolMessage(content="Result", tool_call_id="1"),
+]
+
+
+def test_add_cache_breakpoints():
+    llm = ChatAnthropic(anthropic_api_key="test_api_key", model_name="test_model")
+    messages = add_cache_breakpoints(llm, MESSAGES)
+    assert messages[0].content == [
+        {"type": "text", "text": "You are an assistant", "cache_control": CACHE_CONTROL}
+    ]
+    assert messages[1:] == MESSAGES[1:]
+
+    # the latest user message, tool messages are never marked
+    messages = add_cache_breakpoints(llm, MESSAGES, conversation=True)
+    assert messages[1].content[-1]["cache_control"] == CACHE_CONTROL
+    assert messages[2:] == MESSAGES[2:]
+    # the original messages are kept as they are
+    assert MESSAGES[0].content == "You are an assistant"
+    assert MESSAGES[1].content == "Hi"
+
+
+def test_add_cache_breakpoints_openai():
+    # OpenAI caches prefixes automatically, messages must stay byte-stable
+    llm = ChatOpenAI(openai_api_key="test_api_key", model_name="test_model")
+    assert add_cache_breakpoints(llm, MESSAGES, conversation=True) == MESSAGES
+
+
+def test_prompt_cache_stats():
+    stats = PromptCacheStats()
+    message = AIMessage(
+        content="Hello",
+        usage_metadata={
+            "input_tokens": 1000,
+            "output_tokens": 10,
+            "total_tokens": 1010,
+            "input_token_details": {"cache_read": 800, "cache_creation": 100},
+        },
+    )
+    stats.on_llm_end(LLMResult(generations=[[ChatGeneration(message=message)]]))
+    # responses without usage aren't counted
+    stats.on_llm_end(
+        LLMResult(generations=[[ChatGeneration(message=AIMessage(content="Hi"))]])
+    )
+    assert stats.get_stats() == {
+        "calls": 1,
+        "inputTokens": 1000,
+        "cachedInputTokens": 800,
+        "uncachedInputTokens": 200,
+        "cacheCreationInputTokens": 100,
+    }
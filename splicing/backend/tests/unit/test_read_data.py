@@ -0,0 +1,92 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pandas as pd
+import pytest
+
+from app.utils.read_data import read_df_from_integration, table_cache
+
+SETTINGS = {"DuckDB": {"databaseFilePath": "/data/db.duckdb", "sensitiveFields": []}}
+
+
+def create_llm(table_name: str) -> MagicMock:
+    llm = MagicMock()
+    llm.bind_tools.return_value.ainvoke = AsyncMock()
+    llm.bind_tools.return_value.ainvoke.return_value.tool_calls = [
+        {"name": "read_df_from_duckdb", "args": {"table_name": table_name}}
+    ]
+    return llm
+
+
+async def read(
+    llm: MagicMock, source_details: str, integration_settings: dict = SETTINGS
+):
+    return await read_df_from_integration(
+        llm=llm,
+        source="DuckDB",
+        source_details=source_details,
+        generate_result=None,
+        integration_settings=integration_settings,
+    )
+
+
+@pytest.fixture(autouse=True)
+def clear_table_cache():
+    table_cache.clear()
+    # the tool is built from the function patched by the tests
+    with patch("app.utils.read_data.get_read_data_tool"):
+        yield
+    table_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_read_df_from_integration_cache():
+    llm = create_llm("main.orders")
+    invoke = llm.bind_tools.return_value.ainvoke
+    df = pd.DataFrame({"id": [1, 2]})
+    with patch("app.utils.read_data.read_df_from_duckdb", return_value=df) as mock_read:
+        assert list(await read(llm, "orders table")) == ["orders"]
+        assert list(await read(llm, "orders table")) == ["orders"]
+        assert invoke.call_count == 1
+        assert mock_read.call_count == 2
+
+        # a new block setup or new settings resolve the table again
+        await read(llm, "customers table")
+        new_settings = {"DuckDB": {**SETTINGS["DuckDB"], "schema": "sales"}}
+        await read(llm, "orders table", new_settings)
+        assert invoke.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_read_df_from_integration_cache_invalidated_on_error():
+    llm = create_llm("main.missing")
+    invoke = llm.bind_tools.return_value.ainvoke
+    with patch(
+        "app.utils.read_data.read_df_from_duckdb", side_effect=Exception("not found")
+    ):
+        assert await read(llm, "missing table") == {}
+        assert await read(llm, "missing table") == {}
+    assert invoke.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_read_df_from_integration_database_being_written():
+    llm = create_llm("main.orders")
+    invoke = llm.bind_tools.return_value.ainvoke
+    with patch(
+        "app.utils.read_data.read_df_from_duckdb", side_effect=TimeoutError("writing")
+    ):
+        assert await read(llm, "orders table") == {}
+        assert await read(llm, "orders table") == {}
+        # the table was right, it's not resolved again
+        assert invoke.call_count == 1
+        # nor does a dbt model fail the request
+        assert (
+            await read_df_from_integration(
+                llm=llm,
+                source="DuckDB",
+                source_details="",
+                generate_result={"modelName": "orders"},
+                integration_settings=SETTINGS,
+            )
+            == {}
+        )
@@ -0,0 +1,341 @@
+import asyncio
+import base64
+import json
+
+import pandas as pd
+import pytest
+import pytest_asyncio
+from fakeredis import aioredis
+
+from app.utils.helper import serialize_df
+from app.utils.local_cache import LocalCache
+from app.utils.redis_client import RedisClient
+
+
+@pytest_asyncio.fixture(scope="function")
+async def redis_client():
+    fake_redis = aioredis.FakeRedis()
+    client = RedisClient(fake_redis)
+    yield client
+    await fake_redis.flushall()
+
+
+@pytest.mark.asyncio
+async def test_get_project_snapshot(redis_client):
+    project_id = "test_project"
+    await redis_client.set_project_data(project_id, "metadata", {"title": "Test"})
+    await redis_client.set_project_data(project_id, "last_worked_section_id", "s2")
+    for section_id, block_ids in [("s1", ["b1", "b2"]), ("s2", [])]:
+        await redis_client.add_section_id(project_id, section_id)
+        await redis_client.set_section_data(
+            project_id, section_id, "metadata", {"title": section_id}
+        )
+        for block_id in block_ids:
+            await redis_client.add_block_id(project_id, section_id, block_id)
+            await redis_client.set_block_data(
+                project_id, section_id, block_id, "metadata", {"numRows": 10}
+            )
+    await redis_client.set_section_data(project_id, "s1", "current_block_id", "b2")
+    await redis_client.set_block_data(
+        project_id, "s1", "b2", "setup", {"source": "Python"}
+    )
+
+    snapshot = await redis_client.get_project_snapshot(project_id)
+
+    assert snapshot["metadata"]["title"] == "Test"
+    assert snapshot["last_worked_section_id"] == "s2"
+    assert [s["id"] for s in snapshot["sections"]] == ["s1", "s2"]
+    s1, s2 = snapshot["sections"]
+    assert s1["metadata"] == {"title": "s1"}
+    assert s1["current_block_id"] == "b2"
+    assert [b["id"] for b in s1["blocks"]] == ["b1", "b2"]
+    assert s1["blocks"][0]["setup"] is None
+    assert s1["blocks"][1]["setup"] == {"source": "Python"}
+    assert s1["blocks"][1]["metadata"] == {"numRows": 10}
+    assert s1["blocks"][1]["data"] is None
+    assert s2["current_block_id"] is None
+    assert s2["blocks"] == []
+
+
+@pytest.mark.asyncio
+async def test_get_project_snapshot_empty_project(redis_client):
+    project_id = "test_project"
+    await redis_client.set_project_data(project_id, "metadata", {"title": "Test"})
+
+    snapshot = await redis_client.get_project_snapshot(project_id)
+
+    assert snapshot["metadata"]["title"] == "Test"
+    assert snapshot["last_worked_section_id"] is None
+    assert snapshot["sections"] == []
+
+
+@pytest.mark.asyncio
+async def test_hash_layout_block_data():
+    fake_redis = aioredis.FakeRedis()
+    redis_client = RedisClient(fake_redis, layout="hash", legacy_fallback=False)
+    project_id, section_id, block_id = "test_project", "s1", "b1"
+    await redis_client.set_project_data(project_id, "metadata", {"title": "Test"})
+    await redis_client.set_section_data(project_id, section_id, "metadata", {"a": 1})
+    await redis_client.set_block_data(project_id, section_id, block_id, "setup", {})
+    await redis_client.set_block_data(project_id, section_id, block_id, "data", {})
+
+    assert await fake_redis.hkeys(f"{project_id}:section:{section_id}") == [b"metadata"]
+    assert set(
+        await fake_redis.hkeys(f"{project_id}:section:{section_id}:block:{block_id}")
+    ) == {b"setup", b"data"}
+    assert await redis_client.get_section_data(project_id, section_id, "metadata") == {
+        "a": 1
+    }
+
+    await redis_client.delete_block_data(project_id, section_id, block_id, "data")
+    assert (
+        await redis_client.get_block_data(project_id, section_id, block_id, "data")
+        is None
+    )
+    assert (
+        await redis_client.get_block_data(project_id, section_id, block_id, "setup")
+        == {}
+    )
+
+    await redis_client.add_block_id(project_id, section_id, block_id)
+    await redis_client.delete_all_section_data(project_id, section_id)
+    assert sorted(await fake_redis.keys()) == [
+        b"test_project:keys",
+        b"test_project:metadata",
+        b"test_project:modified_on",
+    ]
+    assert await fake_redis.smembers("test_project:keys") == {
+        b"test_project:metadata",
+        b"test_project:modified_on",
+    }
+
+
+@pytest.mark.asyncio
+async def test_hash_layout_legacy_fallback():
+    fake_redis = aioredis.FakeRedis()
+    legacy_client = RedisClient(fake_redis, layout="key")
+    redis_client = RedisClient(fake_redis, layout="hash", legacy_fallback=True)
+    project_id, section_id, block_id = "test_project", "s1", "b1"
+    await legacy_client.set_project_data(project_id, "metadata", {"title": "Test"})
+    await legacy_client.add_section_id(project_id, section_id)
+    await legacy_client.set_section_data(project_id, section_id, "metadata", {})
+    await legacy_client.add_block_id(project_id, section_id, block_id)
+    await legacy_client.set_block_data(
+        project_id, section_id, block_id, "metadata", {"numRows": 10}
+    )
+    await legacy_client.set_block_data(project_id, section_id, block_id, "setup", {})
+
+    # a write with hash layout replaces the legacy field
+    await redis_client.set_block_data(
+        project_id, section_id, block_id, "metadata", {"numRows": 20}
+    )
+    assert await redis_client.get_block_data(
+        project_id, section_id, block_id, "metadata"
+    ) == {"numRows": 20}
+    assert (
+        await redis_client.get_block_data(project_id, section_id, block_id, "setup")
+        == {}
+    )
+    snapshot = await redis_client.get_project_snapshot(project_id)
+    block = snapshot["sections"][0]["blocks"][0]
+    assert block["metadata"] == {"numRows": 20}
+    assert block["setup"] == {}
+
+    await redis_client.delete_all_block_data(project_id, section_id, block_id)
+    assert await fake_redis.keys(f"{project_id}:section:{section_id}:block:*") == []
+
+
+@pytest.mark.asyncio
+async def test_modified_on(redis_client):
+    project_id = "test_project"
+    metadata = {"title": "Test", "modifiedOn": "2024-01-01T00:00:00"}
+    await redis_client.redis.set(f"{project_id}:metadata", json.dumps(metadata))
+    # projects not written since modifiedOn has its own key keep the old value
+    assert await redis_client.get_project_data(project_id, "metadata") == metadata
+
+    await redis_client.set_block_data(project_id, "s1", "b1", "setup", {})
+
+    result = await redis_client.get_project_data(project_id, "metadata")
+    assert result["modifiedOn"] > metadata["modifiedOn"]
+    assert result["title"] == "Test"
+    # metadata itself is not rewritten
+    assert json.loads(await redis_client.redis.get(f"{project_id}:metadata")) == (
+        metadata
+    )
+    snapshot = await redis_client.get_project_snapshot(project_id)
+    assert snapshot["metadata"] == result
+    assert await redis_client.get_projects_metadata([project_id, "other"]) == [
+        result,
+        None,
+    ]
+
+
+@pytest.mark.asyncio
+async def test_settings_data(redis_client):
+    await redis_client.set_settings_data("LLM", "OpenAI", {"model": "gpt-4o"})
+    await redis_client.set_settings_data("LLM", "Anthropic", {"model": "claude"})
+    await redis_client.set_settings_data("Integration", "S3", {"bucket": "b"})
+
+    assert await redis_client.get_settings_data("LLM", "OpenAI") == {"model": "gpt-4o"}
+    assert await redis_client.get_settings_data("LLM") == {
+        "OpenAI": {"model": "gpt-4o"},
+        "Anthropic": {"model": "claude"},
+    }
+    assert len(await redis_client.get_all_settings_data()) == 3
+
+    await redis_client.delete_settings_data("LLM", "OpenAI")
+    assert await redis_client.get_settings_data("LLM", "OpenAI") is None
+    assert sorted(await redis_client.redis.keys("settings:*")) == [
+        b"settings:Integration",
+        b"settings:LLM",
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("layout", ["key", "hash"])
+async def test_block_dataframes(layout):
+    fake_redis = aioredis.FakeRedis()
+    redis_client = RedisClient(fake_redis, layout=layout, compression="lz4")
+    project_id, section_id, block_id = "test_project", "s1", "b1"
+    data_dict = {"df1": pd.DataFrame({"A": [1, 2]}), "df2": pd.DataFrame({"B": [3]})}
+    await redis_client.add_section_id(project_id, section_id)
+    await redis_client.add_block_id(project_id, section_id, block_id)
+    await redis_client.set_block_data(
+        project_id, section_id, block_id, "metadata", {"numRows": 10}
+    )
+
+    await redis_client.set_block_dataframes(project_id, section_id, block_id, data_dict)
+
+    result = await redis_client.get_block_dataframes(project_id, section_id, block_id)
+    assert result.keys() == data_dict.keys()
+    for k, v in data_dict.items():
+        pd.testing.assert_frame_equal(result[k], v)
+    snapshot = await redis_client.get_project_snapshot(project_id)
+    assert snapshot["sections"][0]["blocks"][0]["data"] == {
+        k: serialize_df(v, "lz4") for k, v in data_dict.items()
+    }
+
+    await redis_client.set_block_dataframes(
+        project_id, section_id, block_id, {"df1": data_dict["df1"]}
+    )
+    result = await redis_client.get_block_dataframes(project_id, section_id, block_id)
+    assert list(result) == ["df1"]
+
+    await redis_client.delete_block_dataframes(project_id, section_id, block_id)
+    assert (
+        await redis_client.get_block_dataframes(project_id, section_id, block_id) == {}
+    )
+    await fake_redis.flushall()
+
+
+@pytest.mark.asyncio
+async def test_block_dataframes_legacy_data(redis_client):
+    project_id, section_id, block_id = "test_project", "s1", "b1"
+    df = pd.DataFrame({"A": [1, 2]})
+    legacy_data = {"df": base64.b64encode(serialize_df(df)).decode("utf-8")}
+    await redis_client.set_block_data(
+        project_id, section_id, block_id, "data", legacy_data
+    )
+
+    result = await redis_client.get_block_dataframes(project_id, section_id, block_id)
+    pd.testing.assert_frame_equal(result["df"], df)
+
+    await redis_client.set_block_dataframes(project_id, section_id, block_id, {})
+    assert (
+        await redis_client.get_block_data(project_id, section_id, block_id, "data")
+        is None
+    )
+
+
+@pytest.mark.asyncio
+async def test_local_cache(redis_client):
+    project_id = "test_project"
+    cache = LocalCache(max_size=10, ttl=60)
+    cached_client = RedisClient(redis_client.redis, cache=cache)
+    await redis_client.set_project_data(project_id, "metadata", {"llm": "OpenAI"})
+    await redis_client.set_settings_data("LLM", "OpenAI", {"model": "gpt-4o"})
+
+    for _ in range(2):
+        assert await cached_client.get_project_metadata(project_id) == {"llm": "OpenAI"}
+        assert await cached_client.get_settings_data("LLM", "OpenAI") == {
+            "model": "gpt-4o"
+        }
+    assert await cached_client.get_settings_data("LLM") == {
+        "OpenAI": {"model": "gpt-4o"}
+    }
+    assert cache.get_stats()["hits"] == 3
+
+    # writes of this client evict the keys right away, other workers are notified
+    async with redis_client.redis.pubsub() as pubsub:
+        await pubsub.subscribe("cache:invalidate")
+        await cached_client.set_project_data(project_id, "metadata", {"llm": "x"})
+        await cached_client.delete_settings_data("LLM", "OpenAI")
+        messages = []
+        while len(messages) < 2:
+            message = await pubsub.get_message(timeout=1)
+            if message["type"] == "message":
+                messages.append(message["data"])
+    assert messages == [b"test_project:metadata", b"settings:LLM"]
+    assert await cached_client.get_project_metadata(project_id) == {"llm": "x"}
+    assert await cached_client.get_settings_data("LLM", "OpenAI") is None
+
+
+@pytest.mark.asyncio
+async def test_move_section_and_block(redis_client):
+    project_id = "test_project"
+    for section_id in ["s1", "s2", "s3"]:
+        await redis_client.add_section_id(project_id, section_id)
+    for block_id in ["b1", "b2"]:
+        await redis_client.add_block_id(project_id, "s1", block_id)
+
+    await redis_client.move_section(project_id, "s3", "up")
+    assert await redis_client.get_all_section_ids(project_id) == ["s1", "s3", "s2"]
+    # the first/last item and unknown items don't move
+    await redis_client.move_section(project_id, "s1", "up")
+    await redis_client.move_section(project_id, "s2", "down")
+    await redis_client.move_section(project_id, "s4", "down")
+    assert await redis_client.get_all_section_ids(project_id) == ["s1", "s3", "s2"]
+
+    await redis_client.move_block(project_id, "s1", "b1", "down")
+    assert await redis_client.get_all_block_ids(project_id, "s1") == ["b2", "b1"]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_moves(redis_client):
+    project_id = "test_project"
+    section_ids = [f"s{i}" for i in range(10)]
+    for section_id in section_ids:
+        await redis_client.add_section_id(project_id, section_id)
+
+    await asyncio.gather(
+        *[redis_client.move_section(project_id, "s9", "up") for _ in range(5)]
+    )
+
+    result = await redis_client.get_all_section_ids(project_id)
+    assert sorted(result) == section_ids
+    assert result.index("s9") == 4
+
+
+@pytest.mark.asyncio
+async def test_delete_registered_keys(redis_client):
+    fake_redis = redis_client.redis
+    project_id, section_id, block_id = "test_project", "s1", "b1"
+    await redis_client.set_project_data(project_id, "metadata", {"title": "Test"})
+    await redis_client.set_block_data(project_id, section_id, block_id, "setup", {})
+    # more keys than a Lua call can take at once
+    block_key = f"{project_id}:section:{section_id}:block:{block_id}"
+    keys = [f"{block_key}:extra:{i}" for i in range(2500)]
+    await fake_redis.mset({key: 1 for key in keys})
+    async with fake_redis.pipeline(transaction=True) as pipe:
+        for key in keys:
+            redis_client._queue_register(pipe, key, project_id, section_id, block_id)
+        await pipe.execute()
+
+    await redis_client.delete_all_block_data(project_id, section_id, block_id)
+    assert await fake_redis.keys(f"{block_key}*") == []
+    assert await fake_redis.smembers(f"{project_id}:section:{section_id}:keys") == set()
+    assert await fake_redis.smembers(f"{project_id}:keys") == {
+        f"{project_id}:metadata".encode(),
+        f"{project_id}:modified_on".encode(),
+        f"{project_id}:section:{section_id}:keys".encode(),
+    }
@@ -0,0 +1,30 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.utils.agent.serde import ZstdMsgpackSerializer, get_serializer
+
+VALUE = {"messages": [HumanMessage(content="Hi"), AIMessage(content="```sql\n```")]}
+
+
+@pytest.mark.parametrize("name", ["msgpack_zstd", "jsonplus"])
+def test_serializer_round_trip(name):
+    serde = get_serializer(name)
+
+    assert serde.loads_typed(serde.dumps_typed(VALUE)) == VALUE
+    assert serde.loads_typed(serde.dumps_typed(None)) is None
+    assert serde.loads_typed(serde.dumps_typed(b"raw")) == b"raw"
+
+
+def test_zstd_serializer_reads_legacy_data():
+    legacy_data = get_serializer("jsonplus").dumps_typed(VALUE)
+    type_, _ = ZstdMsgpackSerializer().dumps_typed(VALUE)
+
+    assert type_ == "msgpack+zstd"
+    assert ZstdMsgpackSerializer().loads_typed(legacy_data) == VALUE
+    with pytest.raises(ValueError):
+        ZstdMsgpackSerializer(legacy=False).loads_typed(legacy_data)
+
+
+def test_unsupported_serializer():
+    with pytest.raises(ValueError):
+        get_serializer("pickle")
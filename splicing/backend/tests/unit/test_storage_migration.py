@@ -0,0 +1,212 @@
+import asyncio
+import base64
+
+import pandas as pd
+import pytest
+import pytest_asyncio
+from fakeredis import aioredis
+
+from app.utils import storage_migration
+from app.utils.helper import serialize_df
+from app.utils.redis_client import RedisClient
+from app.utils.storage_migration import (
+    MIGRATION_LOCK_KEY,
+    MIGRATIONS,
+    STORAGE_META_KEY,
+    apply_migrations,
+    get_storage_meta,
+    index_keys,
+    migrate,
+    move_block_data_to_datasets,
+)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def fake_redis():
+    fake_redis = aioredis.FakeRedis()
+    yield fake_redis
+    await fake_redis.flushall()
+
+
+async def create_project(redis_client: RedisClient, project_id: str) -> None:
+    await redis_client.set_project_data(project_id, "metadata", {"title": "Test"})
+    await redis_client.add_project_id(project_id)
+    for section_id in ["s1", "s2"]:
+        await redis_client.add_section_id(project_id, section_id)
+        await redis_client.set_section_data(
+            project_id, section_id, "metadata", {"title": section_id}
+        )
+        await redis_client.set_section_data(
+            project_id, section_id, "current_block_id", "b1"
+        )
+        for block_id in ["b1", "b2"]:
+            await redis_client.add_block_id(project_id, section_id, block_id)
+            await redis_client.set_block_data(
+                project_id, section_id, block_id, "metadata", {"numRows": 10}
+            )
+            await redis_client.set_block_data(
+                project_id, section_id, block_id, "setup", {"source": block_id}
+            )
+
+
+@pytest.mark.asyncio
+async def test_migrate_to_hash_layout_and_back(fake_redis):
+    key_client = RedisClient(fake_redis, layout="key")
+    hash_client = RedisClient(fake_redis, layout="hash", legacy_fallback=False)
+    await create_project(key_client, "p1")
+    await create_project(key_client, "p2")
+    expected_snapshot = await key_client.get_project_snapshot("p1")
+
+    await migrate(hash_client)
+
+    assert (await get_storage_meta(fake_redis))["layout"] == "hash"
+    assert await fake_redis.keys("p1:section:s1:block:b1:*") == [
+        b"p1:section:s1:block:b1:keys"
+    ]
+    assert await fake_redis.smembers("p1:section:s1:block:b1:keys") == {
+        b"p1:section:s1:block:b1"
+    }
+    assert await hash_client.get_project_snapshot("p1") == expected_snapshot
+    assert await hash_client.get_block_data("p2", "s2", "b2", "setup") == {
+        "source": "b2"
+    }
+
+    await migrate(key_client)
+
+    assert (await get_storage_meta(fake_redis))["layout"] == "key"
+    assert not await fake_redis.exists("p1:section:s1:block:b1")
+    assert await key_client.get_project_snapshot("p1") == expected_snapshot
+
+
+@pytest.mark.asyncio
+async def test_migrate_keeps_fields_written_with_hash_layout(fake_redis):
+    key_client = RedisClient(fake_redis, layout="key")
+    await create_project(key_client, "p1")
+    await fake_redis.hset("p1:section:s1:block:b1", "setup", '{"source": "new"}')
+
+    await migrate(RedisClient(fake_redis, layout="hash"))
+
+    hash_client = RedisClient(fake_redis, layout="hash", legacy_fallback=False)
+    assert await hash_client.get_block_data("p1", "s1", "b1", "setup") == {
+        "source": "new"
+    }
+
+
+@pytest.mark.asyncio
+async def test_index_keys(fake_redis):
+    key_client = RedisClient(fake_redis, layout="key")
+    await create_project(key_client, "p1")
+    # data written before keys were indexed
+    for key in await fake_redis.keys("*:keys"):
+        await fake_redis.delete(key)
+    await fake_redis.set("settings:LLM:OpenAI", '{"model": "gpt-4o"}')
+
+    await index_keys(key_client)
+
+    assert await key_client.get_settings_data("LLM", "OpenAI") == {"model": "gpt-4o"}
+    assert not await fake_redis.exists("settings:LLM:OpenAI")
+    await key_client.delete_all_block_data("p1", "s1", "b1")
+    assert await fake_redis.keys("p1:section:s1:block:b1:*") == []
+    await key_client.delete_all_project_data("p1")
+    assert await fake_redis.keys("p1:*") == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("layout", ["key", "hash"])
+async def test_move_block_data_to_datasets(fake_redis, layout):
+    redis_client = RedisClient(fake_redis, layout=layout)
+    await create_project(redis_client, "p1")
+    df = pd.DataFrame({"A": [1, 2]})
+    legacy_data = {"df": base64.b64encode(serialize_df(df)).decode("utf-8")}
+    await redis_client.set_block_data("p1", "s1", "b2", "data", legacy_data)
+
+    await move_block_data_to_datasets(redis_client)
+
+    assert await redis_client.get_block_data("p1", "s1", "b2", "data") is None
+    assert await fake_redis.hgetall("p1:section:s1:block:b2:datasets") == {
+        b"df": serialize_df(df)
+    }
+    result = await redis_client.get_block_dataframes("p1", "s1", "b2")
+    pd.testing.assert_frame_equal(result["df"], df)
+    assert not await fake_redis.exists("p1:section:s1:block:b1:datasets")
+    await redis_client.delete_all_block_data("p1", "s1", "b2")
+    assert await fake_redis.keys("p1:section:s1:block:b2*") == []
+
+
+@pytest.mark.asyncio
+async def test_migrate_keeps_block_datasets(fake_redis):
+    key_client = RedisClient(fake_redis, layout="key")
+    hash_client = RedisClient(fake_redis, layout="hash", legacy_fallback=False)
+    await create_project(key_client, "p1")
+    df = pd.DataFrame({"A": [1, 2]})
+    await key_client.set_block_dataframes("p1", "s1", "b1", {"out": df})
+
+    await migrate(hash_client)
+
+    result = await hash_client.get_block_dataframes("p1", "s1", "b1")
+    pd.testing.assert_frame_equal(result["out"], df)
+    assert await fake_redis.smembers("p1:section:s1:block:b1:keys") == {
+        b"p1:section:s1:block:b1",
+        b"p1:section:s1:block:b1:datasets",
+    }
+
+    await migrate(key_client)
+
+    result = await key_client.get_block_dataframes("p1", "s1", "b1")
+    pd.testing.assert_frame_equal(result["out"], df)
+    assert await key_client.get_block_data("p1", "s1", "b1", "setup") == {
+        "source": "b1"
+    }
+
+
+@pytest.mark.asyncio
+async def test_apply_migrations_waits_for_lock(fake_redis, monkeypatch):
+    monkeypatch.setattr(storage_migration, "MIGRATION_POLL_INTERVAL", 0.01)
+    key_client = RedisClient(fake_redis, layout="key")
+    # another worker is applying migrations
+    await fake_redis.set(MIGRATION_LOCK_KEY, "other")
+    task = asyncio.create_task(apply_migrations(key_client))
+    await asyncio.sleep(0.05)
+    assert not task.done()
+
+    await fake_redis.hset(STORAGE_META_KEY, "version", len(MIGRATIONS))
+    await asyncio.wait_for(task, 1)
+
+
+@pytest.mark.asyncio
+async def test_apply_migrations_takes_over_expired_lock(fake_redis, monkeypatch):
+    monkeypatch.setattr(storage_migration, "MIGRATION_POLL_INTERVAL", 0.01)
+    key_client = RedisClient(fake_redis, layout="key")
+    # the worker applying migrations died, its lock expires
+    await fake_redis.set(MIGRATION_LOCK_KEY, "other", px=50)
+    await asyncio.wait_for(apply_migrations(key_client), 1)
+
+    assert (await get_storage_meta(fake_redis))["version"] == len(MIGRATIONS)
+    assert not await fake_redis.exists(MIGRATION_LOCK_KEY)
+
+
+@pytest.mark.asyncio
+async def test_apply_migrations_timeout(fake_redis, monkeypatch):
+    monkeypatch.setattr(storage_migration, "MIGRATION_POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(storage_migration, "MIGRATION_WAIT_TIMEOUT", 0.05)
+    await fake_redis.set(MIGRATION_LOCK_KEY, "other")
+    with pytest.raises(TimeoutError):
+        await apply_migrations(RedisClient(fake_redis, layout="key"))
+
+
+@pytest.mark.asyncio
+async def test_migration_lock_renewed(fake_redis, monkeypatch):
+    monkeypatch.setattr(storage_migration, "MIGRATION_LOCK_TTL", 0.3)
+    lock_ttls = []
+
+    async def convert_layout(redis_client, layout):
+        # a conversion running longer than the lock TTL
+        for _ in range(4):
+            await asyncio.sleep(0.1)
+            lock_ttls.append(await fake_redis.pttl(MIGRATION_LOCK_KEY))
+
+    monkeypatch.setattr(storage_migration, "convert_layout", convert_layout)
+    await migrate(RedisClient(fake_redis, layout="hash"))
+
+    assert all(ttl > 0 for ttl in lock_ttls)
+    assert not await fake_redis.exists(MIGRATION_LOCK_KEY)